@@ -0,0 +1,94 @@
+"""
+compare the cost of the ASGI adapter with the native server
+
+    python benchmarks/bench_asgi.py [-n 20000]
+
+both run in memory, the difference is what the adapter adds per request.
+to compare the servers themselves, run wrk against the same app under an
+ASGI server and against demos/hello_world.py
+
+    uvicorn --no-access-log benchmarks.bench_asgi:asgi_app --port 8000
+"""
+import time
+import asyncio
+import logging
+import argparse
+from imouto.web import Application, RequestHandler
+from imouto.asgi import ASGIAdapter
+from imouto.testing import TestClient
+
+REQUEST = (b'GET /hello?name=imouto HTTP/1.1\r\n'
+           b'Host: 127.0.0.1\r\n'
+           b'\r\n')
+
+SCOPE = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+         'method': 'GET', 'scheme': 'http', 'path': '/hello',
+         'raw_path': b'/hello', 'query_string': b'name=imouto',
+         'headers': [(b'host', b'127.0.0.1')],
+         'client': ('127.0.0.1', 50000), 'server': ('127.0.0.1', 8000)}
+
+
+class HelloHandler(RequestHandler):
+
+    async def get(self):
+        self.write('Hello ' + self.get_query_argument('name'))
+
+
+app = Application([(r'/hello', HelloHandler)])
+asgi_app = ASGIAdapter(app)
+
+
+async def native(client, n):
+    for _ in range(n):
+        await client.send(REQUEST)
+
+
+async def asgi(loop, n):
+    disconnect = {'type': 'http.disconnect'}
+    request = {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        pass
+
+    for _ in range(n):
+        messages = [request]
+        closed = loop.create_future()
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await closed
+            return disconnect
+
+        await asgi_app(SCOPE, receive, send)
+        closed.set_result(None)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=20000)
+    options = parser.parse_args()
+
+    # disable the access log, it is not what we want to measure
+    logging.getLogger('imouto.access').disabled = True
+    loop = asyncio.new_event_loop()
+    client = TestClient(app, loop)
+
+    results = []
+    for name, coro in (('native', lambda n: native(client, n)),
+                       ('asgi', lambda n: asgi(loop, n))):
+        loop.run_until_complete(coro(1000))
+        start = time.perf_counter()
+        loop.run_until_complete(coro(options.n))
+        results.append((name, time.perf_counter() - start))
+    client.close()
+    loop.close()
+
+    print('requests:  %d' % options.n)
+    for name, elapsed in results:
+        print('%-10s %.2f usec/request' % (name + ':',
+                                           elapsed / options.n * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+compare the in-memory test client with a request over a TCP socket
+
+    python benchmarks/bench_client.py [-n 5000]
+
+both go through `Application.__call__`, the difference is the cost of the
+socket, the connection and the kernel
+"""
+import time
+import asyncio
+import logging
+import argparse
+from imouto.web import Application, RequestHandler
+from imouto.testing import TestClient
+
+REQUEST = (b'GET /hello?name=imouto HTTP/1.1\r\n'
+           b'Host: 127.0.0.1\r\n'
+           b'\r\n')
+
+
+class HelloHandler(RequestHandler):
+
+    async def get(self):
+        self.write('Hello ' + self.get_query_argument('name'))
+
+
+async def over_socket(addr, loop, n):
+    for _ in range(n):
+        reader, writer = await asyncio.open_connection(*addr, loop=loop)
+        writer.write(REQUEST)
+        await reader.read()
+        writer.close()
+
+
+async def in_memory(client, n):
+    for _ in range(n):
+        await client.send(REQUEST)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=5000)
+    options = parser.parse_args()
+
+    app = Application([(r'/hello', HelloHandler)])
+    # disable the access log, it is not what we want to measure
+    logging.getLogger('imouto.access').disabled = True
+    loop = asyncio.new_event_loop()
+
+    client = TestClient(app, loop)
+    loop.run_until_complete(in_memory(client, 500))
+    start = time.perf_counter()
+    loop.run_until_complete(in_memory(client, options.n))
+    memory = time.perf_counter() - start
+
+    server, addr = app.test_server(loop)
+    loop.run_until_complete(over_socket(addr, loop, 500))
+    start = time.perf_counter()
+    loop.run_until_complete(over_socket(addr, loop, options.n))
+    socket = time.perf_counter() - start
+    server.close()
+    loop.run_until_complete(server.wait_closed())
+    client.close()
+    loop.close()
+
+    print('requests:           %d' % options.n)
+    print('in memory usec/req: %.2f' % (memory / options.n * 1e6))
+    print('socket usec/req:    %.2f' % (socket / options.n * 1e6))
+
+
+if __name__ == '__main__':
+    main()
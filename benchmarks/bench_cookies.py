@@ -0,0 +1,93 @@
+"""
+compare the cookie parser and the Set-Cookie serialization with the
+former parse_qs and SimpleCookie
+
+    python benchmarks/bench_cookies.py [-n 20000]
+
+the Cookie header is the one a browser sends to a site with analytics,
+the handler reads two of its cookies. the response sets a session, a
+CSRF token and two preferences with the same attributes
+"""
+import time
+import argparse
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+from imouto.cookies import parse_cookie
+from imouto.datastructures import MultiDict
+from imouto.response import Response
+from imouto.utils import tob, trim_keys
+
+COOKIE = ('_ga=GA1.2.1234567890.1520000000; _gid=GA1.2.987654321.1520000000;'
+          ' _fbp=fb.1.1520000000000.1234567890; theme=dark; lang=en;'
+          ' imouto_session=Zm9vYmFyYmF6cXV4|1520000000|3f786850e387550fdab8;'
+          ' csrf=8b1a9953c4611296a827abf8c47804d7;'
+          ' _hjid=a1b2c3d4-e5f6-7a8b-9c0d-e1f2a3b4c5d6; consent=all')
+SET = [
+    ('imouto_session', 'Zm9vYmFyYmF6cXV4|1520000000|3f786850e387550fdab8'),
+    ('csrf', '8b1a9953c4611296a827abf8c47804d7'),
+    ('theme', 'dark'),
+    ('lang', 'en'),
+]
+
+
+def read_legacy(n):
+    for _ in range(n):
+        cookies = MultiDict(**trim_keys(parse_qs(COOKIE)))
+        cookies.get('imouto_session')
+        cookies.get('csrf')
+
+
+def read_new(n):
+    for _ in range(n):
+        cookies = parse_cookie(COOKIE)
+        cookies.get('imouto_session')
+        cookies.get('csrf')
+
+
+def write_legacy(n):
+    for _ in range(n):
+        cookies = SimpleCookie()
+        for name, value in SET:
+            cookies[name] = value
+            cookies[name]['path'] = '/'
+            cookies[name]['httponly'] = True
+            cookies[name]['secure'] = True
+        tob(cookies.output()) + b'\r\n'
+
+
+def write_new(n):
+    response = Response()
+    for _ in range(n):
+        response._cookies = None
+        for name, value in SET:
+            response.set_cookie(name, value, path='/', httponly=True,
+                                secure=True)
+        b''.join(b'Set-Cookie: %b\r\n' % tob(cookie)
+                 for cookie in response.cookies.values())
+
+
+def run(func, n):
+    func(1000)
+    start = time.perf_counter()
+    func(n)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=20000)
+    options = parser.parse_args()
+    n = options.n
+
+    results = [
+        ('Cookie, parse_qs', run(read_legacy, n)),
+        ('Cookie, parse_cookie', run(read_new, n)),
+        ('Set-Cookie, SimpleCookie', run(write_legacy, n)),
+        ('Set-Cookie, templates', run(write_new, n)),
+    ]
+    for name, elapsed in results:
+        print('%-28s %8.2f us' % (name, elapsed / n * 1e6))
+
+
+if __name__ == '__main__':
+    main()
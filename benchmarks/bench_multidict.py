@@ -0,0 +1,93 @@
+"""
+compare the pair-based MultiDict with the former dict of lists
+
+    python benchmarks/bench_multidict.py [-n 20000]
+
+a query string of a dozen arguments, one of them repeated, is parsed and
+read the way a handler does, one lookup per argument
+"""
+import time
+import argparse
+from collections import UserDict
+from urllib.parse import parse_qs, parse_qsl
+from imouto.datastructures import MultiDict
+
+QUERY = ('page=2&per_page=50&sort=created&order=desc&q=imouto&lang=en'
+         '&tag=python&tag=asyncio&tag=web&since=2018-01-01&fields=id'
+         '&fields=name&format=json')
+NAMES = ('page', 'per_page', 'sort', 'order', 'q', 'lang', 'tag', 'since',
+         'fields', 'format', 'missing')
+
+
+class LegacyMultiDict(UserDict):
+    """the implementation before the pairs, built with parse_qs"""
+
+    def __getitem__(self, key):
+        return self.data[key][-1]
+
+    def __setitem__(self, key, value):
+        self.data.setdefault(key, []).append(value)
+
+    def items(self):
+        return ((k, v[-1]) for k, v in self.data.items())
+
+    def get(self, key, default=None, index=-1):
+        try:
+            val = self.data[key][index]
+        except (KeyError, IndexError):
+            val = default
+        return val
+
+    def get_all(self, key):
+        return self.data.get(key, None) or []
+
+
+def legacy(n):
+    for _ in range(n):
+        d = LegacyMultiDict(parse_qs(QUERY))
+        for name in NAMES:
+            d.get(name)
+
+
+def pairs(n):
+    for _ in range(n):
+        d = MultiDict.from_pairs(parse_qsl(QUERY))
+        for name in NAMES:
+            d.get(name)
+
+
+def empty_legacy(n):
+    for _ in range(n):
+        LegacyMultiDict()
+
+
+def empty_pairs(n):
+    for _ in range(n):
+        MultiDict()
+
+
+def run(func, n):
+    func(1000)
+    start = time.perf_counter()
+    func(n)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=20000)
+    options = parser.parse_args()
+    n = options.n
+
+    results = [
+        ('parse and read, dict of lists', run(legacy, n)),
+        ('parse and read, pairs', run(pairs, n)),
+        ('empty, dict of lists', run(empty_legacy, n)),
+        ('empty, pairs', run(empty_pairs, n)),
+    ]
+    for name, elapsed in results:
+        print('%-32s %8.2f us' % (name, elapsed / n * 1e6))
+
+
+if __name__ == '__main__':
+    main()
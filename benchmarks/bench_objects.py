@@ -0,0 +1,109 @@
+"""
+measure the cost of the objects allocated for every request
+
+    python benchmarks/bench_objects.py [-n 20000] [--pool 128]
+
+the request goes through `Application.__call__` with in-memory streams,
+so no socket is involved and the numbers only reflect the framework.
+`bytes/in-flight request` is the traced peak memory of 1000 concurrent
+requests divided by 1000.
+"""
+import gc
+import time
+import asyncio
+import logging
+import argparse
+import tracemalloc
+from imouto.web import Application, RequestHandler
+
+REQUEST = (b'GET /hello?name=imouto HTTP/1.1\r\n'
+           b'Host: 127.0.0.1\r\n'
+           b'Accept: */*\r\n'
+           b'Accept-Encoding: gzip, deflate\r\n'
+           b'\r\n')
+
+
+class HelloHandler(RequestHandler):
+
+    async def get(self):
+        # yield to the loop, so that concurrent requests are all in flight
+        await asyncio.sleep(0)
+        self.write('Hello ' + self.get_query_argument('name'))
+
+
+class Writer:
+    """ the minimal part of `asyncio.StreamWriter` used by the app """
+
+    def write(self, data):
+        pass
+
+    def write_eof(self):
+        pass
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+async def serve(app, n):
+    writer = Writer()
+    for _ in range(n):
+        reader = asyncio.StreamReader()
+        reader.feed_data(REQUEST)
+        reader.feed_eof()
+        await app(reader, writer)
+
+
+async def serve_concurrent(app, n):
+    writer = Writer()
+    coros = []
+    for _ in range(n):
+        reader = asyncio.StreamReader()
+        reader.feed_data(REQUEST)
+        reader.feed_eof()
+        coros.append(app(reader, writer))
+    await asyncio.gather(*coros)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=20000)
+    parser.add_argument('--pool', type=int, default=0)
+    options = parser.parse_args()
+
+    app = Application([(r'/hello', HelloHandler)])
+    app.config['OBJECT_POOL_SIZE'] = options.pool
+    app._prepare()
+    # disable the access log, it is not what we want to measure
+    logging.getLogger('imouto.access').disabled = True
+
+    loop = asyncio.get_event_loop()
+    # warm up
+    loop.run_until_complete(serve(app, 1000))
+
+    gc.collect()
+    collections = sum(s['collections'] for s in gc.get_stats())
+    start = time.perf_counter()
+    loop.run_until_complete(serve(app, options.n))
+    elapsed = time.perf_counter() - start
+    collections = sum(s['collections'] for s in gc.get_stats()) - collections
+
+    # fill the pool first, otherwise the first round allocates everything
+    loop.run_until_complete(serve_concurrent(app, 1000))
+    gc.collect()
+    tracemalloc.start()
+    loop.run_until_complete(serve_concurrent(app, 1000))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print('requests:                 %d' % options.n)
+    print('pool size:                %d' % options.pool)
+    print('usec/request:             %.2f' % (elapsed / options.n * 1e6))
+    print('gc collections:           %d' % collections)
+    print('bytes/in-flight request:  %d' % (peak // 1000))
+
+
+if __name__ == '__main__':
+    main()
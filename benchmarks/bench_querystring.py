@@ -0,0 +1,57 @@
+"""
+compare parse_query with the parsers of urllib.parse
+
+    python benchmarks/bench_querystring.py [-n 20000]
+
+the query strings are the ones the clients send, links from newsletters
+and ads carrying a dozen tracking parameters, some of them escaped
+"""
+import time
+import argparse
+from urllib.parse import parse_qs, parse_qsl
+from imouto.datastructures import MultiDict
+from imouto.querystring import parse_query
+
+QUERIES = {
+    'short': 'page=2&sort=created',
+    'tracking': ('utm_source=newsletter&utm_medium=email'
+                 '&utm_campaign=spring_sale_2018&utm_content=hero_banner'
+                 '&utm_term=running_shoes&gclid=Cj0KCQiA5NSSBhDfARIsALL3'
+                 '&fbclid=IwAR2xN4qk9yT7Xv&mc_cid=4f1c2a9e0b&mc_eid=7d3e1'
+                 '&ref=homepage&lang=en&currency=usd&page=1'),
+    'escaped': ('q=%E5%A6%B9+%E3%81%A8&redirect=https%3A%2F%2Fexample.com'
+                '%2Fcart%3Fid%3D42&utm_source=search&utm_medium=cpc'
+                '&utm_campaign=brand&gclid=EAIaIQobChMI&page=1&sort=price'),
+}
+
+
+def run(func, qs, n):
+    for _ in range(1000):
+        func(qs)
+    start = time.perf_counter()
+    for _ in range(n):
+        func(qs)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=20000)
+    options = parser.parse_args()
+    n = options.n
+
+    parsers = [
+        ('parse_qs', parse_qs),
+        ('parse_qsl + MultiDict',
+         lambda qs: MultiDict.from_pairs(parse_qsl(qs))),
+        ('parse_query', parse_query),
+    ]
+    print('%-10s %-24s %s' % ('query', 'parser', 'usec'))
+    for name, qs in QUERIES.items():
+        for label, func in parsers:
+            elapsed = run(func, qs, n)
+            print('%-10s %-24s %6.2f' % (name, label, elapsed / n * 1e6))
+
+
+if __name__ == '__main__':
+    main()
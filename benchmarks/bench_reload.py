@@ -0,0 +1,67 @@
+"""
+measure how fast the reloader notices a change and what it costs while
+nothing changes
+
+    python benchmarks/bench_reload.py [-n 3000] [--interval 1]
+
+`n` files are spread over directories of 50 files like a source tree,
+`idle cpu` is the CPU time of one `interval` without any change.
+"""
+import os
+import time
+import argparse
+import tempfile
+import threading
+from imouto.autoload import InotifyWatcher, PollingWatcher
+
+
+def make_tree(root, n):
+    files = []
+    for i in range(n):
+        dirname = os.path.join(root, 'pkg%d' % (i // 50))
+        os.makedirs(dirname, exist_ok=True)
+        path = os.path.join(dirname, 'mod%d.py' % i)
+        with open(path, 'w') as f:
+            f.write('x = 1\n')
+        files.append(path)
+    return files
+
+
+def bench(watcher_class, files, interval):
+    watcher = watcher_class(files)
+    start = time.process_time()
+    watcher.wait(interval)
+    idle_cpu = time.process_time() - start
+
+    target = files[len(files) // 2]
+    changed_at = []
+
+    def touch():
+        time.sleep(interval / 3)
+        changed_at.append(time.time())
+        with open(target, 'w') as f:
+            f.write('x = 2\n')
+        mtime = changed_at[0] + 1
+        os.utime(target, (mtime, mtime))
+    threading.Thread(target=touch).start()
+    while not watcher.wait(interval):
+        pass
+    latency = time.time() - changed_at[0]
+    watcher.close()
+    print('%-15s idle cpu %8.2f ms/interval   latency %8.2f ms' % (
+        watcher_class.__name__, idle_cpu * 1000, latency * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=3000)
+    parser.add_argument('--interval', type=float, default=1)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as root:
+        files = make_tree(root, args.n)
+        bench(PollingWatcher, files, args.interval)
+        bench(InotifyWatcher, files, args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+measure the cold start of an application
+
+    python benchmarks/bench_startup.py [-n 10] [--top 15] [--budget 300]
+
+`import` is the wall time of `import imouto.web` in a fresh interpreter,
+`first response` is the time from spawning a process which runs a hello
+world app to the first response received from it. the slowest imports are
+listed with `-X importtime` (Python 3.7+). with `--budget` (milliseconds)
+the exit status is 1 when the median time to first response exceeds it.
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+
+APP = '''
+from imouto.web import Application, RequestHandler
+
+class HelloHandler(RequestHandler):
+
+    async def get(self):
+        self.write('hello')
+
+Application([(r'/', HelloHandler)]).run(port=%d)
+'''
+
+IMPORT = '''
+import time
+start = time.perf_counter()
+import imouto.web
+print(time.perf_counter() - start)
+'''
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def time_import():
+    output = subprocess.check_output([sys.executable, '-c', IMPORT])
+    return float(output)
+
+
+def time_first_response(timeout=10.0):
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', APP % port],
+                               stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with socket.create_connection(('127.0.0.1', port)) as sock:
+                    sock.sendall(b'GET / HTTP/1.1\r\nHost: localhost\r\n\r\n')
+                    if sock.recv(1024).startswith(b'HTTP/1.1 200'):
+                        return time.perf_counter() - start
+            except ConnectionError:
+                time.sleep(0.001)
+        raise RuntimeError('no response in %s seconds' % timeout)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def slowest_imports(top):
+    """[(cumulative usec, module)] of the imports under imouto.web"""
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import imouto.web'],
+        stderr=subprocess.PIPE, universal_newlines=True).stderr
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), name.rstrip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=10)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--budget', type=float, default=None)
+    args = parser.parse_args()
+
+    imports = [time_import() for _ in range(args.n)]
+    responses = [time_first_response() for _ in range(args.n)]
+    print('import          median %7.2f ms  min %7.2f ms' % (
+        statistics.median(imports) * 1000, min(imports) * 1000))
+    first_response = statistics.median(responses) * 1000
+    print('first response  median %7.2f ms  min %7.2f ms' % (
+        first_response, min(responses) * 1000))
+
+    if args.top and sys.version_info >= (3, 7):
+        print('\nslowest imports (cumulative):')
+        for cumulative, name in slowest_imports(args.top):
+            print('%9.2f ms %s' % (cumulative / 1000, name))
+
+    if args.budget is not None and first_response > args.budget:
+        print('\nover the budget of %s ms' % args.budget)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    os.environ.setdefault('PYTHONPATH', os.getcwd())
+    main()
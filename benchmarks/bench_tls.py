@@ -0,0 +1,86 @@
+"""
+measure the full TLS handshake against a resumed one
+
+    python benchmarks/bench_tls.py [-n 500]
+
+a self-signed certificate is generated with the openssl command, the
+clients are blocking sockets in a thread while the server runs in the loop
+"""
+import os
+import ssl
+import time
+import socket
+import asyncio
+import logging
+import argparse
+import tempfile
+import threading
+import subprocess
+from imouto.web import Application, RequestHandler
+from imouto.tls import create_ssl_context
+
+
+class HelloHandler(RequestHandler):
+
+    async def get(self):
+        self.write('Hello')
+
+
+def self_signed(directory):
+    cert = os.path.join(directory, 'cert.pem')
+    key = os.path.join(directory, 'key.pem')
+    subprocess.check_call(
+        ['openssl', 'req', '-x509', '-newkey', 'ec', '-pkeyopt',
+         'ec_paramgen_curve:prime256v1', '-nodes', '-days', '1',
+         '-subj', '/CN=localhost', '-keyout', key, '-out', cert],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return cert, key
+
+
+def fetch(addr, context, session=None):
+    with socket.create_connection(addr) as sock:
+        # the handshake is several small writes, don't wait for the acks
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with context.wrap_socket(sock, server_hostname='localhost',
+                                 session=session) as tls:
+            tls.sendall(b'GET / HTTP/1.1\r\n\r\n')
+            while tls.recv(1024):
+                pass
+            return tls.session, tls.session_reused
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=500)
+    options = parser.parse_args()
+
+    cert, key = self_signed(tempfile.mkdtemp())
+    app = Application([(r'/', HelloHandler)])
+    logging.getLogger('imouto.access').disabled = True
+    loop = asyncio.new_event_loop()
+    server, addr = app.test_server(loop, ssl=create_ssl_context(cert, key))
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+
+    context = ssl.create_default_context(cafile=cert)
+    session, _ = fetch(addr, context)
+    print('requests: %d' % options.n)
+    for name, resume in (('full', False), ('resumed', True)):
+        reused = 0
+        start = time.perf_counter()
+        for _ in range(options.n):
+            _, hit = fetch(addr, context, session if resume else None)
+            reused += hit
+        elapsed = time.perf_counter() - start
+        print('%-8s %.2f usec/request, %d resumed'
+              % (name + ':', elapsed / options.n * 1e6, reused))
+
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    server.close()
+    loop.run_until_complete(server.wait_closed())
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+compare a request over loopback TCP and over a Unix domain socket
+
+    python benchmarks/bench_unix.py [-n 5000]
+
+a connection per request, as the server closes it after the response
+"""
+import os
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+from imouto.web import Application, RequestHandler
+from imouto.sockets import bind_sockets
+
+REQUEST = b'GET /hello HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n'
+
+
+class HelloHandler(RequestHandler):
+
+    async def get(self):
+        self.write('Hello')
+
+
+async def fetch(loop, n, open_connection):
+    for _ in range(n):
+        reader, writer = await open_connection()
+        writer.write(REQUEST)
+        await reader.read()
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=5000)
+    options = parser.parse_args()
+
+    app = Application([(r'/hello', HelloHandler)])
+    logging.getLogger('imouto.access').disabled = True
+    loop = asyncio.new_event_loop()
+    app.loop = loop
+    app._prepare()
+    path = os.path.join(tempfile.mkdtemp(), 'bench.sock')
+    tcp, unix = bind_sockets(['127.0.0.1:0', 'unix:' + path])
+    servers = [
+        loop.run_until_complete(asyncio.start_server(
+            app.__call__, sock=tcp, loop=loop)),
+        loop.run_until_complete(asyncio.start_unix_server(
+            app.__call__, sock=unix, loop=loop)),
+    ]
+    addr = tcp.getsockname()
+    clients = [
+        ('tcp', lambda: asyncio.open_connection(*addr, loop=loop)),
+        ('unix', lambda: asyncio.open_unix_connection(path, loop=loop)),
+    ]
+
+    print('requests: %d' % options.n)
+    for name, open_connection in clients:
+        loop.run_until_complete(fetch(loop, 500, open_connection))
+        start = time.perf_counter()
+        loop.run_until_complete(fetch(loop, options.n, open_connection))
+        elapsed = time.perf_counter() - start
+        print('%-5s %.2f usec/request' % (name + ':',
+                                          elapsed / options.n * 1e6))
+
+    for server in servers:
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+    os.unlink(path)
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
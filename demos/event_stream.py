@@ -0,0 +1,32 @@
+import time
+import asyncio
+from imouto.web import Application
+from imouto.sse import Channel, EventStreamHandler
+
+clock = Channel(replay_size=60)
+
+
+class ClockHandler(EventStreamHandler):
+
+    # every connection shares the same encoded events
+    channel = clock
+    # reconnect after 3 seconds, with Last-Event-ID
+    retry = 3000
+
+
+async def tick():
+    while True:
+        clock.publish(time.strftime('%X'), event='tick')
+        await asyncio.sleep(1)
+
+
+app = Application([(r'/clock', ClockHandler)])
+
+
+@app.on_startup
+async def start_clock():
+    asyncio.ensure_future(tick())
+
+
+app.on_shutdown(clock.close)
+app.run()
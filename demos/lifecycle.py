@@ -0,0 +1,22 @@
+from imouto.pool import ConnectionPool, tcp_connector
+from imouto.web import RequestHandler, Application
+
+# a redis server on the default port
+redis = ConnectionPool(tcp_connector('127.0.0.1', 6379),
+                       min_size=2, max_size=10)
+
+
+class PingHandler(RequestHandler):
+
+    async def get(self):
+        async with redis.acquire(timeout=1) as conn:
+            conn.writer.write(b'PING\r\n')
+            self.write(await conn.reader.readline())
+        self.write_json(redis.stats())
+
+
+app = Application([(r'/', PingHandler)])
+# the connections are opened before the first request
+app.on_startup(redis.start)
+app.on_shutdown(redis.close)
+app.run()
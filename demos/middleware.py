@@ -0,0 +1,29 @@
+from imouto import Response
+from imouto.middleware import Middleware
+from imouto.web import RequestHandler, Application
+
+
+class CORS(Middleware):
+
+    async def after_response(self, request, response):
+        response.headers['Access-Control-Allow-Origin'] = '*'
+
+
+class TokenAuth(Middleware):
+
+    async def before_request(self, request):
+        if request.headers.get('Authorization') != 'Token imouto':
+            response = Response(status_code=401)
+            response.write('Unauthorized')
+            return response
+
+
+class HelloWorldHandler(RequestHandler):
+
+    async def get(self):
+        self.write('Hello World')
+
+
+app = Application([(r'/', HelloWorldHandler)],
+                  middlewares=[CORS(), TokenAuth()])
+app.run()
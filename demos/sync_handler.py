@@ -0,0 +1,23 @@
+import time
+from imouto.web import RequestHandler, Application
+
+
+class BlockingHandler(RequestHandler):
+
+    def get(self):
+        # a plain `def` handler runs in the application thread pool
+        time.sleep(1)
+        self.write('done')
+
+
+class StatsHandler(RequestHandler):
+
+    async def get(self):
+        # blocking helpers can be offloaded from coroutine handlers too
+        await self.run_in_executor(time.sleep, 0.5)
+        self.write_json(self.app.thread_pool.stats())
+
+
+app = Application([(r'/', BlockingHandler), (r'/stats', StatsHandler)])
+app.config['THREAD_POOL_SIZE'] = 4
+app.run()
@@ -0,0 +1,30 @@
+from imouto.web import RequestHandler, Application
+from imouto.websocket import WebSocketHandler
+
+PAGE = '''<script>
+var ws = new WebSocket('ws://' + location.host + '/echo');
+ws.onmessage = function (e) { document.body.append(e.data + ' '); };
+ws.onopen = function () { ws.send('hello'); };
+</script>'''
+
+
+class IndexHandler(RequestHandler):
+
+    async def get(self):
+        self.write(PAGE)
+
+
+class EchoHandler(WebSocketHandler):
+
+    # negotiate permessage-deflate if the browser offers it
+    compression = True
+
+    async def open(self):
+        await self.write_message('connected')
+
+    async def on_message(self, message):
+        await self.write_message(message)
+
+
+app = Application([(r'/', IndexHandler), (r'/echo', EchoHandler)])
+app.run()
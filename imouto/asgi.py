@@ -0,0 +1,295 @@
+"""
+run the application under an ASGI 3 server
+
+the request is built from the scope and the `http.request` messages, and
+the response is sent as `http.response.start` and `http.response.body`.
+the handlers which take over the connection, e.g. `EventStreamHandler`,
+write to a `StreamWriter` whose transport sends every write as a body
+message, so a streamed response is never buffered
+>>> app = ASGIAdapter(Application(handlers))
+$ uvicorn module:app
+"""
+
+import asyncio
+from urllib.parse import quote
+from imouto.errors import HTTPError
+from imouto.response import NO_BODY_STATUS
+from imouto.utils import tob
+from imouto.web import log
+
+# for type check
+from typing import Any, Callable, Dict, List, Tuple
+
+Message = Dict[str, Any]
+Headers = List[Tuple[bytes, bytes]]
+
+
+def _start_message(head: bytes) -> Message:
+    """the status line and the headers written by the handler"""
+    lines = head.split(b'\r\n')
+    headers = []
+    for line in lines[1:]:
+        name, _, value = line.partition(b':')
+        headers.append((name.strip().lower(), value.strip()))
+    return {'type': 'http.response.start',
+            'status': int(lines[0].split()[1]),
+            'headers': headers}
+
+
+def _response_headers(res) -> Headers:
+    headers = [(tob(name.lower()), tob(value))
+               for name, value in res.headers.items()]
+    if 'Content-Length' not in res.headers and \
+            res.status_code not in NO_BODY_STATUS:
+        headers.append((b'content-length',
+                        b'%d' % sum(len(chunk) for chunk in res._chunks)))
+    if res._cookies:
+        headers.extend((b'set-cookie', tob(cookie))
+                       for cookie in res._cookies.values())
+    return headers
+
+
+class ASGITransport(asyncio.Transport):
+    """ The transport under the `StreamWriter` of a request
+    the bytes written by a detached response are sent as messages, the
+    status line and the headers become `http.response.start`. the writer is
+    paused while more than `high_water` bytes wait to be sent
+    """
+
+    high_water = 64 * 1024
+
+    def __init__(self, send: Callable, loop: asyncio.AbstractEventLoop,
+                 extra: Dict[str, Any]) -> None:
+        super().__init__(extra)
+        self._send = send
+        self._loop = loop
+        self._protocol = None
+        self._buffer = bytearray()
+        self._wakeup = asyncio.Event(loop=loop)
+        self._task = None
+        self._started = False
+        self._paused = False
+        self._closing = False
+        self._disconnected = False
+
+    def get_protocol(self):
+        return self._protocol
+
+    def set_protocol(self, protocol):
+        self._protocol = protocol
+
+    def is_closing(self) -> bool:
+        return self._closing
+
+    def get_write_buffer_size(self) -> int:
+        return len(self._buffer)
+
+    def can_write_eof(self) -> bool:
+        return True
+
+    def pause_reading(self) -> None:
+        pass
+
+    def resume_reading(self) -> None:
+        pass
+
+    def write(self, data: bytes) -> None:
+        if self._closing:
+            return
+        self._buffer += data
+        if self._task is None:
+            self._task = self._loop.create_task(self._pump())
+        if not self._paused and len(self._buffer) > self.high_water:
+            self._paused = True
+            self._protocol.pause_writing()
+        self._wakeup.set()
+
+    def write_eof(self) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._closing:
+            return
+        self._closing = True
+        if self._task is None:
+            self._loop.call_soon(self._protocol.connection_lost, None)
+        else:
+            self._wakeup.set()
+
+    def abort(self) -> None:
+        self._buffer.clear()
+        self.close()
+
+    def disconnected(self) -> None:
+        """the client has gone, nothing more is sent"""
+        self._disconnected = True
+        self.abort()
+
+    async def wait_closed(self) -> None:
+        if self._task is not None:
+            await self._task
+
+    async def _pump(self) -> None:
+        send = self._send
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if self._disconnected:
+                break
+            if not self._started:
+                end = self._buffer.find(b'\r\n\r\n')
+                if end < 0:
+                    if self._closing:
+                        break
+                    continue
+                head = bytes(self._buffer[:end])
+                del self._buffer[:end + 4]
+                self._started = True
+                await send(_start_message(head))
+            if self._buffer:
+                data = bytes(self._buffer)
+                self._buffer.clear()
+                if self._paused:
+                    self._paused = False
+                    self._protocol.resume_writing()
+                await send({'type': 'http.response.body', 'body': data,
+                            'more_body': True})
+            if self._closing and not self._buffer:
+                break
+        if self._started and not self._disconnected:
+            await send({'type': 'http.response.body', 'body': b'',
+                        'more_body': False})
+        self._protocol.connection_lost(None)
+
+
+class ASGIAdapter:
+    """ Expose the `Application` as an ASGI 3 application
+    the startup and shutdown hooks run with the lifespan protocol, or on
+    the first request if the server doesn't support it. WebSocket is not
+    supported, `WebSocketHandler` speaks the protocol on the connection
+    which the ASGI server keeps for itself
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+        self._prepared = False
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable,
+                       send: Callable) -> None:
+        kind = scope['type']
+        if kind == 'http':
+            await self._http(scope, receive, send)
+        elif kind == 'lifespan':
+            await self._lifespan(receive, send)
+        elif kind == 'websocket':
+            # closing before accepting is answered with 403
+            await send({'type': 'websocket.close', 'code': 1000})
+        else:
+            raise ValueError('unsupported scope type %r' % kind)
+
+    async def _startup(self) -> None:
+        app = self.app
+        if not self._prepared:
+            self._prepared = True
+            if app.loop is None:
+                app.loop = asyncio.get_event_loop()
+            app._prepare()
+        await app.startup()
+
+    async def _lifespan(self, receive: Callable, send: Callable) -> None:
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self._startup()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed',
+                                'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.app.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope: Dict[str, Any], receive: Callable,
+                    send: Callable) -> None:
+        await self._startup()
+        app = self.app
+        loop = app.loop
+        req = app._new_request()
+        req.method = scope['method']
+        # the path is not decoded, like the one parsed from the request
+        raw_path = scope.get('raw_path')
+        req.path = raw_path.decode('latin-1') if raw_path else \
+            quote(scope['path'])
+        req.query_string = scope['query_string'].decode('latin-1')
+        for name, value in scope['headers']:
+            req.on_header(name, value)
+        req.on_headers_complete()
+
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body = message.get('body')
+            if body:
+                req.on_body(body)
+            more_body = message.get('more_body', False)
+        try:
+            req.on_message_complete()
+            error = None
+        except HTTPError as e:
+            # e.g. a form over the limits, answered without the handler
+            error = e
+
+        client = scope.get('client')
+        transport = ASGITransport(send, loop, {
+            'peername': tuple(client) if client else None,
+            'sockname': scope.get('server'),
+        })
+        reader = asyncio.StreamReader(loop=loop)
+        protocol = asyncio.StreamReaderProtocol(reader, loop=loop)
+        transport.set_protocol(protocol)
+        protocol.connection_made(transport)
+        req.reader = reader
+        req.writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+        watcher = loop.create_task(
+            self._wait_disconnected(receive, transport, reader))
+
+        try:
+            try:
+                if error is not None:
+                    raise error
+                res = await app._handle(req)
+            except Exception as e:
+                res = app._handle_error(e)
+            log(status_code=res.status_code, method=req.method,
+                path=req.path, query_string=req.query_string)
+            if res.detached:
+                transport.close()
+                await transport.wait_closed()
+            else:
+                await send({'type': 'http.response.start',
+                            'status': res.status_code,
+                            'headers': _response_headers(res)})
+                await send({'type': 'http.response.body',
+                            'body': b''.join(res._chunks)})
+                transport.close()
+        finally:
+            watcher.cancel()
+
+        if app._request_pool is not None:
+            app._release(req, res)
+
+    async def _wait_disconnected(self, receive: Callable,
+                                 transport: ASGITransport,
+                                 reader: asyncio.StreamReader) -> None:
+        """the end of the stream is the disconnection, as on a socket"""
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                transport.disconnected()
+                reader.feed_eof()
+                return
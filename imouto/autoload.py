@@ -1,14 +1,18 @@
 import os
 import time
 import sys
+import ctypes
+import ctypes.util
+import select
 import signal
+import struct
 import tempfile
 import subprocess
 import threading
 import _thread as thread
 
 
-def autoload(interval=1):
+def autoload(interval=1, extra_files=()):
     """autoload the user code, work as the following control flow
     -----------         -----------
     |         |  poll() |         |
@@ -48,7 +52,11 @@ def autoload(interval=1):
                 while p.poll() is None:
                     # update the modified time
                     os.utime(lockfile, None)
-                    time.sleep(interval)
+                    try:
+                        # restart as soon as the child exits
+                        p.wait(interval)
+                    except subprocess.TimeoutExpired:
+                        pass
 
                 if p.poll() != 3:
                     if os.path.exists(lockfile):
@@ -76,7 +84,7 @@ def autoload(interval=1):
                 sys.exit(3)
             sys.exit()
         lockfile = os.environ.get('IMOUTO_LOCKFILE')
-        bgcheck = FileCheckerThread(lockfile, interval)
+        bgcheck = FileCheckerThread(lockfile, interval, extra_files)
         # signal.SIGINT is KeyboardInterrupt singal
         signal.signal(signal.SIGINT, interrupt_handler)
         bgcheck.start()
@@ -88,38 +96,159 @@ def autoload(interval=1):
         assert False
 
 
+def _module_files():
+    """get all imported modules and their filepath"""
+    files = set()
+    for module in list(sys.modules.values()):
+        path = getattr(module, '__file__', None) or ''
+        # if file extension are pyo or pyc, change to py
+        if path[-4:] in ('.pyo', '.pyc'):
+            path = path[:-1]
+        if path and os.path.exists(path):
+            files.add(os.path.abspath(path))
+    return files
+
+
+class PollingWatcher:
+    """ Compare the modified time of the files """
+
+    def __init__(self, files):
+        self.mtimes = {}
+        for path in files:
+            try:
+                self.mtimes[path] = os.stat(path).st_mtime
+            except OSError:
+                pass
+
+    def wait(self, timeout):
+        """return the changed files after `timeout` seconds"""
+        time.sleep(timeout)
+        changed = set()
+        for path, mtime in list(self.mtimes.items()):
+            try:
+                new_mtime = os.stat(path).st_mtime
+            except OSError:
+                # removed
+                del self.mtimes[path]
+                changed.add(path)
+                continue
+            if new_mtime > mtime:
+                self.mtimes[path] = new_mtime
+                changed.add(path)
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """ Watch the directories of the files with Linux inotify
+    the kernel reports the changes, nothing is done while the files are
+    unchanged. editors often save by renaming a new file, so the directory
+    is watched rather than the file itself
+    """
+
+    IN_MODIFY = 0x002
+    IN_ATTRIB = 0x004
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM |
+            IN_MOVED_TO | IN_CREATE | IN_DELETE)
+    # struct inotify_event { int wd; uint32_t mask, cookie, len; char name[] }
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self, files):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        # AttributeError if the platform has no inotify
+        self._add_watch = libc.inotify_add_watch
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        # watch descriptor => (directory, the watched names in it)
+        self._watches = {}
+        directories = {}
+        for path in files:
+            dirname, name = os.path.split(path)
+            directories.setdefault(dirname, set()).add(name)
+        try:
+            for dirname, names in directories.items():
+                wd = self._add_watch(self.fd, os.fsencode(dirname),
+                                     self.MASK)
+                if wd < 0:
+                    raise OSError(ctypes.get_errno(),
+                                  'inotify_add_watch failed: %s' % dirname)
+                self._watches[wd] = (dirname, names)
+        except OSError:
+            self.close()
+            raise
+
+    def wait(self, timeout):
+        """return the changed files, wait at most `timeout` seconds"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        changed = set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(data):
+            wd, _, _, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            dirname, names = self._watches.get(wd, (None, ()))
+            if name in names:
+                changed.add(os.path.join(dirname, name))
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def create_watcher(files):
+    """inotify if it is available, otherwise polling"""
+    try:
+        return InotifyWatcher(files)
+    except (OSError, AttributeError):
+        return PollingWatcher(files)
+
+
 class FileCheckerThread(threading.Thread):
 
-    def __init__(self, lockfile, interval):
+    def __init__(self, lockfile, interval, extra_files=(), debounce=0.02):
         super(FileCheckerThread, self).__init__()
         self.lockfile, self.interval = lockfile, interval
+        self.extra_files = extra_files
+        # an editor writes a file with several events, wait until they end
+        self.debounce = debounce
         self.status = None
 
     def run(self):
-        def mtime(path):
-            return os.stat(path).st_mtime
-        files = dict()
-
-        # get all imported modules and their filepath
-        for module in list(sys.modules.values()):
-            path = getattr(module, '__file__', '')
-            # if file extension are pyo or pyc, change to py
-            if path[-4:] in ('.pyo', '.pyc'):
-                path = path[:-1]
-            if path and os.path.exists(path):
-                files[path] = mtime(path)
-
-        while not self.status:
-            if not os.path.exists(self.lockfile)\
-                    or mtime(self.lockfile) < time.time() - self.interval - 5:
-                self.status = 'error'
-                thread.interrupt_main()
-
-            # check the all file modified time
-            for path, lmtime in list(files.items()):
-                if not os.path.exists(path) or mtime(path) > lmtime:
+        files = _module_files()
+        files.update(os.path.abspath(path) for path in self.extra_files)
+        watcher = create_watcher(files)
+
+        try:
+            while not self.status:
+                if not os.path.exists(self.lockfile) or \
+                        os.stat(self.lockfile).st_mtime < \
+                        time.time() - self.interval - 5:
+                    self.status = 'error'
+                    thread.interrupt_main()
+                    break
+
+                if watcher.wait(self.interval):
+                    while watcher.wait(self.debounce):
+                        pass
                     self.status = 'reload'
                     # raise a KeyboardInterrupt exception in the main thread.
                     thread.interrupt_main()
-                    break
-            time.sleep(self.interval)
+        finally:
+            watcher.close()
@@ -0,0 +1,140 @@
+"""
+limit the requests in flight and shed the excess load
+
+when the handlers are slower than the arrival rate, queueing more requests
+only makes every one of them late, so at most `limit` requests are handled
+at the same time, `queue_size` more wait and the others are rejected at
+once with 503 Service Unavailable
+"""
+
+import time
+import asyncio
+from collections import deque
+from imouto.errors import HTTPError
+from imouto.middleware import Middleware
+
+# for type check
+from typing import Deque, Dict, Optional, Sequence
+
+
+class ConcurrencyLimiter(Middleware):
+    """ A global limit of the requests in flight
+    with `target_latency` (seconds) the limit adapts to the load, it is
+    decreased by `backoff` when the handling takes longer, at most once per
+    `target_latency`, and increased by one per `limit` requests finished in
+    time while it is reached. the latency includes the time spent waiting
+    for the event loop, a lagging loop decreases the limit too
+    the paths starting with one of `priority`, e.g. health checks, are
+    never limited. a handler which takes over the connection, e.g. a
+    WebSocket, gives its slot back then and its lifetime isn't a latency
+    >>> app = Application(handlers, middlewares=[
+    ...     ConcurrencyLimiter(64, queue_size=128, target_latency=0.2,
+    ...                        priority=['/health'])])
+    """
+
+    def __init__(self, limit: int = 100, queue_size: int = 100, *,
+                 queue_timeout: float = None, retry_after: int = 1,
+                 priority: Sequence[str] = (),
+                 target_latency: float = None, min_limit: int = 1,
+                 max_limit: int = None, backoff: float = 0.9) -> None:
+        self._limit = float(limit)
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.priority = tuple(priority)
+        self.target_latency = target_latency
+        self.min_limit = min_limit
+        self.max_limit = max_limit if max_limit is not None else limit * 10
+        self.backoff = backoff
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._decreased_at = 0.0
+        self._rejected = 0
+        # the application using the limiter, set by `setup`
+        self._app = None
+
+    def setup(self, app) -> None:
+        self._app = app
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    async def around_request(self, request, call_next):
+        if self.priority and request.path.startswith(self.priority):
+            return await call_next(request)
+        await self._acquire()
+        start = time.monotonic()
+        held = True
+
+        def release(latency=None):
+            nonlocal held
+            if held:
+                held = False
+                self._release(latency)
+
+        request.on_detach(release)
+        try:
+            return await call_next(request)
+        finally:
+            release(time.monotonic() - start)
+
+    def _overloaded(self, reason: str) -> HTTPError:
+        self._rejected += 1
+        return HTTPError(503, reason,
+                         headers={'Retry-After': str(self.retry_after)})
+
+    async def _acquire(self) -> None:
+        if self._in_flight < self._limit and not self._waiters:
+            self._in_flight += 1
+            return
+        if len(self._waiters) >= self.queue_size:
+            raise self._overloaded('too many requests in flight')
+
+        loop = self._app.loop
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout, loop=loop)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # the slot was handed over just before giving up
+                self._in_flight -= 1
+                self._wake()
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._overloaded('queued for too long') from None
+            raise
+
+    def _release(self, latency: Optional[float]) -> None:
+        saturated = self._in_flight >= self._limit
+        self._in_flight -= 1
+        if self.target_latency is not None and latency is not None:
+            self._adapt(latency, saturated)
+        self._wake()
+
+    def _wake(self) -> None:
+        """hand the free slots over to the waiters"""
+        while self._waiters and self._in_flight < self._limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._in_flight += 1
+                waiter.set_result(None)
+
+    def _adapt(self, latency: float, saturated: bool) -> None:
+        if latency > self.target_latency:
+            now = time.monotonic()
+            if now - self._decreased_at >= self.target_latency:
+                self._decreased_at = now
+                self._limit = max(self.min_limit, self._limit * self.backoff)
+        elif saturated:
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'limit': self.limit,
+            'in_flight': self._in_flight,
+            'queued': len(self._waiters),
+            'rejected': self._rejected,
+        }
@@ -31,6 +31,20 @@ class Config(UserDict):
     def __init__(self, root_path=None, defaults=None):
         self.data = dict(defaults or {})
         self._root_path = root_path
+        # (loader method name, filename) of the loaded configuration files
+        # as the loader received it, they are loaded again by `reload`
+        self.sources = []
+        self._listeners = []
+
+    @property
+    def files(self):
+        """the loaded configuration files, the autoloader watches them"""
+        return [os.path.join(self.root_path, filename)
+                for _, filename in self.sources]
+
+    def _add_source(self, loader: str, filename: str) -> None:
+        if (loader, filename) not in self.sources:
+            self.sources.append((loader, filename))
 
     @property
     def root_path(self):
@@ -67,16 +81,17 @@ class Config(UserDict):
         """ Update the values in the config from a Python file.
         Only the uppercase variables in that module are stored in the config.
         """
-        filename = os.path.join(self.root_path, filename)
+        path = os.path.join(self.root_path, filename)
         module = types.ModuleType('config')
-        module.__file__ = filename
+        module.__file__ = path
         try:
-            with open(filename, 'r') as config_file:
-                exec(compile(config_file.read(), filename, 'exec'),
+            with open(path, 'r') as config_file:
+                exec(compile(config_file.read(), path, 'exec'),
                      module.__dict__)
         except IOError as e:
             e.strerror = 'Unable to load configuration file (%s)' % e.strerror
             raise
+        self._add_source('from_pyfile', filename)
         self.from_object(module)
         return True
 
@@ -88,13 +103,14 @@ class Config(UserDict):
             e.msg = ('Unable to load configuration file '  # type: ignore
                      '(%s)') % e.msg  # type: ignore
             raise
-        filename = os.path.join(self.root_path, filename)
+        path = os.path.join(self.root_path, filename)
         try:
-            with open(filename, 'r') as yaml_file:
-                obj = yaml.loads(yaml_file.read())  # type: ignore
+            with open(path, 'r') as yaml_file:
+                obj = yaml.safe_load(yaml_file.read())  # type: ignore
         except IOError as e:
             e.strerror = 'Unable to load configuration file (%s)' % e.strerror
             raise
+        self._add_source('from_yaml', filename)
         return self.from_mapping(obj)
 
     def from_toml(self, filename: str) -> bool:
@@ -105,13 +121,14 @@ class Config(UserDict):
             e.msg = ('Unable to load configuration file '  # type: ignore
                      '(%s)') % e.msg  # type: ignore
             raise
-        filename = os.path.join(self.root_path, filename)
+        path = os.path.join(self.root_path, filename)
         try:
-            with open(filename, 'r') as toml_file:
+            with open(path, 'r') as toml_file:
                 obj = toml.loads(toml_file.read())  # type: ignore
         except IOError as e:
             e.strerror = 'Unable to load configuration file (%s)' % e.strerror
             raise
+        self._add_source('from_toml', filename)
         return self.from_mapping(obj)
 
     def from_json(self, filename: str) -> bool:
@@ -122,13 +139,14 @@ class Config(UserDict):
             e.msg = ('Unable to load configuration file '  # type: ignore
                      '(%s)') % e.msg  # type: ignore
             raise
-        filename = os.path.join(self.root_path, filename)
+        path = os.path.join(self.root_path, filename)
         try:
-            with open(filename, 'r') as json_file:
+            with open(path, 'r') as json_file:
                 obj = json.loads(json_file.read())  # type: ignore
         except IOError as e:
             e.strerror = 'Unable to load configuration file (%s)' % e.strerror
             raise
+        self._add_source('from_json', filename)
         return self.from_mapping(obj)
 
     def from_mapping(self, *mapping, **kwargs) -> bool:
@@ -153,6 +171,33 @@ class Config(UserDict):
                 self.data[key] = value
         return True
 
+    def subscribe(self, listener):
+        """call `listener(config, changed_keys)` after a reload changed some
+        values, it can be used as a decorator
+        """
+        self._listeners.append(listener)
+        return listener
+
+    def reload(self):
+        """load the files again and swap the values in at once, the readers
+        see either the old or the new values, never a mix of them
+        the values which aren't from the files are kept, a key removed from
+        a file keeps its last value
+        return the changed keys, the old values stay if a file fails to load
+        """
+        snapshot = self.__class__(self._root_path, self.data)
+        for loader, filename in self.sources:
+            getattr(snapshot, loader)(filename)
+        old, new = self.data, snapshot.data
+        changed = {key for key in new
+                   if key not in old or old[key] != new[key]}
+        # a single assignment, `__getitem__` reads either dict
+        self.data = new
+        if changed:
+            for listener in self._listeners:
+                listener(self, changed)
+        return changed
+
     def get_namespace(self, namespace, lowercase=True, trim_namespace=True):
         """ Returns a dict containing a subset of configuration options """
         rv = {}
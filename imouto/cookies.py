@@ -0,0 +1,169 @@
+"""
+the Cookie header of the requests and the Set-Cookie of the responses
+
+RFC 6265, a value made of cookie-octets is sent as is, any other value is
+quoted with the backslash escapes of `http.cookies`, so the values set by
+`Response.set_cookie` come back unchanged. the attributes shared by the
+cookies of an application, e.g. '; Path=/; Secure; HttpOnly', are built
+once per combination
+>>> cookies = parse_cookie('theme=dark; sid="a\\\\073b"; theme=light')
+>>> cookies['theme'], cookies['sid']
+('dark', 'a;b')
+>>> set_cookie_header('sid', 'a;b', path='/', httponly=True)
+'sid="a\\\\073b"; Path=/; HttpOnly'
+"""
+
+import re
+import time
+from functools import lru_cache
+from datetime import date as date_t, datetime, timedelta
+from imouto.datastructures import MultiDict
+
+# for type check
+from typing import Dict, Optional, Union
+
+# the token of RFC 7230 and the cookie-octet of RFC 6265
+_is_token = re.compile(r"[!#$%&'*+\-.^_`|~0-9A-Za-z]+\Z").match
+_is_cookie_octets = re.compile(r'[!#-+\--:<-\[\]-~]*\Z').match
+
+# the escapes are those of `http.cookies`, octal for the controls and for
+# the separators, so a quoted value is also read by `SimpleCookie`
+_QUOTE_TABLE: Dict[int, str] = {n: '\\%03o' % n for n in range(32)}
+_QUOTE_TABLE.update({127: '\\177', ord('"'): '\\"', ord('\\'): '\\\\',
+                     ord(','): '\\054', ord(';'): '\\073'})
+_unescape = re.compile(r'\\(?:([0-3][0-7][0-7])|(.))').sub
+
+
+def _unescape_one(match) -> str:
+    octal, char = match.groups()
+    return chr(int(octal, 8)) if octal else char
+
+
+def quote_value(value: str) -> str:
+    # an empty value is '""' as `SimpleCookie` writes it
+    if value and _is_cookie_octets(value):
+        return value
+    return '"%s"' % value.translate(_QUOTE_TABLE)
+
+
+def unquote_value(value: str) -> str:
+    if len(value) < 2 or value[0] != '"' or value[-1] != '"':
+        return value
+    value = value[1:-1]
+    if '\\' in value:
+        value = _unescape(_unescape_one, value)
+    return value
+
+
+class RequestCookies(MultiDict):
+    """ The cookies sent by the client
+    the values are kept as sent and unquoted when read. a client sends the
+    cookie with the longest path first if several have the same name, so
+    the first value of a name wins, not the newest as in `MultiDict`
+    """
+
+    __slots__ = ()
+
+    def _build_index(self) -> Dict:
+        index = self._index = dict(self._pairs)
+        if len(index) < len(self._pairs):
+            # a name is repeated, rare enough to fix it afterwards
+            for key, value in reversed(self._pairs):
+                index[key] = value
+        return index
+
+    def __getitem__(self, key):
+        return unquote_value(super().__getitem__(key))
+
+    def get(self, key, default=None, index=-1):
+        if index == -1:
+            lookup = self._index
+            if lookup is None:
+                lookup = self._build_index()
+            if key not in lookup:
+                return default
+            return unquote_value(lookup[key])
+        return super().get(key, default, index)
+
+    def get_all(self, key):
+        return [unquote_value(v) for k, v in self._pairs if k == key]
+
+    def values(self):
+        return [unquote_value(v) for v in super().values()]
+
+    def items(self):
+        return [(k, unquote_value(v)) for k, v in super().items()]
+
+    def allitems(self):
+        return ((k, unquote_value(v)) for k, v in self._pairs)
+
+
+def parse_cookie(header: str) -> RequestCookies:
+    """ Split the Cookie header on ';', the pairs without '=' are ignored
+    """
+    pairs = []
+    append = pairs.append
+    for field in header.split(';'):
+        name, sep, value = field.partition('=')
+        if sep:
+            name = name.strip()
+            if name:
+                append((name, value.strip()))
+    return RequestCookies.from_pairs(pairs)
+
+
+def format_expires(value: Union[int, float, date_t, datetime]) -> str:
+    """ a timestamp, date or datetime in UTC as the Expires attribute """
+    if isinstance(value, (date_t, datetime)):
+        value = value.timetuple()
+    else:
+        value = time.gmtime(value)
+    return time.strftime('%a, %d %b %Y %H:%M:%S GMT', value)
+
+
+@lru_cache(maxsize=128)
+def cookie_attributes(domain: Optional[str] = None, path: Optional[str] = None,
+                      secure: bool = False, httponly: bool = False,
+                      samesite: Optional[str] = None) -> str:
+    """ the attributes of a cookie profile, e.g. '; Path=/; HttpOnly',
+    built once and shared by all the cookies using it
+    """
+    parts = []
+    if domain:
+        parts.append('; Domain=%s' % domain)
+    if path:
+        parts.append('; Path=%s' % path)
+    if secure:
+        parts.append('; Secure')
+    if httponly:
+        parts.append('; HttpOnly')
+    if samesite:
+        parts.append('; SameSite=%s' % samesite)
+    attributes = ''.join(parts)
+    for char in '\r\n\0':
+        if char in attributes:
+            raise ValueError('cookie attributes must not contain control '
+                             'characters: %r' % attributes)
+    return attributes
+
+
+def set_cookie_header(name: str, value: str, *,
+                      max_age: Union[int, timedelta, None] = None,
+                      expires: Union[int, float, date_t, datetime,
+                                     None] = None,
+                      domain: Optional[str] = None,
+                      path: Optional[str] = None,
+                      secure: bool = False, httponly: bool = False,
+                      samesite: Optional[str] = None) -> str:
+    """ the value of the Set-Cookie header """
+    if not _is_token(name):
+        raise ValueError('invalid cookie name %r' % name)
+    header = '%s=%s' % (name, quote_value(value))
+    if expires is not None:
+        header += '; Expires=' + format_expires(expires)
+    if max_age is not None:
+        if isinstance(max_age, timedelta):
+            max_age = max_age.seconds + max_age.days * 24 * 3600
+        header += '; Max-Age=%d' % max_age
+    return header + cookie_attributes(domain, path, secure, httponly,
+                                      samesite)
@@ -1,6 +1,9 @@
-from collections import UserDict, Iterable
+from collections import UserDict, Mapping, MutableMapping
 from imouto.utils import hkey, hval
 
+# for type check
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
 
 class ImmutableDict(UserDict):
     _hash_cache = None
@@ -78,10 +81,13 @@ class ConstantsObject(ImmutableDict):
         return self.data.keys()
 
 
-class MultiDict(UserDict):
+class MultiDict(MutableMapping):
     """ This dict stores multiple values per key, but behaves exactly like a
         normal dict in that it returns only the newest value for any given key.
         There are special methods available to access the full list of values.
+    the (key, value) pairs are kept in order in a list, the dict from a key
+    to its newest value is built on first lookup, so a query string parsed
+    into pairs is wrapped without copying
     >>> d = MultiDict(a=[0], b=[1])
     >>> d == {'a': [0], 'b': [1]}
     True
@@ -97,63 +103,190 @@ class MultiDict(UserDict):
     >>> d.update(b=4, c=5)
     >>> d == {'b': [1, 2, 4], 'a': [0], 'c': [5]}
     True
+    >>> MultiDict.from_pairs([('a', '1'), ('a', '2')]).get_all('a')
+    ['1', '2']
     """
 
+    __slots__ = ('_pairs', '_index')
+
     def __init__(self, *a, **k):
-        """TODO
+        """ a mapping, or keyword arguments, of lists of values """
+        self._pairs: List[Tuple[Any, Any]] = []
+        self._index: Optional[Dict] = None
+        for key, values in dict(*a, **k).items():
+            for value in values:
+                self._pairs.append((key, value))
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[Tuple[Any, Any]]) -> 'MultiDict':
+        """ build from (key, value) pairs, e.g. `urllib.parse.parse_qsl`
+        a list is used as is
         """
-        # self.data = {k: [v] for (k, v) in dict(*a, **k).items()}
-        self.data = dict(*a, **k)
+        d = cls.__new__(cls)
+        d._pairs = pairs if isinstance(pairs, list) else list(pairs)
+        d._index = None
+        return d
+
+    def _build_index(self) -> Dict:
+        # the last pair of a key wins, like the newest value
+        index = self._index = dict(self._pairs)
+        return index
 
     def __getitem__(self, key):
-        return self.data[key][-1]
+        index = self._index
+        if index is None:
+            index = self._build_index()
+        return index[key]
 
     def __setitem__(self, key, value):
-        self.data.setdefault(key, []).append(value)
+        self.add(key, value)
+
+    def __delitem__(self, key):
+        index = self._index
+        if index is None:
+            index = self._build_index()
+        del index[key]
+        self._pairs = [pair for pair in self._pairs if pair[0] != key]
+
+    def __contains__(self, key):
+        index = self._index
+        if index is None:
+            index = self._build_index()
+        return key in index
+
+    def __iter__(self):
+        index = self._index
+        if index is None:
+            index = self._build_index()
+        return iter(index)
+
+    def __len__(self):
+        index = self._index
+        if index is None:
+            index = self._build_index()
+        return len(index)
 
     def __eq__(self, other):
-        """values order is not important"""
-        return dict(self.data.items()) == dict(self.data.items())
+        """ equal to another MultiDict or a dict of lists with the same
+        values per key, the order of the keys is not important
+        """
+        if isinstance(other, MultiDict):
+            return self._lists() == other._lists()
+        if isinstance(other, Mapping):
+            return self._lists() == dict(other)
+        return NotImplemented
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self._pairs)
+
+    def __copy__(self):
+        return self.from_pairs(list(self._pairs))
+
+    copy = __copy__
+
+    def __reduce__(self):
+        return self.from_pairs, (self._pairs,)
+
+    def _lists(self) -> Dict[Any, List]:
+        lists: Dict[Any, List] = {}
+        for key, value in self._pairs:
+            if key in lists:
+                lists[key].append(value)
+            else:
+                lists[key] = [value]
+        return lists
+
+    def keys(self):
+        index = self._index
+        if index is None:
+            index = self._build_index()
+        return index.keys()
 
     def values(self):
-        return (v[-1] for v in self.data.values())
+        index = self._index
+        if index is None:
+            index = self._build_index()
+        return index.values()
 
     def items(self):
-        return ((k, v[-1]) for k, v in self.data.items())
+        index = self._index
+        if index is None:
+            index = self._build_index()
+        return index.items()
 
     def allitems(self):
-        return ((k, v) for k, vl in self.data.items() for v in vl)
+        """ all (key, value) pairs in order """
+        return iter(self._pairs)
+
+    def add(self, key, value):
+        """ add a value, the others of the key are kept """
+        self._pairs.append((key, value))
+        if self._index is not None:
+            self._index[key] = value
 
     def get(self, key, default=None, index=-1):
+        if index == -1:
+            lookup = self._index
+            if lookup is None:
+                lookup = self._build_index()
+            return lookup.get(key, default)
         try:
-            val = self.data[key][index]
-        except (KeyError, IndexError):
-            val = default
-        return val
+            return self.get_all(key)[index]
+        except IndexError:
+            return default
 
     def get_all(self, key):
-        return self.data.get(key, None) or []
+        return [v for k, v in self._pairs if k == key]
 
-    def update(self, iterable=None, **k_v):
-        if iterable and issubclass(iterable, Iterable):
-            for key, value in iterable:
-                self.data.setdefault(key, []).append(value)
-        for key, value in k_v.items():
-            self.data.setdefault(key, []).append(value)
+    def clear(self):
+        self._pairs = []
+        self._index = None
+
+    def update(*args, **kwargs):
+        """ add the values of a mapping, (key, value) pairs or keyword
+        arguments, the existing values are kept
+        """
+        self, *args = args
+        if len(args) > 1:
+            raise TypeError('expected at most 1 arguments, got %d' % len(args))
+        if args:
+            other = args[0]
+            if isinstance(other, MultiDict):
+                pairs = other.allitems()
+            elif isinstance(other, Mapping):
+                pairs = other.items()
+            else:
+                pairs = other
+            for key, value in pairs:
+                self.add(key, value)
+        for key, value in kwargs.items():
+            self.add(key, value)
 
 
 class HeaderDict(MultiDict):
     """ A case-insensitive version of :class:`MultiDict` that defaults to
         replace the old value instead of appending it.
-    >>> d = HeaderDict(a=0, b=1)
-    >>> d == {'a': [0], 'b': [1]}
+    it is built from a mapping or from (name, value) pairs, the repeated
+    headers of a request are all kept
+    >>> d = HeaderDict(content_type='text/plain')
+    >>> d == {'Content-Type': ['text/plain']}
     True
+    >>> d['content-type'] = 'text/html'
+    >>> d.get_all('Content-Type')
+    ['text/html']
     """
 
+    __slots__ = ()
+
     def __init__(self, *a, **k):
-        """TODO
-        """
-        self.data = {hkey(k): [v] for (k, v) in dict(*a, **k).items()}
+        pairs = a[0] if a else ()
+        if isinstance(pairs, Mapping):
+            pairs = pairs.items()
+        self._pairs = [(hkey(key), value) for key, value in pairs]
+        self._pairs.extend((hkey(key), value) for key, value in k.items())
+        self._index = None
 
     def __contains__(self, key):
         return super().__contains__(hkey(key))
@@ -165,7 +298,13 @@ class HeaderDict(MultiDict):
         return super().__getitem__(hkey(key))
 
     def __setitem__(self, key, value):
-        return super().__setitem__(hkey(key), hval(value))
+        key = hkey(key)
+        if key in self:
+            super().__delitem__(key)
+        super().add(key, hval(value))
+
+    def add(self, key, value):
+        super().add(hkey(key), hval(value))
 
     def get(self, key, default=None, index=-1):
         return super().get(hkey(key), default, index)
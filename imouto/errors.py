@@ -2,7 +2,68 @@
 implement exceptions
 """
 
-from http import HTTPStatus
+
+# the reason phrases of `http.HTTPStatus`, a plain table is much cheaper to
+# import than the enum and `http.client`
+STATUS_PHRASES = {
+    100: 'Continue',
+    101: 'Switching Protocols',
+    102: 'Processing',
+    200: 'OK',
+    201: 'Created',
+    202: 'Accepted',
+    203: 'Non-Authoritative Information',
+    204: 'No Content',
+    205: 'Reset Content',
+    206: 'Partial Content',
+    207: 'Multi-Status',
+    208: 'Already Reported',
+    226: 'IM Used',
+    300: 'Multiple Choices',
+    301: 'Moved Permanently',
+    302: 'Found',
+    303: 'See Other',
+    304: 'Not Modified',
+    305: 'Use Proxy',
+    307: 'Temporary Redirect',
+    308: 'Permanent Redirect',
+    400: 'Bad Request',
+    401: 'Unauthorized',
+    402: 'Payment Required',
+    403: 'Forbidden',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    406: 'Not Acceptable',
+    407: 'Proxy Authentication Required',
+    408: 'Request Timeout',
+    409: 'Conflict',
+    410: 'Gone',
+    411: 'Length Required',
+    412: 'Precondition Failed',
+    413: 'Request Entity Too Large',
+    414: 'Request-URI Too Long',
+    415: 'Unsupported Media Type',
+    416: 'Requested Range Not Satisfiable',
+    417: 'Expectation Failed',
+    422: 'Unprocessable Entity',
+    423: 'Locked',
+    424: 'Failed Dependency',
+    426: 'Upgrade Required',
+    428: 'Precondition Required',
+    429: 'Too Many Requests',
+    431: 'Request Header Fields Too Large',
+    500: 'Internal Server Error',
+    501: 'Not Implemented',
+    502: 'Bad Gateway',
+    503: 'Service Unavailable',
+    504: 'Gateway Timeout',
+    505: 'HTTP Version Not Supported',
+    506: 'Variant Also Negotiates',
+    507: 'Insufficient Storage',
+    508: 'Loop Detected',
+    510: 'Not Extended',
+    511: 'Network Authentication Required',
+}
 
 
 class ConfigError(Exception):
@@ -15,9 +76,12 @@ class HTTPError(Exception):
     _status_code = 500
     _phrase = 'Internal Server Error'
 
-    def __init__(self, status_code: int = None, log_message: str = '') -> None:
+    def __init__(self, status_code: int = None, log_message: str = '',
+                 headers: dict = None) -> None:
         self._status_code: int = status_code or self._status_code
         self.log_message: str = log_message
+        # extra headers of the error response, e.g. Retry-After
+        self.headers: dict = headers or {}
         message = '[status {}] {}'.format(self.status_code,
                                           self.log_message or self._phrase)
         super().__init__(message)
@@ -31,13 +95,15 @@ class HTTPError(Exception):
         return self._phrase
 
 
-for status_obj in list(HTTPStatus):
-    status_code = status_obj.value
+for status_code, reason in STATUS_PHRASES.items():
     if status_code > 400:
-        class_name = status_obj.name.title().replace('_', '')
+        # the names of the enum members, e.g. 'Request-URI Too Long' =>
+        # `RequestUriTooLong` and 'REQUEST URI TOO LONG'
+        words = reason.replace('-', ' ')
+        class_name = words.title().replace(' ', '')
         attrs = {
             '_status_code': status_code,
-            '_phrase': status_obj.name.replace('_', ' ')
+            '_phrase': words.upper()
         }
         cls = type(class_name, (HTTPError,), attrs)
         globals()[class_name] = cls
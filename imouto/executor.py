@@ -0,0 +1,232 @@
+"""
+run blocking and CPU-bound code outside of the event loop
+"""
+
+import os
+import asyncio
+import threading
+import functools
+from concurrent.futures import Future, ThreadPoolExecutor
+from imouto.errors import HTTPError
+
+# for type check
+from typing import Any, Callable, Dict, List
+
+
+class ThreadPool:
+    """ A thread pool with bounded queue depth
+    at most `max_workers` calls run at the same time and at most
+    `queue_size` calls wait for a free thread, the others are rejected
+    with 503 Service Unavailable instead of piling up
+    """
+
+    def __init__(self, max_workers: int = 8, queue_size: int = 128, *,
+                 loop: asyncio.AbstractEventLoop = None) -> None:
+        self._loop = loop or asyncio.get_event_loop()
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        # the counters are updated from the worker threads
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+
+    async def run(self, func: Callable, *args, **kwargs):
+        """call `func(*args, **kwargs)` in the pool and wait for the result
+        """
+        future = self.submit(func, *args, **kwargs)
+        return await asyncio.wrap_future(future, loop=self._loop)
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        """like `run`, but return the future of the thread, it is done
+        when the thread is, even if the awaiting coroutine was cancelled
+        """
+        with self._lock:
+            if self._pending >= self.max_workers + self.queue_size:
+                self._rejected += 1
+                raise HTTPError(503, 'thread pool is saturated')
+            self._pending += 1
+        if kwargs:
+            func = functools.partial(func, **kwargs)
+        future = self._executor.submit(func, *args)
+        # the work may outlive the awaiting coroutine if it is cancelled,
+        # so count it as finished only when the thread is done with it
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future) -> None:
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+
+    def stats(self) -> Dict[str, int]:
+        """saturation metrics of the pool"""
+        with self._lock:
+            pending = self._pending
+            return {
+                'max_workers': self.max_workers,
+                'queue_size': self.queue_size,
+                'active': min(pending, self.max_workers),
+                'queued': max(pending - self.max_workers, 0),
+                'completed': self._completed,
+                'rejected': self._rejected,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+# tmpfs is memory backed, the payload is copied once instead of being
+# pickled and sent through the pipe of the process pool chunk by chunk,
+# without tmpfs `mkstemp` uses the default temporary directory
+_SHM_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+class _SharedBytes:
+    """ A reference to a bytes payload stored in shared memory """
+
+    __slots__ = ('path', 'size')
+
+    def __init__(self, path: str, size: int) -> None:
+        self.path = path
+        self.size = size
+
+    @classmethod
+    def dump(cls, value: bytes) -> '_SharedBytes':
+        import tempfile
+        fd, path = tempfile.mkstemp(prefix='imouto-', dir=_SHM_DIR)
+        with open(fd, 'wb') as f:
+            f.write(value)
+        return cls(path, len(value))
+
+    def load(self, unlink: bool = False) -> bytes:
+        with open(self.path, 'rb') as f:
+            value = f.read()
+        if unlink:
+            self.unlink()
+        return value
+
+    def unlink(self) -> None:
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _share(value: Any, threshold: int, shared: List[_SharedBytes]) -> Any:
+    if isinstance(value, (bytes, bytearray)) and len(value) >= threshold:
+        value = _SharedBytes.dump(value)
+        shared.append(value)
+    return value
+
+
+def _unshare(value: Any) -> Any:
+    if isinstance(value, _SharedBytes):
+        return value.load()
+    return value
+
+
+def _invoke(func, args, kwargs, threshold):
+    """the entry point in the worker process"""
+    args = [_unshare(arg) for arg in args]
+    kwargs = {key: _unshare(value) for key, value in kwargs.items()}
+    result = func(*args, **kwargs)
+    if isinstance(result, (bytes, bytearray)) and len(result) >= threshold:
+        result = _SharedBytes.dump(result)
+    return result
+
+
+def _discard_result(future) -> None:
+    """clean the result which nobody is waiting for"""
+    if not future.cancelled() and future.exception() is None:
+        result = future.result()
+        if isinstance(result, _SharedBytes):
+            result.unlink()
+
+
+class ProcessPool:
+    """ A process pool for CPU-bound work
+    the arguments and the result must be picklable, bytes payloads larger
+    than `shm_threshold` are passed through shared memory
+    the worker processes are started on first use
+    """
+
+    def __init__(self, max_workers: int = None, *,
+                 shm_threshold: int = 64 * 1024,
+                 loop: asyncio.AbstractEventLoop = None) -> None:
+        self._loop = loop or asyncio.get_event_loop()
+        self.max_workers = max_workers
+        self.shm_threshold = shm_threshold
+        self._executor = None
+
+    async def run(self, func: Callable, *args, timeout: float = None,
+                  **kwargs):
+        """call `func(*args, **kwargs)` in a worker process
+        raise `asyncio.TimeoutError` if it doesn't finish in `timeout`
+        seconds, a call which has already started can't be interrupted,
+        the worker finishes it and the result is dropped
+        the timeout of a `cpu_bound` function is used if none is given
+        """
+        if timeout is None:
+            timeout = getattr(func, 'cpu_bound_timeout', None)
+        if self._executor is None:
+            # multiprocessing is only imported by the apps which use it
+            from concurrent.futures import ProcessPoolExecutor
+            self._executor = ProcessPoolExecutor(self.max_workers)
+        shared: List[_SharedBytes] = []
+        args = tuple(_share(arg, self.shm_threshold, shared) for arg in args)
+        kwargs = {key: _share(value, self.shm_threshold, shared)
+                  for key, value in kwargs.items()}
+        future = self._executor.submit(_invoke, func, args, kwargs,
+                                       self.shm_threshold)
+        if shared:
+            def unlink(_):
+                for value in shared:
+                    value.unlink()
+            future.add_done_callback(unlink)
+        try:
+            result = await asyncio.wait_for(
+                asyncio.wrap_future(future, loop=self._loop),
+                timeout, loop=self._loop)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            # the cancellation only succeeds if the call isn't started yet
+            future.add_done_callback(_discard_result)
+            raise
+        if isinstance(result, _SharedBytes):
+            result = result.load(unlink=True)
+        return result
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+def cpu_bound(func: Callable = None, *, timeout: float = None) -> Callable:
+    """mark a module level function as CPU-bound work, with the default
+    `timeout` of `ProcessPool.run`. the function itself is unchanged, it
+    is sent to the process pool of the running application with
+    `RequestHandler.run_in_process`
+    >>> @cpu_bound(timeout=10)
+    ... def checksum(data):
+    ...     return hashlib.sha256(data).hexdigest()
+    >>> digest = await self.run_in_process(checksum, data)
+    """
+    if func is None:
+        return functools.partial(cpu_bound, timeout=timeout)
+    func.cpu_bound_timeout = timeout
+    return func
+
+
+_coroutine_cache: Dict[Callable, bool] = {}
+
+
+def is_coroutine_function(func: Callable) -> bool:
+    """cached `asyncio.iscoroutinefunction`, it is checked per request"""
+    key = getattr(func, '__func__', func)
+    try:
+        return _coroutine_cache[key]
+    except KeyError:
+        rv = _coroutine_cache[key] = asyncio.iscoroutinefunction(key)
+        return rv
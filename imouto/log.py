@@ -1,6 +1,5 @@
 import sys
 import logging
-import logging.config
 
 
 class ColorizingStreamHandler(logging.StreamHandler):
@@ -130,6 +129,7 @@ access_log = logging.getLogger("imouto.access")
 app_log = logging.getLogger("imouto.application")
 
 if __name__ == '__main__':
+    import logging.config
     logging.config.dictConfig(DEFAULT_LOGGING)
     app_log.debug("Hello world")     # output should be in blue
     app_log.info("Hello world")      # output should be in green
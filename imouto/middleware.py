@@ -0,0 +1,105 @@
+"""
+application level middleware
+
+the middlewares are compiled into nested coroutines when the application
+starts, a hook which is not overridden is never called
+"""
+
+# for type check
+from typing import Callable, Sequence
+
+
+class Middleware:
+    """ Base class
+    override the hooks you need, for example
+    >>> class CORS(Middleware):
+    ...     async def after_response(self, request, response):
+    ...         response.headers['Access-Control-Allow-Origin'] = '*'
+    """
+
+    def setup(self, app) -> None:
+        """ invoked with the application when it prepares to serve, keep
+        it to use its loop or its pools in the hooks
+        """
+
+    async def around_request(self, request, call_next):
+        """ invoked around the other hooks and the inner layers, continue
+        with `await call_next(request)` and return the response, the code
+        after it runs whatever happens inside
+        """
+
+    async def before_request(self, request):
+        """ invoked before the handler is found
+        return a `Response` to short-circuit the request, the handler and
+        the following middlewares will not be executed
+        """
+
+    async def after_response(self, request, response):
+        """ invoked after the handler is executed
+        return a `Response` to replace the current one
+        """
+
+    async def on_exception(self, request, exc: Exception):
+        """ invoked when an exception is raised in the inner layers
+        return a `Response` to handle it, otherwise the exception is
+        raised again
+        """
+
+
+def _overrides(middleware, name: str) -> bool:
+    """whether the middleware provides its own `name` hook"""
+    hook = getattr(type(middleware), name, None)
+    return hook is not None and hook is not getattr(Middleware, name)
+
+
+def _wrap_around(hook, next_):
+    async def handle(request):
+        return await hook(request, next_)
+    return handle
+
+
+def _wrap_before(hook, next_):
+    async def handle(request):
+        response = await hook(request)
+        if response is not None:
+            return response
+        return await next_(request)
+    return handle
+
+
+def _wrap_after(hook, next_):
+    async def handle(request):
+        response = await next_(request)
+        rv = await hook(request, response)
+        return response if rv is None else rv
+    return handle
+
+
+def _wrap_exception(hook, next_):
+    async def handle(request):
+        try:
+            return await next_(request)
+        except Exception as e:
+            response = await hook(request, e)
+            if response is None:
+                raise
+            return response
+    return handle
+
+
+def compile_middlewares(middlewares: Sequence[Middleware],
+                        handle: Callable) -> Callable:
+    """build a single call path from the middlewares and the `handle`
+    coroutine function, the first middleware is the outermost layer
+    if there is no middleware, `handle` is returned as is
+    """
+    for middleware in reversed(middlewares):
+        if _overrides(middleware, 'on_exception'):
+            handle = _wrap_exception(middleware.on_exception, handle)
+        if _overrides(middleware, 'after_response'):
+            handle = _wrap_after(middleware.after_response, handle)
+        if _overrides(middleware, 'before_request'):
+            handle = _wrap_before(middleware.before_request, handle)
+        if _overrides(middleware, 'around_request'):
+            handle = _wrap_around(middleware.around_request, handle)
+    return handle
@@ -0,0 +1,293 @@
+"""
+a generic asynchronous connection pool
+"""
+
+import asyncio
+from collections import deque
+
+# for type check
+from typing import Any, Callable, Deque, Dict, Set, Tuple
+
+
+class Connection:
+    """ A stream connection to a TCP or Unix socket backend """
+
+    __slots__ = ('reader', 'writer')
+
+    def __init__(self, reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+
+    @property
+    def closed(self) -> bool:
+        return self.writer.transport.is_closing() or self.reader.at_eof()
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+def tcp_connector(host: str, port: int, *, loop=None, **kwargs) -> Callable:
+    """connection factory for a TCP backend, `kwargs` are passed to
+    `asyncio.open_connection`, for example `ssl`
+    """
+    async def connect() -> Connection:
+        reader, writer = await asyncio.open_connection(
+            host, port, loop=loop, **kwargs)
+        return Connection(reader, writer)
+    return connect
+
+
+def unix_connector(path: str, *, loop=None, **kwargs) -> Callable:
+    """connection factory for a Unix socket backend"""
+    async def connect() -> Connection:
+        reader, writer = await asyncio.open_unix_connection(
+            path, loop=loop, **kwargs)
+        return Connection(reader, writer)
+    return connect
+
+
+async def _default_health_check(conn: Any) -> bool:
+    return not getattr(conn, 'closed', False)
+
+
+class PoolTimeout(Exception):
+    """ No connection became available in time """
+
+
+class _Acquire:
+    """ `await pool.acquire()` or `async with pool.acquire() as conn` """
+
+    __slots__ = ('_pool', '_timeout', '_conn')
+
+    def __init__(self, pool: 'ConnectionPool', timeout: float) -> None:
+        self._pool = pool
+        self._timeout = timeout
+        self._conn = None
+
+    def __await__(self):
+        return self._pool._acquire(self._timeout).__await__()
+
+    async def __aenter__(self):
+        self._conn = await self._pool._acquire(self._timeout)
+        return self._conn
+
+    async def __aexit__(self, exc_type, exc, tb):
+        # the state of the connection is unknown after an error
+        await self._pool.release(self._conn, discard=exc_type is not None)
+
+
+class ConnectionPool:
+    """ A pool of connections created by the `factory` coroutine function
+    `min_size` connections are kept open, at most `max_size` are open at the
+    same time, idle connections above `min_size` are closed after
+    `max_idle` seconds. an idle connection is checked with `health_check`
+    before it is handed out, unhealthy ones are replaced
+    >>> pool = ConnectionPool(tcp_connector('127.0.0.1', 6379), max_size=4)
+    >>> app.on_startup(pool.start)
+    >>> app.on_shutdown(pool.close)
+    >>> async with pool.acquire() as conn:
+    ...     conn.writer.write(b'PING\\r\\n')
+    """
+
+    def __init__(self, factory: Callable, *, min_size: int = 0,
+                 max_size: int = 10, max_idle: float = 60.0,
+                 health_check: Callable = _default_health_check,
+                 close: Callable = None,
+                 loop: asyncio.AbstractEventLoop = None) -> None:
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError('invalid pool size: min %r max %r'
+                             % (min_size, max_size))
+        self._loop = loop or asyncio.get_event_loop()
+        self._factory = factory
+        self._health_check = health_check
+        self._close = close
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        # (connection, the time it is released)
+        self._idle: Deque[Tuple[Any, float]] = deque()
+        self._used: Set[Any] = set()
+        self._waiters: Deque[asyncio.Future] = deque()
+        # count the connections which are being created
+        self._connecting = 0
+        self._reaper = None
+        self._closed = False
+        # acquisition metrics
+        self._acquired = 0
+        self._waited = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._timeouts = 0
+
+    @property
+    def size(self) -> int:
+        return len(self._idle) + len(self._used) + self._connecting
+
+    async def start(self) -> None:
+        """open `min_size` connections and start the idle eviction"""
+        self._closed = False
+        conns = await asyncio.gather(
+            *(self._connect() for _ in range(self.min_size - self.size)),
+            loop=self._loop)
+        now = self._loop.time()
+        self._idle.extend((conn, now) for conn in conns)
+        if self._reaper is None and self.max_idle is not None:
+            self._reaper = self._loop.create_task(self._reap())
+
+    def acquire(self, timeout: float = None) -> _Acquire:
+        """get a connection, raise `PoolTimeout` after `timeout` seconds"""
+        return _Acquire(self, timeout)
+
+    async def _acquire(self, timeout: float = None) -> Any:
+        if self._closed:
+            raise RuntimeError('the pool is closed')
+        while self._idle:
+            conn, _ = self._idle.pop()
+            # count it as used, the check may switch to other coroutines
+            self._used.add(conn)
+            try:
+                healthy = await self._health_check(conn)
+            except asyncio.CancelledError:
+                # the check was interrupted, the state of the connection is
+                # unknown and its slot may be given to a waiter
+                await self.release(conn, discard=True)
+                raise
+            except Exception:
+                # e.g. a reset connection
+                healthy = False
+            if healthy:
+                return self._checkout(conn, 0.0)
+            self._used.discard(conn)
+            await self._dispose(conn)
+
+        if self.size < self.max_size:
+            return self._checkout(await self._connect(), 0.0)
+
+        # wait for a released connection
+        start = self._loop.time()
+        waiter = self._loop.create_future()
+        self._waiters.append(waiter)
+        try:
+            conn = await asyncio.wait_for(waiter, timeout, loop=self._loop)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            self._hand_back(waiter)
+            raise PoolTimeout('no connection available in %s seconds'
+                              % timeout) from None
+        except asyncio.CancelledError:
+            self._hand_back(waiter)
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        if conn is None:
+            # the slot of a discarded connection is handed over
+            try:
+                conn = await self._factory()
+            finally:
+                self._connecting -= 1
+        return self._checkout(conn, self._loop.time() - start)
+
+    def _checkout(self, conn: Any, waited: float) -> Any:
+        self._used.add(conn)
+        self._acquired += 1
+        if waited:
+            self._waited += 1
+            self._wait_time += waited
+            self._max_wait_time = max(self._max_wait_time, waited)
+        return conn
+
+    async def release(self, conn: Any, discard: bool = False) -> None:
+        """return the connection to the pool, a `discard`ed or closed
+        connection is closed and its slot is given to a waiter
+        """
+        self._used.discard(conn)
+        if discard or self._closed or getattr(conn, 'closed', False):
+            await self._dispose(conn)
+            conn = None
+        waiter = self._next_waiter()
+        if waiter is not None:
+            if conn is None:
+                # reserve the slot until the waiter has connected
+                self._connecting += 1
+            waiter.set_result(conn)
+        elif conn is not None:
+            self._idle.append((conn, self._loop.time()))
+
+    def _hand_back(self, waiter: asyncio.Future) -> None:
+        """a connection may be given to a waiter which just gave up"""
+        if (waiter.done() and not waiter.cancelled() and
+                waiter.exception() is None):
+            conn = waiter.result()
+            next_waiter = self._next_waiter()
+            if next_waiter is not None:
+                next_waiter.set_result(conn)
+            elif conn is None:
+                self._connecting -= 1
+            else:
+                self._idle.append((conn, self._loop.time()))
+
+    def _next_waiter(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                return waiter
+        return None
+
+    async def _connect(self) -> Any:
+        self._connecting += 1
+        try:
+            return await self._factory()
+        finally:
+            self._connecting -= 1
+
+    async def _dispose(self, conn: Any) -> None:
+        if self._close is not None:
+            rv = self._close(conn)
+        else:
+            close = getattr(conn, 'close', None)
+            rv = close() if close is not None else None
+        if asyncio.iscoroutine(rv):
+            await rv
+
+    async def _reap(self) -> None:
+        """close the connections which are idle for too long"""
+        while True:
+            await asyncio.sleep(self.max_idle / 2, loop=self._loop)
+            deadline = self._loop.time() - self.max_idle
+            # the oldest connections are on the left
+            while (self._idle and self._idle[0][1] < deadline and
+                   self.size > self.min_size):
+                conn, _ = self._idle.popleft()
+                await self._dispose(conn)
+
+    async def close(self) -> None:
+        """close the idle connections, the used ones are closed on release
+        """
+        self._closed = True
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        while self._idle:
+            conn, _ = self._idle.popleft()
+            await self._dispose(conn)
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_exception(RuntimeError('the pool is closed'))
+        self._waiters.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """the pool usage and the acquisition-wait metrics"""
+        return {
+            'size': self.size,
+            'idle': len(self._idle),
+            'used': len(self._used),
+            'waiting': len(self._waiters),
+            'acquired': self._acquired,
+            'waited': self._waited,
+            'timeouts': self._timeouts,
+            'avg_wait_time': (self._wait_time / self._waited
+                              if self._waited else 0.0),
+            'max_wait_time': self._max_wait_time,
+        }
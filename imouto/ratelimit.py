@@ -0,0 +1,118 @@
+"""
+token bucket rate limiting
+
+the limiter is a middleware, a client over its limit is rejected with
+429 Too Many Requests before the handler is looked up
+"""
+
+import math
+import time
+from collections import OrderedDict
+from imouto.errors import HTTPError
+from imouto.middleware import Middleware
+
+# for type check
+from typing import Any, Callable, Hashable, List, Sequence, Tuple
+
+
+class TokenBucketTable:
+    """ Token buckets refilled with `rate` tokens per second up to `burst`
+    the buckets are spread over `shards` LRU tables of at most `max_keys`
+    entries each. a bucket idle long enough to be full again carries no
+    state, so it is dropped, when a shard is still full its least recently
+    used bucket is dropped
+    """
+
+    def __init__(self, rate: float, burst: float = None, shards: int = 16,
+                 max_keys: int = 4096) -> None:
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1)
+        self.max_keys = max_keys
+        # seconds for an empty bucket to be full
+        self._refill_time = self.burst / rate
+        # round up to a power of 2, the shard is chosen with a mask
+        shards = 1 << max(shards - 1, 0).bit_length()
+        self._mask = shards - 1
+        self._shards: List[OrderedDict] = [OrderedDict()
+                                           for _ in range(shards)]
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    def take(self, key: Hashable, now: float = None) -> float:
+        """take a token, return 0 if there is one, otherwise the seconds
+        until the next token
+        """
+        if now is None:
+            now = time.monotonic()
+        shard = self._shards[hash(key) & self._mask]
+        # [tokens, the time they were counted]
+        bucket = shard.get(key)
+        if bucket is None:
+            if len(shard) >= self.max_keys:
+                self._evict(shard, now)
+            shard[key] = [self.burst - 1, now]
+            return 0.0
+        shard.move_to_end(key)
+        tokens = bucket[0] + (now - bucket[1]) * self.rate
+        if tokens > self.burst:
+            tokens = self.burst
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return 0.0
+        bucket[0] = tokens
+        return (1 - tokens) / self.rate
+
+    def _evict(self, shard: OrderedDict, now: float) -> None:
+        # the least recently used buckets are on the left
+        deadline = now - self._refill_time
+        while shard:
+            key, (_, last) = next(iter(shard.items()))
+            if last > deadline:
+                break
+            del shard[key]
+        if len(shard) >= self.max_keys:
+            shard.popitem(last=False)
+
+
+def client_ip(request) -> Any:
+    """the default key, the address of the client"""
+    return request.remote_addr
+
+
+class RateLimiter(Middleware):
+    """ Limit the requests per client
+    `routes` is a list of (path prefix, rate, burst) with their own limits,
+    the first matching prefix is used, the other paths share `rate` and
+    `burst`. `key` maps a request to the client, a None key isn't limited
+    >>> app = Application(handlers, middlewares=[
+    ...     RateLimiter(10, burst=20, routes=[('/login', 1, 5)])])
+    """
+
+    def __init__(self, rate: float, burst: float = None, *,
+                 key: Callable = client_ip,
+                 routes: Sequence[Tuple[str, float, float]] = (),
+                 shards: int = 16, max_keys: int = 4096) -> None:
+        self.key = key
+        self.table = TokenBucketTable(rate, burst, shards, max_keys)
+        self.routes = [(prefix, TokenBucketTable(route_rate, route_burst,
+                                                 shards, max_keys))
+                       for prefix, route_rate, route_burst in routes]
+
+    async def before_request(self, request):
+        key = self.key(request)
+        if key is None:
+            return
+        table = self.table
+        path = request.path
+        for prefix, route_table in self.routes:
+            if path.startswith(prefix):
+                table = route_table
+                break
+        wait = table.take(key)
+        if wait:
+            raise HTTPError(429, 'rate limit exceeded',
+                            headers={'Retry-After': str(math.ceil(wait))})
@@ -1,19 +1,24 @@
 import io
-import json
-import cgi
-import urllib.parse as parse
+import time
 from httptools import parse_url
-from imouto.utils import trim_keys
+from imouto.cookies import parse_cookie
 from imouto.datastructures import MultiDict, HeaderDict
+from imouto.querystring import (parse_query, MAX_PARAMS, MAX_KEY_LENGTH,
+                                MAX_VALUE_LENGTH)
 
 
 REQUEST_STATE_PROCESSING = 0
 REQUEST_STATE_CONTINUE = 1
 REQUEST_STATE_COMPLETE = 2
 
+# (max_params, max_key_length, max_value_length) of `parse_query`
+QUERY_LIMITS = (MAX_PARAMS, MAX_KEY_LENGTH, MAX_VALUE_LENGTH)
+
 
 class FileStorage:
 
+    __slots__ = ('filename', 'value')
+
     def __init__(self, field_storage):
         self.filename = field_storage.filename
         self.value = field_storage.value
@@ -21,6 +26,13 @@ class FileStorage:
 
 class Request:
 
+    # a request object is created for every connection, so avoid the
+    # per-instance `__dict__` and build the rarely used members lazily
+    __slots__ = ('_header_list', '_state', 'method', 'path', 'query_string',
+                 '_query', 'args', '_headers', '_cookies', '_raw_body',
+                 'form', 'upgrade_data', 'reader', 'writer', 'deadline',
+                 '_detach_callbacks', 'query_limits')
+
     def __init__(self, method=None, path=None, query_string='',
                  args=None, headers=None, form=None, cookies=None):
         self._header_list = []
@@ -28,55 +40,121 @@ class Request:
         self.method = method
         self.path = path
         self.query_string = query_string
-        self.query = None
+        self._query = None
         self.args = args
-        self.headers = HeaderDict()
-        self.cookies = MultiDict()
-        self.raw_body = io.BytesIO()
+        self._headers = HeaderDict(**headers) if headers else None
+        self._cookies = MultiDict(**cookies) if cookies else None
+        self._raw_body = None
         self.form = form
+        # the bytes after the headers of an upgrade request
+        self.upgrade_data = None
+        # the streams of the connection, for handlers which take it over
+        self.reader = None
+        self.writer = None
+        # `time.monotonic()` when the handler is cancelled, None for never
+        self.deadline = None
+        self._detach_callbacks = None
+        # the limits of the query string, the application sets them from
+        # its `QUERY_*` config. an urlencoded form has the same limits
+        # except the value length, a text area is longer than a query
+        # argument
+        self.query_limits = QUERY_LIMITS
+
+    def reset(self):
+        """ restore the initial state so that the object can be reused """
+        self._header_list = []
+        self._state = REQUEST_STATE_PROCESSING
+        self.method = None
+        self.path = None
+        self.query_string = ''
+        self._query = None
+        self.args = None
+        self._headers = None
+        self._cookies = None
+        self._raw_body = None
+        self.form = None
+        self.upgrade_data = None
+        self.reader = None
+        self.writer = None
+        self.deadline = None
+        self._detach_callbacks = None
+        self.query_limits = QUERY_LIMITS
+
+    @property
+    def query(self):
+        if self._query is None:
+            max_params, max_key_length, max_value_length = self.query_limits
+            self._query = parse_query(
+                self.query_string, max_params=max_params,
+                max_key_length=max_key_length,
+                max_value_length=max_value_length)
+        return self._query
+
+    @property
+    def headers(self):
+        if self._headers is None:
+            self._headers = HeaderDict()
+        return self._headers
 
-        if query_string:
-            self.query = MultiDict(parse.parse_qs(self.query_string))
+    @headers.setter
+    def headers(self, value):
+        self._headers = value
 
-        if headers:
-            self.headers = HeaderDict(**headers)
+    @property
+    def cookies(self):
+        if self._cookies is None:
+            cookie_value = self.headers.get('Cookie')
+            if cookie_value:
+                self._cookies = parse_cookie(cookie_value)
+            else:
+                self._cookies = MultiDict()
+        return self._cookies
 
-        if cookies:
-            self.cookies = MultiDict(**cookies)
+    @cookies.setter
+    def cookies(self, value):
+        self._cookies = value
 
-    def _parse_cookie(self, value):
-        # cookies will be {str: list}
-        cookies = trim_keys(parse.parse_qs(value))
-        return MultiDict(**cookies)
+    @property
+    def raw_body(self):
+        if self._raw_body is None:
+            self._raw_body = io.BytesIO()
+        return self._raw_body
 
     def _parse_form(self, body_stream):
+        # `cgi` pulls in the email package, import it on first upload
+        import cgi
         env = {'REQUEST_METHOD': 'POST'}
         form = cgi.FieldStorage(body_stream, headers=self.headers, environ=env)
-        d = {}
+        pairs = []
         for k in form.keys():
             if form[k].filename:
-                d[k] = [FileStorage(form[k])]
+                pairs.append((k, FileStorage(form[k])))
             else:
-                d[k] = [form[k].value]
-        return MultiDict(d)
+                pairs.append((k, form[k].value))
+        return MultiDict.from_pairs(pairs)
 
     def _parse_body(self, body_stream):
         content_type = self.headers.get('Content-Type', '')
         if content_type.startswith('application/json'):
+            import json
             data = body_stream.getvalue().decode()
             self.form = json.loads(data)
         elif content_type.startswith('multipart/form-data'):
             self.form = self._parse_form(body_stream)
         elif content_type.startswith('application/x-www-form-urlencoded'):
             data = body_stream.getvalue().decode()
-            self.form = MultiDict(parse.parse_qs(data))
+            max_params, max_key_length, _ = self.query_limits
+            self.form = parse_query(
+                data, max_params=max_params,
+                max_key_length=max_key_length, max_value_length=None)
         body_stream.seek(0)
 
     def on_url(self, url: bytes):
         parsed = parse_url(url)
         self.path = parsed.path.decode()
         self.query_string = (parsed.query or b'').decode()
-        self.query = MultiDict(parse.parse_qs(self.query_string))
+        # the query string is parsed on first access of `self.query`
+        self._query = None
 
     def on_header(self, name: bytes, value: bytes):
         self._header_list.append((name.decode(), value.decode()))
@@ -84,23 +162,62 @@ class Request:
             self._state = REQUEST_STATE_CONTINUE
 
     def on_headers_complete(self):
-        self.headers = HeaderDict(self._header_list)
-        cookie_value = self.headers.get('Cookie')
-        if cookie_value:
-            self.cookies = self._parse_cookie(cookie_value)
+        self._headers = HeaderDict(self._header_list)
+        # cookies are parsed on first access of `self.cookies`
+        self._cookies = None
 
     def on_body(self, body: bytes):
         self.raw_body.write(body)
 
     def on_message_complete(self):
         self._state = REQUEST_STATE_COMPLETE
-        self.raw_body.seek(0)
-        self._parse_body(self.raw_body)
+        # no body was sent, nothing to parse
+        if self._raw_body is None:
+            return
+        self._raw_body.seek(0)
+        self._parse_body(self._raw_body)
 
     @property
     def finished(self):
         return self._state == REQUEST_STATE_COMPLETE
 
+    @property
+    def remaining(self):
+        """the seconds left before the deadline, pass it to the
+        downstream calls, None if there is no deadline
+        """
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def on_detach(self, callback) -> None:
+        """call `callback()` if the handler takes over the connection, e.g.
+        to release what is held for the ordinary requests only
+        """
+        if self._detach_callbacks is None:
+            self._detach_callbacks = []
+        self._detach_callbacks.append(callback)
+
+    def detached(self) -> None:
+        """the handler has taken over the connection, run the callbacks"""
+        callbacks, self._detach_callbacks = self._detach_callbacks, None
+        if callbacks:
+            for callback in callbacks:
+                callback()
+
+    @property
+    def remote_addr(self):
+        """the IP address of the client"""
+        if self.writer is None:
+            return None
+        peername = self.writer.get_extra_info('peername')
+        # a Unix socket has no address
+        return peername[0] if isinstance(peername, tuple) else None
+
+    @property
+    def upgrade(self):
+        return self.upgrade_data is not None
+
     @property
     def needs_write_continue(self):
         return self._state == REQUEST_STATE_CONTINUE
@@ -1,15 +1,46 @@
-import time
-import json
+import zlib
 from collections import Mapping
-from http.cookies import SimpleCookie
 from imouto.datastructures import HeaderDict
-from datetime import date as date_t, datetime, timedelta
-from http.client import responses as ALL_STATUS
-from imouto.utils import tob, touni, hkey, hval
+from imouto.errors import STATUS_PHRASES as ALL_STATUS
+from imouto.cookies import set_cookie_header
+from imouto.utils import tob, touni, hval
+
+# the status which must not have a body
+NO_BODY_STATUS = frozenset([101, 204, 304])
+
+
+def weak_etag(chunks) -> str:
+    """a weak validator of the body, crc32 is cheap and good enough to
+    tell the versions of a resource apart
+    """
+    crc = 0
+    size = 0
+    for chunk in chunks:
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+    return 'W/"%x-%08x"' % (size, crc)
+
+
+def etag_matches(etag: str, if_none_match: str) -> bool:
+    """the weak comparison of RFC 7232 used by If-None-Match"""
+    if if_none_match.strip() == '*':
+        return True
+    if etag.startswith('W/'):
+        etag = etag[2:]
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
 
 
 class Response:
 
+    __slots__ = ('version', 'status_code', '_chunks', 'headers', '_cookies',
+                 'detached')
+
     def __init__(self, version='1.1', status_code=200):
         self.version = version
         self.status_code = status_code
@@ -17,11 +48,41 @@ class Response:
         self.headers = HeaderDict([
             ('Content-Type', 'text/html')
         ])
-        self.cookies = SimpleCookie()
+        # most responses never set a cookie, create it on demand
+        self._cookies = None
+        # the handler has taken over the connection, e.g. WebSocket
+        self.detached = False
+
+    def reset(self):
+        """ restore the initial state so that the object can be reused """
+        self.version = '1.1'
+        self.status_code = 200
+        self._chunks = []
+        self.headers = HeaderDict([
+            ('Content-Type', 'text/html')
+        ])
+        self._cookies = None
+        self.detached = False
+
+    @property
+    def cookies(self):
+        """ the values of the Set-Cookie headers by cookie name """
+        if self._cookies is None:
+            self._cookies = {}
+        return self._cookies
 
     def clear(self):
         self._chunks = []
 
+    def not_modified(self):
+        """ turn the response into 304 Not Modified, the headers such as
+        ETag are kept
+        """
+        self.status_code = 304
+        self._chunks = []
+        if 'Content-Type' in self.headers:
+            del self.headers['Content-Type']
+
     def write(self, str_):
         self._chunks.append(tob(str_))
 
@@ -29,6 +90,7 @@ class Response:
         self._chunks.append(bytes_)
 
     def write_json(self, data):
+        import json
         if issubclass(type(data), Mapping):
             data_str = json.dumps(data)
         elif hasattr(data, '_asdict'):
@@ -49,25 +111,12 @@ class Response:
         :param secure: limit the cookie to HTTPS connections (default: off).
         :param httponly: prevents client-side javascript to read this cookie
             (default: off, requires Python 2.6 or newer).
+        :param samesite: 'Strict', 'Lax' or 'None' (default: not sent)
         """
         if len(value) > 4096:
             raise ValueError('cookie value is too long.')
-
-        self.cookies[name.strip()] = hval(value)
-
-        for key, value in options.items():
-            key = hkey(key)
-            if key == 'max_age':
-                if isinstance(value, timedelta):
-                    value = value.seconds + value.days * 24 * 3600
-            if key == 'expires':
-                if isinstance(value, (date_t, datetime)):
-                    value = value.timetuple()
-                elif isinstance(value, (int, float)):
-                    value = time.gmtime(value)
-                assert isinstance(value, tuple)
-                value = time.strftime("%a, %d %b %Y %H:%M:%S GMT", value)
-            self.cookies[name][key] = value
+        name = name.strip()
+        self.cookies[name] = set_cookie_header(name, hval(value), **options)
 
     def clear_cookie(self, key: str, **options):
         """ make the cookie expired
@@ -78,23 +127,28 @@ class Response:
         options['expires'] = 0
         self.set_cookie(key, '', **options)
 
-    def output(self):
-        if 'Content-Length' not in self.headers:
-            self.headers['Content-Length'] = touni(sum(len(_)
-                                                       for _ in self._chunks))
-
+    def output_head(self):
+        """ the status line and the headers, for the responses whose body
+        is streamed by the handler
+        """
         headers = b''.join(b'%b: %b\r\n' % (tob(key), tob(value))
                            for key, value in self.headers.items())
 
-        if self.cookies:
-            headers += tob(self.cookies.output()) + b'\r\n'
+        if self._cookies:
+            headers += b''.join(b'Set-Cookie: %b\r\n' % tob(cookie)
+                                for cookie in self._cookies.values())
         status = ALL_STATUS.get(self.status_code)
         return (b'HTTP/%b %d %b\r\n'
-                b'%b\r\n'
-                b'%b' % (
+                b'%b\r\n' % (
                     tob(self.version),
                     self.status_code,
                     tob(status),
                     headers,
-                    b''.join(self._chunks),
                 ))
+
+    def output(self):
+        if 'Content-Length' not in self.headers and \
+                self.status_code not in NO_BODY_STATUS:
+            self.headers['Content-Length'] = touni(sum(len(_)
+                                                       for _ in self._chunks))
+        return self.output_head() + b''.join(self._chunks)
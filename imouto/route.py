@@ -1,17 +1,162 @@
 import re
+import urllib.parse as parse
 from imouto.utils import tob, url_encode, re_unescape
 
+# for type check
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class Converter:
+    """ Base class of the path parameter converters
+    `regex` matches the parameter in the path, `to_python` converts the
+    matched string and raises ValueError to reject it, `to_url` formats a
+    value for `URLSpec.reverse`
+    """
+
+    regex = '[^/]+'
+
+    def to_python(self, value: str) -> Any:
+        return value
+
+    def to_url(self, value: Any) -> str:
+        return parse.quote(str(value), safe='')
+
+
+class StringConverter(Converter):
+    """ the default converter, the value is URL-decoded, unlike the groups
+    of a plain regex route which are passed as they are in the path
+    """
+
+    def to_python(self, value: str) -> str:
+        return parse.unquote(value)
+
+
+class IntConverter(Converter):
+
+    regex = '[0-9]+'
+
+    def to_python(self, value: str) -> int:
+        return int(value)
+
+
+class UUIDConverter(Converter):
+
+    regex = ('[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-'
+             '[0-9a-fA-F]{4}-[0-9a-fA-F]{12}')
+
+    def to_python(self, value: str):
+        import uuid
+        return uuid.UUID(value)
+
+
+class SlugConverter(Converter):
+
+    regex = '[-a-zA-Z0-9_]+'
+
+
+class PathConverter(StringConverter):
+    """ the rest of the path, slashes included """
+
+    regex = '.+'
+
+    def to_url(self, value: Any) -> str:
+        return url_encode(tob(str(value)), plus=False)
+
+
+CONVERTERS: Dict[str, Converter] = {
+    'str': StringConverter(),
+    'int': IntConverter(),
+    'uuid': UUIDConverter(),
+    'slug': SlugConverter(),
+    'path': PathConverter(),
+}
+
+
+def register_converter(name: str, converter: Converter) -> None:
+    """make `{param:name}` available in the route patterns
+    >>> class HexConverter(Converter):
+    ...     regex = '[0-9a-f]+'
+    ...     def to_python(self, value):
+    ...         return int(value, 16)
+    >>> register_converter('hex', HexConverter())
+    """
+    if isinstance(converter, type):
+        converter = converter()
+    CONVERTERS[name] = converter
+
+
+# `{name}` or `{name:converter}`, a regex quantifier starts with a digit
+_PARAM_RE = re.compile(r'{([a-zA-Z_][a-zA-Z0-9_]*)'
+                       r'(?::([a-zA-Z_][a-zA-Z0-9_]*))?}')
+# regex syntax which would be matched literally around the parameters,
+# '.' is allowed as the literal dot of e.g. '/files/{name}.json'
+_REGEX_SYNTAX_RE = re.compile(r'[\\^$*+?()\[\]{}|]')
+
+
+def _literal(text: str, pattern: str) -> str:
+    match = _REGEX_SYNTAX_RE.search(text)
+    if match is not None:
+        raise ValueError(
+            'regex syntax %r in %r, the text around the {parameters} is '
+            'matched literally, use a converter or a plain regex route'
+            % (match.group(), pattern))
+    return text
+
+
+def compile_pattern(pattern: str) -> Tuple[str, str, List[Tuple]]:
+    """compile `/users/{id:int}` into a regex, the reverse template and the
+    (name, converter) of the parameters, the text between the parameters
+    is literal and must not contain regex syntax, except the anchors '^'
+    and '$' at the ends which are implied
+    """
+    source = pattern
+    if pattern.startswith('^'):
+        pattern = pattern[1:]
+    if pattern.endswith('$'):
+        pattern = pattern[:-1]
+    regex, template, params = [], [], []
+    end = 0
+    for match in _PARAM_RE.finditer(pattern):
+        literal = _literal(pattern[end:match.start()], source)
+        regex.append(re.escape(literal))
+        template.append(literal.replace('%', '%%'))
+        name, converter_name = match.group(1), match.group(2) or 'str'
+        try:
+            converter = CONVERTERS[converter_name]
+        except KeyError:
+            raise ValueError('unknown converter %r in %r'
+                             % (converter_name, source)) from None
+        regex.append('(?P<%s>%s)' % (name, converter.regex))
+        template.append('%s')
+        params.append((name, converter))
+        end = match.end()
+    literal = _literal(pattern[end:], source)
+    regex.append(re.escape(literal))
+    template.append(literal.replace('%', '%%'))
+    return ''.join(regex) + '$', ''.join(template), params
+
 
 class URLSpec(object):
     def __init__(self, pattern, handler, kwargs=None, name=None):
-        if not pattern.endswith('$'):
-            pattern += '$'
-        self.regex = re.compile(pattern)
+        # the parameters converted after matching, identity ones are skipped
+        self._converters: List[Tuple[str, Converter]] = []
+        self._params: Optional[List[Tuple[str, Converter]]] = None
+        if _PARAM_RE.search(pattern):
+            regex, template, self._params = compile_pattern(pattern)
+            self.regex = re.compile(regex)
+            self._path, self._group_count = template, len(self._params)
+            self._converters = [
+                (name, converter) for name, converter in self._params
+                if type(converter).to_python is not Converter.to_python]
+        else:
+            if not pattern.endswith('$'):
+                pattern += '$'
+            self.regex = re.compile(pattern)
+            self._path, self._group_count = self._find_groups()
 
         self.handler_class = handler
         self.kwargs = kwargs or {}
         self.name = name
-        self._path, self._group_count = self._find_groups()
 
     def __repr__(self):
         return '%s(%r, %s, kwargs=%r, name=%r)' % \
@@ -50,9 +195,36 @@ class URLSpec(object):
 
         return (''.join(pieces), self.regex.groups)
 
-    def reverse(self, *args):
+    def match(self, path: str):
+        """return (args, kwargs) for the handler, or None if the path
+        doesn't match or a converter rejects the value
+        """
+        match = self.regex.match(path)
+        if match is None:
+            return None
+        if not self.regex.groups:
+            return (), {}
+        if not self.regex.groupindex:
+            return match.groups(), {}
+        kwargs = match.groupdict()
+        for name, converter in self._converters:
+            try:
+                kwargs[name] = converter.to_python(kwargs[name])
+            except ValueError:
+                return None
+        return (), kwargs
+
+    def reverse(self, *args, **kwargs):
         if self._path is None:
             raise ValueError("Cannot reverse url regex " + self.regex.pattern)
+        if self._params is not None:
+            if kwargs:
+                args = tuple(kwargs[name] for name, _ in self._params)
+            assert len(args) == self._group_count, "required number of " \
+                "arguments not found"
+            return self._path % tuple(
+                converter.to_url(arg)
+                for (_, converter), arg in zip(self._params, args))
         assert len(args) == self._group_count, "required number of arguments "\
             "not found"
         if not len(args):
@@ -2,10 +2,12 @@ import time
 import hmac
 import base64
 import hashlib
-from imouto.utils import tob, touni
+import binascii
+from functools import lru_cache
+from imouto.utils import tob, touni, LRUCache
 
 # for type checking
-from typing import Iterable, Union
+from typing import Iterable, Optional, Sequence, Tuple, Union
 
 
 def create_secure_value(name: str, value: str, *, secret: str) -> bytes:
@@ -19,10 +21,18 @@ def create_secure_value(name: str, value: str, *, secret: str) -> bytes:
     return b"|".join([value_b64, timestamp, signature])
 
 
+@lru_cache(maxsize=16)
+def _keyed_hmac(secret: bytes, digestmod) -> hmac.HMAC:
+    """the key schedule of HMAC is done once per secret, then the object
+    is copied for every signature
+    """
+    return hmac.new(secret, digestmod=digestmod)
+
+
 def _generate_signature(secret: str, *parts: Iterable) -> bytes:
     """generate signature using sha1
     """
-    hash_ = hmac.new(tob(secret), digestmod=hashlib.sha1)
+    hash_ = _keyed_hmac(tob(secret), hashlib.sha1).copy()
     for part in parts:
         hash_.update(tob(part))
     result = tob(hash_.hexdigest())
@@ -47,6 +57,89 @@ def verify_secure_value(name: str, value: Union[str, bytes], *,
         return touni(base64.b64decode(parts[0]))
 
 
+class SecureCookie:
+    """ Sign and verify cookie values with HMAC-SHA256
+    the signed value will be following format
+    b'2|urlsafe base64 value|timestamp|signature'
+    the first secret signs, all of them verify, so a new secret can be put
+    in front of the old one when rotating keys
+    recently verified values are cached, a request carrying the same
+    session cookie doesn't compute the signature again
+    >>> signer = SecureCookie(['new secret', 'old secret'])
+    >>> signed = signer.sign('name', 'value')
+    >>> signer.verify('name', signed)
+    'value'
+    """
+
+    version = b'2'
+
+    def __init__(self, secrets: Union[str, Sequence[str]],
+                 cache_size: int = 1024) -> None:
+        if isinstance(secrets, (str, bytes)):
+            secrets = [secrets]
+        if not secrets:
+            raise ValueError('at least one secret is required')
+        self._hmacs = [hmac.new(tob(secret), digestmod=hashlib.sha256)
+                       for secret in secrets]
+        self._cache = LRUCache(cache_size)
+
+    def _signature(self, hash_: hmac.HMAC, *parts: bytes) -> bytes:
+        hash_ = hash_.copy()
+        hash_.update(b'|'.join(parts))
+        return tob(hash_.hexdigest())
+
+    def sign(self, name: str, value: Union[str, bytes],
+             timestamp: int = None) -> bytes:
+        if timestamp is None:
+            timestamp = int(time.time())
+        # urlsafe without padding, the value needn't be quoted in a cookie
+        value_b64 = base64.urlsafe_b64encode(tob(value)).rstrip(b'=')
+        timestamp_b = tob(str(timestamp))
+        signature = self._signature(self._hmacs[0], tob(name), value_b64,
+                                    timestamp_b)
+        return b'|'.join([self.version, value_b64, timestamp_b, signature])
+
+    def verify(self, name: str, value: Union[str, bytes],
+               max_age: Optional[float] = None) -> Optional[str]:
+        """return the original value if the signature is correct and it is
+        signed less than `max_age` seconds ago, otherwise None
+        """
+        value = tob(value)
+        key = (name, value)
+        try:
+            result, timestamp = self._cache.get(key)
+        except KeyError:
+            verified = self._verify(name, value)
+            if verified is None:
+                return None
+            result, timestamp = verified
+            self._cache.set(key, verified)
+        if max_age is not None and timestamp < time.time() - max_age:
+            return None
+        return result
+
+    def _verify(self, name: str,
+                value: bytes) -> Optional[Tuple[str, int]]:
+        parts = value.split(b'|')
+        if len(parts) != 4 or parts[0] != self.version:
+            return None
+        _, value_b64, timestamp_b, signature = parts
+        name_b = tob(name)
+        for hash_ in self._hmacs:
+            expected = self._signature(hash_, name_b, value_b64, timestamp_b)
+            if hmac.compare_digest(signature, expected):
+                break
+        else:
+            return None
+        try:
+            timestamp = int(timestamp_b)
+            padding = b'=' * (-len(value_b64) % 4)
+            result = touni(base64.urlsafe_b64decode(value_b64 + padding))
+        except (ValueError, binascii.Error):
+            return None
+        return result, timestamp
+
+
 if __name__ == '__main__':
     # fake `time.time`
     time.time = lambda: 1497854241.6677122
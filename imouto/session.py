@@ -0,0 +1,278 @@
+"""
+server side sessions
+
+the browser only keeps a signed session id, a session is loaded from the
+store when the handler reads `self.session` and saved when it is modified
+"""
+
+import abc
+import time
+import pickle
+import secrets
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from imouto.errors import HTTPError
+from imouto.log import app_log
+
+# for type check
+from typing import Any, Dict, Optional
+
+
+class Session(MutableMapping):
+    """ A dict which tracks modification """
+
+    __slots__ = ('sid', 'data', 'is_new', 'modified')
+
+    def __init__(self, sid: str = None, data: Dict = None) -> None:
+        self.is_new = sid is None
+        self.sid = sid or secrets.token_urlsafe(24)
+        self.data = data or {}
+        self.modified = False
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self.data[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return '<%s %s %r>' % (self.__class__.__name__, self.sid, self.data)
+
+
+class SessionStore(abc.ABC):
+    """ Base class
+    the methods but `create` are synchronous and called in the event loop,
+    the stores are in memory or local files
+    """
+
+    def __init__(self, ttl: float = 14 * 86400) -> None:
+        self.ttl = ttl
+
+    def setup(self, app) -> None:
+        """invoked with the application when it prepares to serve"""
+
+    @abc.abstractmethod
+    def load(self, sid: str) -> Optional[Dict]:
+        """the data of the session, None if it doesn't exist"""
+
+    @abc.abstractmethod
+    def save(self, sid: str, data: Dict) -> None:
+        """store the data of the session"""
+
+    @abc.abstractmethod
+    def delete(self, sid: str) -> None:
+        """remove the session"""
+
+    async def create(self, sid: str, data: Dict) -> None:
+        """store a new session, the client receives its id when this
+        returns, so a store which delays the writes must let the other
+        workers load it before
+        """
+        self.save(sid, data)
+
+    def close(self) -> None:
+        """write the pending changes and release the resource"""
+
+
+class MemorySessionStore(SessionStore):
+    """ Sessions in the memory of the process, for single worker setups
+    a session expires `ttl` seconds after its last save
+    """
+
+    def __init__(self, ttl: float = 14 * 86400) -> None:
+        super().__init__(ttl)
+        # sid => (expiration time, data), ordered by expiration time
+        self._sessions: Dict[str, Any] = OrderedDict()
+
+    def _evict(self, now: float) -> None:
+        sessions = self._sessions
+        while sessions:
+            sid, (expires, _) = next(iter(sessions.items()))
+            if expires > now:
+                break
+            del sessions[sid]
+
+    def load(self, sid: str) -> Optional[Dict]:
+        now = time.time()
+        self._evict(now)
+        try:
+            expires, data = self._sessions[sid]
+        except KeyError:
+            return None
+        # a copy, the session is modified before it is saved
+        return dict(data)
+
+    def save(self, sid: str, data: Dict) -> None:
+        now = time.time()
+        self._sessions.pop(sid, None)
+        self._sessions[sid] = (now + self.ttl, dict(data))
+        self._evict(now)
+
+    def delete(self, sid: str) -> None:
+        self._sessions.pop(sid, None)
+
+
+class SQLiteSessionStore(SessionStore):
+    """ Sessions in a local sqlite database shared by the workers
+    a new session is committed at once, a worker may receive the next
+    request of its client. the other writes are batched, they are committed
+    in one transaction when `batch_size` sessions are pending or every
+    `flush_interval` seconds, until then the other workers see the previous
+    data. in an application the commits run in its thread pool, the last
+    one at shutdown, a store used on its own commits in the calling thread
+    """
+
+    def __init__(self, path: str, ttl: float = 14 * 86400,
+                 batch_size: int = 64, flush_interval: float = 1.0) -> None:
+        super().__init__(ttl)
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # sid => data or None for deletion, `_flushing` is the batch being
+        # committed, both are read by `load` until the commit is done
+        self._pending: Dict[str, Optional[Dict]] = {}
+        self._flushing: Dict[str, Optional[Dict]] = {}
+        self._flushed_at = time.time()
+        # `_lock` guards the batches, `_write_lock` keeps the commits in
+        # the order of the batches
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._app = None
+        self._timer = None
+        import sqlite3
+        # the reads in the event loop, the commits in the threads
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._writer = sqlite3.connect(path, isolation_level=None,
+                                       check_same_thread=False)
+        # WAL let the other workers read while one is writing
+        self._writer.execute('PRAGMA journal_mode=WAL')
+        self._writer.execute('PRAGMA synchronous=NORMAL')
+        self._writer.execute('CREATE TABLE IF NOT EXISTS session ('
+                             'sid TEXT PRIMARY KEY, '
+                             'expires REAL NOT NULL, '
+                             'data BLOB NOT NULL)')
+
+    def setup(self, app) -> None:
+        # the application may be prepared again, one timer is kept
+        self._stop()
+        if self._app is not app:
+            app.on_shutdown(self._shutdown)
+        self._app = app
+        self._timer = app.loop.call_later(self.flush_interval, self._tick)
+
+    def _tick(self) -> None:
+        self._timer = self._app.loop.call_later(self.flush_interval,
+                                                self._tick)
+        if self._pending:
+            self._flush_later()
+
+    def _stop(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    async def _shutdown(self) -> None:
+        self._stop()
+        # `close` is left with nothing to commit in the event loop
+        await self._app.thread_pool.run(self.flush)
+
+    def load(self, sid: str) -> Optional[Dict]:
+        with self._lock:
+            for batch in (self._pending, self._flushing):
+                if sid in batch:
+                    data = batch[sid]
+                    return None if data is None else dict(data)
+        row = self._conn.execute(
+            'SELECT data FROM session WHERE sid = ? AND expires > ?',
+            (sid, time.time())).fetchone()
+        return None if row is None else pickle.loads(row[0])
+
+    def save(self, sid: str, data: Dict) -> None:
+        with self._lock:
+            self._pending[sid] = dict(data)
+        self._maybe_flush()
+
+    def delete(self, sid: str) -> None:
+        with self._lock:
+            self._pending[sid] = None
+        self._maybe_flush()
+
+    async def create(self, sid: str, data: Dict) -> None:
+        if self._app is None:
+            self._insert(sid, data)
+        else:
+            await self._app.thread_pool.run(self._insert, sid, data)
+
+    def _insert(self, sid: str, data: Dict) -> None:
+        row = (sid, time.time() + self.ttl, pickle.dumps(data))
+        with self._write_lock:
+            self._writer.execute(
+                'INSERT OR REPLACE INTO session VALUES (?, ?, ?)', row)
+
+    def _maybe_flush(self) -> None:
+        if len(self._pending) >= self.batch_size:
+            if self._app is None:
+                self.flush()
+            else:
+                self._flush_later()
+        elif self._app is None and \
+                time.time() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def _flush_later(self) -> None:
+        try:
+            self._app.thread_pool.submit(self.flush)
+        except HTTPError:
+            # the pool is saturated, the batch waits for the next tick
+            pass
+
+    def flush(self) -> None:
+        """commit the pending writes and remove the expired sessions"""
+        if not self._pending:
+            return
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._flushing = pending
+                self._flushed_at = now = time.time()
+            try:
+                saves = [(sid, now + self.ttl, pickle.dumps(data))
+                         for sid, data in pending.items() if data is not None]
+                deletes = [(sid,) for sid, data in pending.items()
+                           if data is None]
+                with self._writer:
+                    self._writer.execute('BEGIN')
+                    self._writer.executemany(
+                        'INSERT OR REPLACE INTO session VALUES (?, ?, ?)',
+                        saves)
+                    self._writer.executemany(
+                        'DELETE FROM session WHERE sid = ?', deletes)
+                    self._writer.execute(
+                        'DELETE FROM session WHERE expires <= ?', (now,))
+            except Exception:
+                # kept for the next flush, the newer writes win
+                with self._lock:
+                    pending.update(self._pending)
+                    self._pending = pending
+                app_log.exception('Failed to write %d sessions to %s',
+                                  len(pending), self.path)
+            finally:
+                with self._lock:
+                    self._flushing = {}
+
+    def close(self) -> None:
+        self.flush()
+        self._writer.close()
+        self._conn.close()
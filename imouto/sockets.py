@@ -0,0 +1,143 @@
+"""
+the listening sockets of the server
+
+an address is one of
+    'host:port'            TCP, '[::1]:8080' for IPv6
+    'unix:/path/to.sock'   a Unix domain socket
+    'fd://3'               a socket already bound by the supervisor
+the sockets passed by systemd socket activation are used when no address
+is given
+"""
+
+import os
+import sys
+import stat
+import socket
+
+# for type check
+from typing import List, Sequence, Tuple, Union
+
+Address = Union[str, Tuple[str, int]]
+
+# the first descriptor passed by systemd
+SD_LISTEN_FDS_START = 3
+
+
+def parse_address(address: Address) -> Tuple[str, object]:
+    """return ('tcp', (host, port)), ('unix', path) or ('fd', fd)"""
+    if isinstance(address, tuple):
+        return 'tcp', address
+    if address.startswith('unix:'):
+        return 'unix', address[5:]
+    if address.startswith('fd://'):
+        return 'fd', int(address[5:])
+    host, sep, port = address.rpartition(':')
+    if not sep or not port.isdigit():
+        raise ValueError('invalid address %r' % address)
+    return 'tcp', (host.strip('[]'), int(port))
+
+
+def bind_unix(path: str, mode: int = None,
+              backlog: int = 128) -> socket.socket:
+    """bind a Unix socket, a stale socket file left by a crashed process is
+    removed, but not one which still accepts connections
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        pass
+    else:
+        if not stat.S_ISSOCK(st.st_mode):
+            raise OSError('%s exists and is not a socket' % path)
+        with socket.socket(socket.AF_UNIX) as probe:
+            try:
+                probe.connect(path)
+            except ConnectionRefusedError:
+                os.unlink(path)
+            else:
+                raise OSError('%s is already in use' % path)
+
+    sock = socket.socket(socket.AF_UNIX)
+    try:
+        sock.bind(path)
+        if mode is not None:
+            os.chmod(path, mode)
+        sock.listen(backlog)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def bind_tcp(host: str, port: int, backlog: int = 128) -> socket.socket:
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # inherited by the accepted connections, a small write such as the
+        # TLS close_notify after the response isn't held back by Nagle
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.bind((host, port))
+        sock.listen(backlog)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def from_fd(fd: int, backlog: int = 128) -> socket.socket:
+    """take over a bound socket, it is listening afterwards"""
+    if sys.version_info >= (3, 7):
+        sock = socket.socket(fileno=fd)
+    else:
+        # the family is only detected from the descriptor since 3.7
+        probe = socket.socket(fileno=fd)
+        family = probe.getsockopt(socket.SOL_SOCKET, socket.SO_DOMAIN)
+        probe.detach()
+        sock = socket.socket(family, socket.SOCK_STREAM, fileno=fd)
+    sock.listen(backlog)
+    return sock
+
+
+def systemd_sockets(backlog: int = 128) -> List[socket.socket]:
+    """the sockets passed by systemd socket activation, if any"""
+    try:
+        if int(os.environ['LISTEN_PID']) != os.getpid():
+            return []
+        count = int(os.environ['LISTEN_FDS'])
+    except (KeyError, ValueError):
+        return []
+    # not for the child processes
+    for name in ('LISTEN_PID', 'LISTEN_FDS', 'LISTEN_FDNAMES'):
+        os.environ.pop(name, None)
+    return [from_fd(fd, backlog) for fd in
+            range(SD_LISTEN_FDS_START, SD_LISTEN_FDS_START + count)]
+
+
+def bind_sockets(addresses: Sequence[Address], unix_mode: int = None,
+                 backlog: int = 128) -> List[socket.socket]:
+    """create the listening sockets, all or none of them"""
+    sockets = []
+    try:
+        for address in addresses:
+            kind, value = parse_address(address)
+            if kind == 'unix':
+                sockets.append(bind_unix(value, unix_mode, backlog))
+            elif kind == 'fd':
+                sockets.append(from_fd(value, backlog))
+            else:
+                sockets.append(bind_tcp(*value, backlog=backlog))
+    except Exception:
+        for sock in sockets:
+            sock.close()
+        raise
+    return sockets
+
+
+def describe(sock: socket.socket) -> str:
+    name = sock.getsockname()
+    if sock.family == socket.AF_UNIX:
+        return 'unix:%s' % name
+    if sock.family == socket.AF_INET6:
+        return '[%s]:%s' % name[:2]
+    return '%s:%s' % name
@@ -0,0 +1,196 @@
+"""
+Server-Sent Events, the `text/event-stream` format
+"""
+
+import asyncio
+from collections import deque
+from imouto.web import RequestHandler
+from imouto.utils import tob
+
+# for type check
+from typing import Deque, Optional, Set, Tuple, Union
+
+# a comment line, keeps the idle connection alive through proxies
+HEARTBEAT = b':\n\n'
+
+
+def encode_event(data: Union[str, bytes], event: str = None,
+                 id: str = None, retry: int = None) -> bytes:
+    """encode one event, every line of `data` becomes a data field"""
+    lines = []
+    if id is not None:
+        lines.append(b'id: ' + _field(id))
+    if event is not None:
+        lines.append(b'event: ' + _field(event))
+    if retry is not None:
+        lines.append(b'retry: %d' % retry)
+    for line in tob(data).splitlines() or [b'']:
+        lines.append(b'data: ' + line)
+    lines.append(b'\n')
+    return b'\n'.join(lines)
+
+
+def _field(value: Union[str, int]) -> bytes:
+    value = tob(str(value))
+    if b'\n' in value or b'\r' in value:
+        raise ValueError('a field must not contain a newline: %r' % value)
+    return value
+
+
+class Channel:
+    """ Broadcast events to the subscribed connections
+    an event is encoded once and the same bytes are written to every
+    transport. a subscriber whose write buffer grows over `max_buffer`
+    bytes can't keep up and is disconnected, it reconnects with
+    Last-Event-ID and the last `replay_size` events are sent again
+    >>> news = Channel()
+    >>> class NewsHandler(EventStreamHandler):
+    ...     channel = news
+    >>> news.publish('breaking', event='news')
+    """
+
+    def __init__(self, replay_size: int = 256,
+                 max_buffer: int = 256 * 1024) -> None:
+        self.max_buffer = max_buffer
+        self._subscribers: Set[asyncio.Transport] = set()
+        # (id, encoded event)
+        self._history: Deque[Tuple[str, bytes]] = deque(maxlen=replay_size)
+        self._last_id = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, transport: asyncio.Transport,
+                  last_event_id: Optional[str] = None) -> None:
+        """add the transport, the events after `last_event_id` are sent if
+        they are still in the replay buffer, all of them if it is unknown
+        """
+        if last_event_id is not None:
+            frames = []
+            for id_, frame in reversed(self._history):
+                if id_ == last_event_id:
+                    break
+                frames.append(frame)
+            if frames:
+                frames.reverse()
+                if not self._write(transport, b''.join(frames)):
+                    return
+        self._subscribers.add(transport)
+
+    def unsubscribe(self, transport: asyncio.Transport) -> None:
+        self._subscribers.discard(transport)
+
+    def publish(self, data: Union[str, bytes], event: str = None,
+                id: str = None) -> str:
+        """send an event to all subscribers, return its id
+        the id is a sequence number unless one is given
+        """
+        if id is None:
+            self._last_id += 1
+            id = str(self._last_id)
+        frame = encode_event(data, event=event, id=id)
+        self._history.append((id, frame))
+        self.broadcast(frame)
+        return id
+
+    def broadcast(self, frame: bytes) -> None:
+        """write encoded bytes to all subscribers, they are not replayed"""
+        dropped = [transport for transport in self._subscribers
+                   if not self._write(transport, frame)]
+        for transport in dropped:
+            self._subscribers.discard(transport)
+
+    def _write(self, transport: asyncio.Transport, frame: bytes) -> bool:
+        if transport.is_closing():
+            return False
+        transport.write(frame)
+        if transport.get_write_buffer_size() > self.max_buffer:
+            # a slow consumer, drop the buffered data too
+            transport.abort()
+            self.dropped += 1
+            return False
+        return True
+
+    def close(self) -> None:
+        """disconnect all subscribers"""
+        for transport in self._subscribers:
+            transport.close()
+        self._subscribers.clear()
+
+
+class EventStreamHandler(RequestHandler):
+    """ Keep the connection open and stream events
+    subscribe it to a `Channel` through the `channel` attribute, or send
+    events to this connection only with `send`
+    """
+
+    channel: Optional[Channel] = None
+    # seconds between the heartbeats when no data is received
+    heartbeat = 15.0
+    # the reconnection time of the client in milliseconds
+    retry: Optional[int] = None
+    # the connection lives as long as the client wants and this handler
+    # reads it, neither the request deadline nor the disconnect watcher apply
+    timeout = 0
+    cancel_on_disconnect = False
+
+    _writer = None
+    # `send` may be called by several tasks, one of them at a time waits
+    # for the buffer to drain
+    _write_lock = None
+
+    async def open(self, *args, **kwargs):
+        """ invoked before subscribing to the channel """
+
+    async def on_close(self):
+        """ invoked when the client has disconnected """
+
+    @property
+    def last_event_id(self) -> Optional[str]:
+        return self.request.headers.get('Last-Event-Id')
+
+    async def send(self, data: Union[str, bytes], event: str = None,
+                   id: str = None):
+        """send an event to this connection and wait until it is flushed"""
+        async with self._write_lock:
+            self._writer.write(encode_event(data, event=event, id=id))
+            await self._writer.drain()
+
+    async def get(self, *args, **kwargs):
+        res = self.response
+        res.headers['Content-Type'] = 'text/event-stream'
+        res.headers['Cache-Control'] = 'no-cache'
+        self.detach()
+        self._writer = writer = self.request.writer
+        self._write_lock = asyncio.Lock(loop=self.app.loop)
+        writer.write(res.output_head())
+        if self.retry is not None:
+            writer.write(b'retry: %d\n\n' % self.retry)
+        try:
+            await self.open(*args, **kwargs)
+            if self.channel is not None:
+                self.channel.subscribe(writer.transport, self.last_event_id)
+            await self._wait_closed()
+        finally:
+            if self.channel is not None:
+                self.channel.unsubscribe(writer.transport)
+            writer.close()
+            await self.on_close()
+
+    async def _wait_closed(self):
+        reader = self.request.reader
+        transport = self._writer.transport
+        while not transport.is_closing():
+            try:
+                data = await asyncio.wait_for(reader.read(4096),
+                                              self.heartbeat,
+                                              loop=self.app.loop)
+            except asyncio.TimeoutError:
+                if not transport.is_closing():
+                    transport.write(HEARTBEAT)
+                continue
+            except ConnectionError:
+                return
+            if not data:
+                return
@@ -0,0 +1,247 @@
+"""
+test the application without sockets
+
+the request bytes go through the same `Application.__call__` as in
+production, a `asyncio.StreamReader` and `asyncio.StreamWriter` are
+connected to a transport that keeps the written data in memory
+>>> client = TestClient(app)
+>>> response = client.get('/hello', headers={'Accept': 'text/plain'})
+>>> response.status_code, response.text
+(200, 'Hello')
+>>> client.close()
+"""
+
+import json
+import asyncio
+from imouto.datastructures import HeaderDict
+from imouto.utils import tob
+
+# for type check
+from typing import Any, Dict, Iterable, Optional, Union
+
+Body = Union[str, bytes, Iterable[bytes], None]
+
+
+class MemoryTransport(asyncio.Transport):
+    """ A transport which collects the written data """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop,
+                 peername: Any = None) -> None:
+        super().__init__({'peername': peername})
+        self._loop = loop
+        self._protocol = None
+        self._closing = False
+        self.data = bytearray()
+        self.eof = False
+
+    def get_protocol(self):
+        return self._protocol
+
+    def set_protocol(self, protocol):
+        self._protocol = protocol
+
+    def is_closing(self) -> bool:
+        return self._closing
+
+    def write(self, data: bytes) -> None:
+        if not self._closing:
+            self.data += data
+
+    def write_eof(self) -> None:
+        self.eof = True
+
+    def can_write_eof(self) -> bool:
+        return True
+
+    def get_write_buffer_size(self) -> int:
+        return 0
+
+    def pause_reading(self) -> None:
+        pass
+
+    def resume_reading(self) -> None:
+        pass
+
+    def close(self) -> None:
+        if self._closing:
+            return
+        self._closing = True
+        self._loop.call_soon(self._protocol.connection_lost, None)
+
+    def abort(self) -> None:
+        self.close()
+
+
+class TestResponse:
+    """ The response parsed from the bytes written by the application """
+
+    # not a test case, keep pytest from collecting it
+    __test__ = False
+
+    def __init__(self, raw: bytes) -> None:
+        self.raw = raw
+        data = raw
+        # skip the interim responses, e.g. 100 Continue
+        while data.startswith(b'HTTP/1.1 1') and \
+                not data.startswith(b'HTTP/1.1 101'):
+            data = data.partition(b'\r\n\r\n')[2]
+        head, _, body = data.partition(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        _, status, self.reason = (lines[0].split(' ', 2) + [''])[:3]
+        self.status_code = int(status) if status.isdigit() else 0
+        self.headers = HeaderDict()
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            self.headers.add(name, value.strip())
+        length = self.headers.get('Content-Length')
+        self.body = body[:int(length)] if length is not None else body
+
+    def __repr__(self) -> str:
+        return '<TestResponse %d %s>' % (self.status_code, self.reason)
+
+    @property
+    def text(self) -> str:
+        return self.body.decode()
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+    @property
+    def cookies(self) -> Dict[str, str]:
+        """the name and value of the cookies set by the response"""
+        cookies = {}
+        for header in self.headers.get_all('Set-Cookie'):
+            pair = header.split(';', 1)[0]
+            name, _, value = pair.partition('=')
+            cookies[name.strip()] = value.strip()
+        return cookies
+
+
+class TestClient:
+    """ Send requests to the application in memory
+    the connection is closed after every response, like the server does,
+    the cookies set by the responses are kept and sent back with the
+    following requests. `fetch` and `send` are coroutines for the tests
+    running concurrent requests in the loop, the other methods block
+    """
+
+    __test__ = False
+
+    def __init__(self, app, loop: asyncio.AbstractEventLoop = None,
+                 remote_addr: str = '127.0.0.1') -> None:
+        self.app = app
+        self._own_loop = loop is None
+        self.loop = loop if loop is not None else asyncio.new_event_loop()
+        self.peername = (remote_addr, 0)
+        self.cookies: Dict[str, str] = {}
+        app.loop = self.loop
+        app._prepare()
+
+    def __enter__(self) -> 'TestClient':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """call the shutdown hooks, the loop is closed if it is ours"""
+        self.loop.run_until_complete(self.app.shutdown())
+        if self._own_loop:
+            self.loop.close()
+
+    async def send(self, data: Union[bytes, Iterable[bytes]]) -> TestResponse:
+        """send the raw request, the parts of an iterable are received one
+        by one, the application runs between them
+        """
+        loop = self.loop
+        await self.app.startup()
+        transport = MemoryTransport(loop, self.peername)
+        reader = asyncio.StreamReader(loop=loop)
+        protocol = asyncio.StreamReaderProtocol(reader, loop=loop)
+        transport.set_protocol(protocol)
+        protocol.connection_made(transport)
+        writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+
+        if isinstance(data, (bytes, bytearray)):
+            protocol.data_received(data)
+            await self.app(reader, writer)
+        else:
+            task = asyncio.ensure_future(self.app(reader, writer), loop=loop)
+            for chunk in data:
+                protocol.data_received(chunk)
+                await asyncio.sleep(0, loop=loop)
+            await task
+        transport.close()
+        return TestResponse(bytes(transport.data))
+
+    async def fetch(self, method: str, path: str,
+                    headers: Optional[Dict[str, str]] = None,
+                    body: Body = None) -> TestResponse:
+        """send a request, a body which is neither str nor bytes is an
+        iterable of chunks, sent with chunked transfer encoding
+        """
+        headers = HeaderDict(headers or {})
+        if 'Host' not in headers:
+            headers['Host'] = 'localhost'
+        if self.cookies and 'Cookie' not in headers:
+            headers['Cookie'] = '; '.join(
+                '%s=%s' % item for item in self.cookies.items())
+        chunks = ()
+        if isinstance(body, (str, bytes)):
+            body = tob(body)
+            headers['Content-Length'] = str(len(body))
+        elif body is not None:
+            headers['Transfer-Encoding'] = 'chunked'
+            chunks = body
+            body = None
+
+        head = ['%s %s HTTP/1.1' % (method, path)]
+        head.extend('%s: %s' % item for item in headers.items())
+        head = tob('\r\n'.join(head) + '\r\n\r\n')
+        if body is not None:
+            response = await self.send(head + body)
+        else:
+            response = await self.send(_stream(head, chunks))
+
+        for name, value in response.cookies.items():
+            if value:
+                self.cookies[name] = value
+            else:
+                self.cookies.pop(name, None)
+        return response
+
+    def request(self, method: str, path: str,
+                headers: Optional[Dict[str, str]] = None,
+                body: Body = None) -> TestResponse:
+        return self.loop.run_until_complete(
+            self.fetch(method, path, headers, body))
+
+    def get(self, path: str, headers: Optional[Dict[str, str]] = None):
+        return self.request('GET', path, headers)
+
+    def head(self, path: str, headers: Optional[Dict[str, str]] = None):
+        return self.request('HEAD', path, headers)
+
+    def delete(self, path: str, headers: Optional[Dict[str, str]] = None):
+        return self.request('DELETE', path, headers)
+
+    def post(self, path: str, headers: Optional[Dict[str, str]] = None,
+             body: Body = None):
+        return self.request('POST', path, headers, body)
+
+    def put(self, path: str, headers: Optional[Dict[str, str]] = None,
+            body: Body = None):
+        return self.request('PUT', path, headers, body)
+
+    def patch(self, path: str, headers: Optional[Dict[str, str]] = None,
+              body: Body = None):
+        return self.request('PATCH', path, headers, body)
+
+
+def _stream(head: bytes, chunks: Iterable[bytes]) -> Iterable[bytes]:
+    yield head
+    for chunk in chunks:
+        chunk = tob(chunk)
+        if chunk:
+            yield b'%x\r\n%b\r\n' % (len(chunk), chunk)
+    yield b'0\r\n\r\n'
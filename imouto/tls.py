@@ -0,0 +1,51 @@
+"""
+TLS for the server
+
+the context is created once, before the workers are forked, so all of them
+share the session ticket keys and a client resumes its session whichever
+worker accepts the connection. OpenSSL also keeps a session cache in every
+process for the clients which don't support tickets
+"""
+
+import ssl
+
+# for type check
+from typing import Optional, Sequence
+
+# the server only speaks HTTP/1.1
+ALPN_PROTOCOLS = ('http/1.1',)
+
+
+def create_ssl_context(certfile: str, keyfile: Optional[str] = None,
+                       password: Optional[str] = None, *,
+                       alpn_protocols: Sequence[str] = ALPN_PROTOCOLS,
+                       session_tickets: bool = True,
+                       ciphers: Optional[str] = None) -> ssl.SSLContext:
+    """ A server context accepting TLS 1.2 and later
+    `keyfile` may be omitted if the key is in `certfile`
+    """
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.options |= (ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3 | ssl.OP_NO_TLSv1 |
+                        ssl.OP_NO_TLSv1_1 | ssl.OP_NO_COMPRESSION |
+                        ssl.OP_CIPHER_SERVER_PREFERENCE)
+    if not session_tickets:
+        context.options |= ssl.OP_NO_TICKET
+    if ciphers is not None:
+        context.set_ciphers(ciphers)
+    if alpn_protocols and ssl.HAS_ALPN:
+        context.set_alpn_protocols(list(alpn_protocols))
+    context.load_cert_chain(certfile, keyfile, password)
+    return context
+
+
+def reload_cert_chain(context: ssl.SSLContext, certfile: str,
+                      keyfile: Optional[str] = None,
+                      password: Optional[str] = None) -> None:
+    """ load a renewed certificate into the running context
+    the new connections use it, the established ones and the session
+    ticket keys are kept. the files are checked with a scratch context
+    first, a broken pair leaves the current certificate in place
+    """
+    ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER).load_cert_chain(
+        certfile, keyfile, password)
+    context.load_cert_chain(certfile, keyfile, password)
@@ -163,6 +163,41 @@ class LRUCache:
         return 'capacity: {} {}'.format(self.capacity, result.__repr__())
 
 
+class ObjectPool:
+    """ A bounded free list of reusable objects
+    `obj.reset()` is called on release if the object provides it
+    >>> pool = ObjectPool(list, 1)
+    >>> obj = pool.acquire()
+    >>> pool.release(obj)
+    >>> pool.acquire() is obj
+    True
+    """
+
+    __slots__ = ('_factory', '_free', 'maxsize')
+
+    def __init__(self, factory, maxsize=128):
+        self._factory = factory
+        self._free = []
+        self.maxsize = maxsize
+
+    def acquire(self):
+        try:
+            return self._free.pop()
+        except IndexError:
+            return self._factory()
+
+    def release(self, obj):
+        # drop the object if the pool is full, gc will collect it
+        if len(self._free) < self.maxsize:
+            reset = getattr(obj, 'reset', None)
+            if reset is not None:
+                reset()
+            self._free.append(obj)
+
+    def __len__(self):
+        return len(self._free)
+
+
 if __name__ == '__main__':
     import doctest
     doctest.testmod(verbose=False)
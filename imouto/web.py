@@ -1,19 +1,24 @@
+import time
 import asyncio
-import traceback
-import logging.config
 from collections import OrderedDict
 from imouto import Request, Response
-from imouto.autoload import autoload
+from imouto.request import QUERY_LIMITS
+from imouto.response import weak_etag, etag_matches
 from imouto.route import URLSpec
-from imouto.datastructures import ImmutableDict
+from imouto.datastructures import ImmutableDict, HeaderDict
 from imouto.config import Config, ConfigAttribute
+from imouto.middleware import compile_middlewares
+from imouto.executor import ThreadPool, ProcessPool, is_coroutine_function
+from imouto.secure import SecureCookie
+from imouto.session import Session, MemorySessionStore
 from imouto.log import access_log, app_log, DEFAULT_LOGGING
-from imouto.utils import hkey, hval, touni, Singleton
+from imouto.utils import hkey, hval, touni, Singleton, ObjectPool
 from imouto.errors import HTTPError, MethodNotAllowed  # type: ignore
-from httptools import HttpRequestParser
+from httptools import (HttpRequestParser, HttpParserUpgrade,
+                       HttpParserCallbackError)
 
 # for type check
-from typing import Tuple, List, Mapping, Any
+from typing import Tuple, List, Any, Callable, Dict, Optional, Sequence
 
 
 def log(status_code: int, method: str, path: str, query_string: str) -> None:
@@ -36,9 +41,32 @@ def log(status_code: int, method: str, path: str, query_string: str) -> None:
     })
 
 
+class _NotModified(Exception):
+    """ raised by `RequestHandler.set_etag` to skip the handler """
+
+
 class RequestHandler:
     """ Base class """
 
+    # compute an ETag from the body of GET and HEAD responses and answer
+    # 304 if the client has it, None means the `ETAG` config decides
+    auto_etag = None
+    # share one execution between the identical GET and HEAD requests
+    # which arrive while it runs, they are identical if the method, path,
+    # query string and the values of `coalesce_headers` are equal. the
+    # cookies set by the handler are only sent to the request running it
+    coalesce = False
+    coalesce_headers: Tuple[str, ...] = ()
+    # False while the handler runs for several coalesced requests, their
+    # If-None-Match headers are checked afterwards one by one
+    _conditional = True
+    # seconds before the handler is cancelled with 504 Gateway Timeout and
+    # whether it is cancelled when the client disconnects, None means the
+    # `REQUEST_TIMEOUT` or `CANCEL_ON_DISCONNECT` config decides and 0 means
+    # no deadline, e.g. for the handlers which take over the connection
+    timeout: float = None
+    cancel_on_disconnect: bool = None
+
     def __init__(self, app, request: Request, response: Response,
                  **kwargs) -> None:
         """subclass should override initialize method rather than this
@@ -46,6 +74,7 @@ class RequestHandler:
         self.app = app
         self.request = request
         self.response = response
+        self._session = None
         self.initialize(**kwargs)
 
     def initialize(self, **kwargs):
@@ -75,6 +104,18 @@ class RequestHandler:
     async def options(self, *args, **kwargs):
         raise MethodNotAllowed  # pragma: no cover
 
+    async def run_in_executor(self, func: Callable, *args, **kwargs):
+        """ run blocking code in the application thread pool """
+        return await self.app.thread_pool.run(func, *args, **kwargs)
+
+    async def run_in_process(self, func: Callable, *args,
+                             timeout: float = None, **kwargs):
+        """ run CPU-bound code in the application process pool
+        `func` and the arguments must be picklable
+        """
+        return await self.app.process_pool.run(func, *args, timeout=timeout,
+                                               **kwargs)
+
     def write(self, chunk: str):
         """ write data to the response buffer
         chunk may be other types for example None
@@ -95,6 +136,33 @@ class RequestHandler:
             self.response.status_code = 302
         self.response.headers['Location'] = url
 
+    def set_etag(self, etag: str, weak: bool = False):
+        """ set the ETag header, for example from a version column
+        if the client already has this version, the handler is stopped
+        here and 304 Not Modified is sent, or 412 Precondition Failed for
+        the methods other than GET and HEAD, e.g. a PUT with
+        `If-None-Match: *` must not replace an existing resource
+        """
+        if not etag.startswith(('"', 'W/"')):
+            etag = '"%s"' % etag
+        if weak and not etag.startswith('W/'):
+            etag = 'W/' + etag
+        self.response.headers['Etag'] = etag
+        if not self._conditional:
+            return
+        if_none_match = self.request.headers.get('If-None-Match')
+        if if_none_match and etag_matches(etag, if_none_match):
+            if self.request.method in ('GET', 'HEAD'):
+                raise _NotModified
+            raise HTTPError(412)
+
+    def detach(self):
+        """ take over the connection, the application won't write the
+        response, the handler writes to `self.request.writer` itself
+        """
+        self.response.detached = True
+        self.request.detached()
+
     def get_query_argument(self, name: str, default: Any = None):
         """ get parameter from query string """
         return self.request.query.get(name, default)
@@ -131,6 +199,59 @@ class RequestHandler:
     def clear_cookie(self, key: str, **options):
         return self.response.clear_cookie(key, **options)
 
+    def get_secure_cookie(self, name: str, value: str = None,
+                          max_age: float = 31 * 86400):
+        """ get the cookie signed by `set_secure_cookie`
+        return None if the signature is invalid or it is older than
+        `max_age` seconds
+        """
+        if value is None:
+            value = self.get_cookie(name)
+        if not value:
+            return None
+        return self.app.secure_cookie.verify(name, value, max_age=max_age)
+
+    def set_secure_cookie(self, name: str, value: str, **options):
+        """ sign the value with `Application.secret_key` and set it """
+        signed = self.app.secure_cookie.sign(name, value)
+        return self.set_cookie(name, touni(signed), **options)
+
+    @property
+    def session(self) -> Session:
+        """ the server side session, it is loaded on first access
+        mutating a value in place isn't detected, set `modified` to True
+        """
+        if self._session is None:
+            config = self.app.config
+            sid = self.get_secure_cookie(config['SESSION_COOKIE_NAME'],
+                                         max_age=config['SESSION_MAX_AGE'])
+            data = self.app.session_store.load(sid) if sid else None
+            if data is None:
+                self._session = Session()
+            else:
+                self._session = Session(sid, data)
+        return self._session
+
+    async def _save_session(self):
+        """ write the session back if it has been modified """
+        session = self._session
+        if session is None or not session.modified:
+            return
+        config = self.app.config
+        name = config['SESSION_COOKIE_NAME']
+        if session:
+            if session.is_new:
+                await self.app.session_store.create(session.sid,
+                                                    session.data)
+                self.set_secure_cookie(name, session.sid, httponly=True,
+                                       max_age=config['SESSION_MAX_AGE'])
+            else:
+                self.app.session_store.save(session.sid, session.data)
+        elif not session.is_new:
+            # an emptied session is removed
+            self.app.session_store.delete(session.sid)
+            self.clear_cookie(name)
+
 
 class RedirectHandler(RequestHandler):
     """this handler do nothing, just redirect
@@ -151,6 +272,7 @@ class Application(metaclass=Singleton):
 
     debug = ConfigAttribute('DEBUG')
     testing = ConfigAttribute('TESTING')
+    # a list of secrets is allowed, the first one signs the secure cookies
     secret_key = ConfigAttribute('SECRET_KEY')
     root_path = None
 
@@ -158,16 +280,85 @@ class Application(metaclass=Singleton):
         'DEBUG': False,
         'TESTING': False,
         'SECRET_KEY': 'imouto-web-framework',
+        # reuse Request/Response objects, 0 means disabled
+        # handlers must not keep a reference to them after responding
+        'OBJECT_POOL_SIZE': 0,
+        # the pool for the handlers defined with `def` instead `async def`
+        'THREAD_POOL_SIZE': 8,
+        'THREAD_POOL_QUEUE_SIZE': 128,
+        # the pool for CPU-bound work, None means the number of CPUs
+        'PROCESS_POOL_SIZE': None,
+        # bytes arguments and results from this size use shared memory
+        'PROCESS_POOL_SHM_THRESHOLD': 64 * 1024,
+        'SESSION_COOKIE_NAME': 'imouto_session',
+        'SESSION_MAX_AGE': 14 * 86400,
+        # see `RequestHandler.auto_etag`
+        'ETAG': False,
+        # see `RequestHandler.timeout` and `cancel_on_disconnect`
+        'REQUEST_TIMEOUT': None,
+        'CANCEL_ON_DISCONNECT': False,
+        # the limits of the query string and the urlencoded forms, a
+        # request exceeding them is answered with 400, None means no limit
+        'QUERY_MAX_PARAMS': 1000,
+        'QUERY_MAX_KEY_LENGTH': 256,
+        'QUERY_MAX_VALUE_LENGTH': 8 * 1024,
     })
 
-    def __init__(self, handlers=None, config=None, default_handler=None):
+    def __init__(self, handlers=None, config=None, default_handler=None,
+                 middlewares=None):
         self._handlers = OrderedDict()
         if handlers:
             self.add_handlers(handlers)
 
         self.default_handler = default_handler
 
-        self.config = config or Config()
+        self._middlewares = list(middlewares or [])
+        # the compiled middleware chain, built in `_prepare`
+        self._handle = self._dispatch
+
+        if config is None:
+            config = self.config_class(defaults=self.default_config)
+        else:
+            for key, value in self.default_config.items():
+                config.setdefault(key, value)
+        self.config = config
+
+        self._request_pool = None
+        self._response_pool = None
+        # `Request.query_limits` of the requests, from the `QUERY_*` config
+        self._query_limits = QUERY_LIMITS
+        # the shared executions of the coalesced requests
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+        # the pooled requests still used by work which outlived them
+        self._lingering: Dict[Request, Any] = {}
+        self.thread_pool = None
+        self.process_pool = None
+
+        self._secure_cookie = None
+        self._secure_cookie_secret = None
+        # `imouto.session.SessionStore`, in memory if it isn't set
+        self.session_store = None
+
+        self._startup_hooks: List[Callable] = []
+        self._shutdown_hooks: List[Callable] = []
+        self._started = False
+        # the event loop the application runs in, set by `run`
+        self.loop = None
+        # `ssl.SSLContext` of the server, and the files of the certificate
+        # loaded again on SIGHUP if `run` created it
+        self.ssl_context = None
+        self._cert_chain: Tuple = None
+
+    @property
+    def secure_cookie(self) -> SecureCookie:
+        """the signer of secure cookies, built again if the secret changes
+        """
+        secret = self.secret_key
+        if self._secure_cookie is None or \
+                self._secure_cookie_secret is not secret:
+            self._secure_cookie = SecureCookie(secret)
+            self._secure_cookie_secret = secret
+        return self._secure_cookie
 
     def add_handlers(self, handlers: List[Tuple[str, str]]):
         """Append handlers to handler list
@@ -175,39 +366,99 @@ class Application(metaclass=Singleton):
         for route, handler in handlers:
             self._handlers[route] = URLSpec(route, handler)
 
+    def add_middleware(self, middleware):
+        """Append a middleware, the first added is the outermost layer
+        """
+        self._middlewares.append(middleware)
+
+    def on_startup(self, func: Callable) -> Callable:
+        """Register a function called in the event loop before the server
+        accepts connections, for example to open connection pools
+        it can be used as a decorator
+        """
+        self._startup_hooks.append(func)
+        return func
+
+    def on_shutdown(self, func: Callable) -> Callable:
+        """Register a function called in the event loop after the server
+        is closed, the hooks are called in reverse order of registration
+        """
+        self._shutdown_hooks.append(func)
+        return func
+
+    async def startup(self):
+        """Call the startup hooks, only the first call has effect"""
+        if self._started:
+            return
+        self._started = True
+        for func in self._startup_hooks:
+            rv = func()
+            if asyncio.iscoroutine(rv):
+                await rv
+
+    async def shutdown(self):
+        """Call the shutdown hooks if the application is started"""
+        if not self._started:
+            return
+        self._started = False
+        for func in reversed(self._shutdown_hooks):
+            try:
+                rv = func()
+                if asyncio.iscoroutine(rv):
+                    await rv
+            except Exception:
+                # the other resources still need to be released
+                app_log.exception('Error in shutdown hook %r', func)
+        # the pending session writes
+        self.session_store.close()
+
     def _find_handler(self, path: str):
         """Find the corresponding handler for the path
         if nothing mathed but having default handler, use default
         otherwise 404 Not Found
         """
 
-        path_args: List[str] = []
-        path_kwargs: Mapping[str, str] = {}
         for spec in self._handlers:
-            match = spec.regex.match(path)
-            if match:
-                handler_class = spec.handler_class
+            # the typed parameters are converted, a malformed value doesn't
+            # match, so it ends in 404 without creating a handler
+            matched = spec.match(path)
+            if matched is not None:
                 # TODO
                 # handler_kwargs = spec.kwargs
-                if spec.regex.groups:
-                    if spec.regex.groupindex:
-                        path_kwargs = match.groupdict()
-                    else:
-                        path_args = match.groups()
-                return handler_class, path_args, path_kwargs
-        return self.default_handler, path_args, path_kwargs
-
-    async def _parse_request(self, request_reader: asyncio.StreamReader,
-                             response_writer: asyncio.StreamWriter) -> Request:
-        """parse data from StreamReader and build the request object
+                return spec.handler_class, matched[0], matched[1]
+        return self.default_handler, (), {}
+
+    def _new_request(self) -> Request:
+        if self._request_pool is None:
+            req = Request()
+        else:
+            req = self._request_pool.acquire()
+        req.query_limits = self._query_limits
+        return req
+
+    async def _parse_request(self, req: Request,
+                             request_reader: asyncio.StreamReader,
+                             response_writer: asyncio.StreamWriter) -> None:
+        """parse data from StreamReader into the request object
         """
         limit = 2 ** 16
-        req = Request()
         parser = HttpRequestParser(req)
 
         while True:
             data = await request_reader.read(limit)
-            parser.feed_data(data)
+            try:
+                parser.feed_data(data)
+            except HttpParserUpgrade as e:
+                # the rest belongs to the upgraded protocol
+                req.upgrade_data = data[e.args[0]:]
+                break
+            except HttpParserCallbackError as e:
+                # raised by the request while parsing the body, e.g. a form
+                # over the limits, is answered as raised by the handler
+                if isinstance(e.__context__, HTTPError):
+                    req.method = touni(parser.get_method()).upper()
+                    raise e.__context__ from None
+                raise
             if req.finished or not data:
                 break
             elif req.needs_write_continue:
@@ -215,7 +466,8 @@ class Application(metaclass=Singleton):
                 req.reset_state()
 
         req.method = touni(parser.get_method()).upper()
-        return req
+        req.reader = request_reader
+        req.writer = response_writer
 
     async def _execute(self, handler_class: type,
                        req: Request, args, kwargs):
@@ -224,23 +476,194 @@ class Application(metaclass=Singleton):
         if handler_class is None:
             raise HTTPError(404)
 
-        res = Response()
+        res = None
+        if getattr(handler_class, 'coalesce', False) and \
+                method in ('GET', 'HEAD'):
+            coro = self._execute_coalesced(handler_class, req, args, kwargs)
+        else:
+            # created here so the guard knows if the handler detached it
+            res = self._new_response()
+            coro = self._run_handler(handler_class, req, args, kwargs, res)
+
+        timeout = getattr(handler_class, 'timeout', None)
+        if timeout is None:
+            timeout = self.config['REQUEST_TIMEOUT']
+        watch = getattr(handler_class, 'cancel_on_disconnect', None)
+        if watch is None:
+            watch = self.config['CANCEL_ON_DISCONNECT']
+        if timeout or watch and req.reader is not None:
+            res = await self._run_guarded(coro, req, res, timeout, watch)
+        else:
+            res = await coro
+
+        if res.status_code == 200 and method in ('GET', 'HEAD'):
+            auto_etag = getattr(handler_class, 'auto_etag', None)
+            if auto_etag or auto_etag is None and self.config['ETAG']:
+                self._check_etag(req, res)
+        return res
+
+    async def _run_guarded(self, coro, req: Request, res: Optional[Response],
+                           timeout: float, watch: bool) -> Response:
+        """run the handler until the deadline or the client disconnects
+        `res` is the response of the handler, None for a coalesced request
+        """
+        loop = self.loop
+        task = loop.create_task(coro)
+        waiters = [task]
+        if timeout:
+            req.deadline = time.monotonic() + timeout
+        watcher = None
+        if watch and req.reader is not None:
+            watcher = loop.create_task(self._wait_disconnected(req))
+            waiters.append(watcher)
+        try:
+            done, _ = await asyncio.wait(waiters, timeout=timeout, loop=loop,
+                                         return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+        if task in done:
+            return task.result()
+
+        task.cancel()
+        # let the handler clean up before its request is released
+        await asyncio.wait([task], loop=loop)
+        disconnected = watcher is not None and watcher in done
+        if disconnected or res is not None and res.detached:
+            # nobody would read the response, or the handler has written to
+            # the connection already and an error response would corrupt it
+            req.writer.close()
+            if res is None:
+                res = self._new_response()
+            res.status_code = 499 if disconnected else 504
+            res.detached = True
+            return res
+        raise HTTPError(504, 'the handler timed out after %ss' % timeout)
+
+    async def _wait_disconnected(self, req: Request) -> None:
+        """return when the client closes the connection
+        a client which only shuts down its sending side is treated as
+        disconnected too, HTTP clients don't do that in practice
+        """
+        try:
+            # the connection isn't reused, so the data after the request
+            # can be dropped
+            while await req.reader.read(2 ** 16):
+                pass
+        except ConnectionError:
+            pass
+
+    async def _execute_coalesced(self, handler_class: type,
+                                 req: Request, args, kwargs) -> Response:
+        """wait for the execution of an identical request or start one
+        """
+        headers = req.headers
+        key = (req.method, req.path, req.query_string) + tuple(
+            headers.get(name) for name in handler_class.coalesce_headers)
+        task = self._inflight.get(key)
+        is_leader = task is None
+        if is_leader:
+            task = self.loop.create_task(
+                self._run_shared(key, handler_class, req, args, kwargs))
+            self._inflight[key] = task
+        # a client which goes away cancels its own wait only
+        try:
+            status_code, header_list, body, cookies = await asyncio.shield(
+                task, loop=self.loop)
+        except asyncio.CancelledError:
+            if is_leader:
+                # the shared execution goes on with this request
+                self._linger(req, task)
+            raise
+        res = self._new_response()
+        res.status_code = status_code
+        res.headers = HeaderDict(header_list)
+        # the body is encoded once and shared
+        res.write_bytes(body)
+        if is_leader:
+            res._cookies = cookies
+        if status_code == 200 and 'Etag' in res.headers:
+            # the ETag set by the handler against the validator of this
+            # request, not the one of the request which ran it
+            self._check_etag(req, res)
+        return res
+
+    async def _run_shared(self, key: Tuple, handler_class: type,
+                          req: Request, args, kwargs) -> Tuple:
+        try:
+            res = await self._run_handler(handler_class, req, args, kwargs,
+                                          conditional=False)
+        finally:
+            del self._inflight[key]
+        result = (res.status_code, list(res.headers.items()),
+                  b''.join(res._chunks), res._cookies)
+        if self._response_pool is not None:
+            self._response_pool.release(res)
+        return result
+
+    async def _run_handler(self, handler_class: type,
+                           req: Request, args, kwargs,
+                           res: Optional[Response] = None,
+                           conditional: bool = True) -> Response:
+        """create the handler and call the method of the request
+        `conditional` is False if `set_etag` mustn't answer 304 by itself
+        """
+        method = req.method
+        if res is None:
+            res = self._new_response()
         is_magic_route = getattr(handler_class, '_magic_route', False)
         if is_magic_route:
-            await getattr(handler_class, method.lower())(
-                req, res, *args, **kwargs)
+            func = getattr(handler_class, method.lower())
+            args = (req, res) + tuple(args)
         else:
             handler = handler_class(self, req, res)
-            await getattr(handler, method.lower())(*args, **kwargs)
+            if not conditional:
+                handler._conditional = False
+            func = getattr(handler, method.lower())
+        try:
+            if is_coroutine_function(func):
+                await func(*args, **kwargs)
+            else:
+                # synchronous handler, don't block the event loop
+                work = self.thread_pool.submit(func, *args, **kwargs)
+                try:
+                    await asyncio.wrap_future(work, loop=self.loop)
+                except asyncio.CancelledError:
+                    # a thread can't be interrupted, it goes on with the
+                    # request and the response
+                    self._linger(req, work)
+                    raise
+        except _NotModified:
+            res.not_modified()
+        if not is_magic_route:
+            await handler._save_session()
         return res
 
+    def _check_etag(self, req: Request, res: Response):
+        """add the ETag of the body, answer 304 if the client has it"""
+        etag = res.headers.get('Etag')
+        if etag is None:
+            etag = res.headers['Etag'] = weak_etag(res._chunks)
+        if_none_match = req.headers.get('If-None-Match')
+        if if_none_match and etag_matches(etag, if_none_match):
+            res.not_modified()
+
+    async def _dispatch(self, req: Request) -> Response:
+        """find the handler and execute it, the innermost middleware layer
+        """
+        handler_class, args, kwargs = self._find_handler(req.path)
+        return await self._execute(handler_class, req, args, kwargs)
+
     async def __call__(self, request_reader: asyncio.StreamReader,
                        response_writer: asyncio.StreamWriter):
+        req = self._new_request()
         try:
-            req = await self._parse_request(request_reader, response_writer)
-            handler_class, args, kwargs = self._find_handler(req.path)
+            await self._parse_request(req, request_reader, response_writer)
             try:
-                res = await self._execute(handler_class, req, args, kwargs)
+                res = await self._handle(req)
             except HTTPError as e:
                 res = self._handle_error(e)
         except Exception as e:
@@ -249,28 +672,66 @@ class Application(metaclass=Singleton):
         # output the access log)
         log(status_code=res.status_code, method=req.method,
             path=req.path, query_string=req.query_string)
-        self._write_response(res, response_writer)
-        await response_writer.drain()
-        response_writer.close()
+        if not res.detached:
+            self._write_response(res, response_writer)
+            await response_writer.drain()
+            response_writer.close()
+
+        if self._request_pool is not None:
+            self._release(req, res)
+
+    def _linger(self, req: Request, work) -> None:
+        """keep the pooled `req` out of the pool until `work`, a future
+        which still uses it, is done
+        """
+        if self._request_pool is not None:
+            self._lingering[req] = work
+
+    def _release(self, req: Request, res: Response) -> None:
+        """put the request and its response back to the pools, at once or
+        when the work still using them is done
+        """
+        work = self._lingering.pop(req, None)
+        if work is None or work.done():
+            self._request_pool.release(req)
+            self._response_pool.release(res)
+            return
+        loop = self.loop
+
+        def release(_):
+            # called in the worker thread for the work of the thread pool
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self._release, req, res)
+        work.add_done_callback(release)
+
+    def _new_response(self) -> Response:
+        if self._response_pool is None:
+            return Response()
+        return self._response_pool.acquire()
 
     def _handle_error(self, e: Exception):
-        res = Response()
+        res = self._new_response()
         # clear the response body when there is an exception
         res.clear()
         if isinstance(e, HTTPError):
             res.status_code = e.status_code
+            for key, value in e.headers.items():
+                res.headers[key] = value
             res.write(str(e))
         else:
             res.status_code = 500
             # only debug mode should show traceback
             if self.debug:
+                import traceback
                 res.write('\n' + traceback.format_exc())
         return res
 
     def _write_response(self, res, writer: asyncio.StreamWriter):
         """get chunk from Response object and build http resposne"""
         writer.write(res.output())
-        writer.write_eof()
+        # a TLS connection can't be half closed
+        if writer.can_write_eof():
+            writer.write_eof()
 
     def _prepare(self):
         """convert self._handlers to list"""
@@ -279,29 +740,105 @@ class Application(metaclass=Singleton):
         if isinstance(self._handlers, OrderedDict):
             self._handlers = list(self._handlers.values())
 
-    def test_server(self, loop: asyncio.AbstractEventLoop):
-        """only for unittest"""
+        pool_size = self.config['OBJECT_POOL_SIZE']
+        if pool_size and self._request_pool is None:
+            self._request_pool = ObjectPool(Request, pool_size)
+            self._response_pool = ObjectPool(Response, pool_size)
+
+        if self.thread_pool is None:
+            self.thread_pool = ThreadPool(
+                self.config['THREAD_POOL_SIZE'],
+                self.config['THREAD_POOL_QUEUE_SIZE'], loop=self.loop)
+        if self.session_store is None:
+            self.session_store = MemorySessionStore(
+                self.config['SESSION_MAX_AGE'])
+        self.session_store.setup(self)
+        if self.process_pool is None:
+            self.process_pool = ProcessPool(
+                self.config['PROCESS_POOL_SIZE'],
+                shm_threshold=self.config['PROCESS_POOL_SHM_THRESHOLD'],
+                loop=self.loop)
+
+        self._query_limits = (self.config['QUERY_MAX_PARAMS'],
+                              self.config['QUERY_MAX_KEY_LENGTH'],
+                              self.config['QUERY_MAX_VALUE_LENGTH'])
+
+        for middleware in self._middlewares:
+            middleware.setup(self)
+        # no per-request lookup of the hooks, and no cost without middleware
+        self._handle = compile_middlewares(self._middlewares, self._dispatch)
+
+    def test_server(self, loop: asyncio.AbstractEventLoop, ssl=None):
+        """only for unittest, `ssl` is a `ssl.SSLContext` for HTTPS"""
         # only here use this module
         import socket
         sock = socket.socket()
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         sock.bind(('127.0.0.1', 0))
+        self.loop = loop
         self._prepare()
-        coro = asyncio.start_server(self.__call__, sock=sock, loop=loop)
+        loop.run_until_complete(self.startup())
+        coro = asyncio.start_server(self.__call__, sock=sock, ssl=ssl,
+                                    loop=loop)
         server = loop.run_until_complete(coro)
         return server, sock.getsockname()
 
+    def reload_config(self) -> set:
+        """load the configuration files again, it is called on SIGHUP"""
+        try:
+            changed = self.config.reload()
+        except Exception:
+            app_log.exception('Failed to reload the configuration')
+            return set()
+        app_log.info('Configuration reloaded, changed: %s'
+                     % (', '.join(sorted(changed)) or 'nothing'))
+        return changed
+
+    def reload_certificate(self) -> bool:
+        """load the certificate files given to `run` again, the new
+        connections use them, it is called on SIGHUP
+        """
+        if self._cert_chain is None:
+            return False
+        from imouto.tls import reload_cert_chain
+        try:
+            reload_cert_chain(self.ssl_context, *self._cert_chain)
+        except Exception:
+            app_log.exception('Failed to reload the certificate')
+            return False
+        app_log.info('Certificate reloaded from %s' % self._cert_chain[0])
+        return True
+
+    def _on_sighup(self):
+        self.reload_config()
+        self.reload_certificate()
+
     def run(self, *, host: str = '127.0.0.1', port: int = 8080,
+            bind: Sequence[str] = None, unix_mode: int = None,
+            certfile: str = None, keyfile: str = None, ssl=None,
             loop_policy: asyncio.AbstractEventLoopPolicy = None,
-            log_config: dict = DEFAULT_LOGGING, debug=None):
-        """run"""
+            log_config: dict = DEFAULT_LOGGING, debug=None,
+            workers: int = 1):
+        """run
+        `bind` is a list of addresses to listen on instead of `host` and
+        `port`, e.g. ['unix:/run/imouto.sock', 'fd://3'], see
+        `imouto.sockets`. `unix_mode` is the permission of the Unix sockets
+        created here, they are removed on exit. without `bind` the sockets
+        of systemd socket activation are used if there are some
+        HTTPS is served with the certificate in `certfile` and the key in
+        `keyfile`, see `imouto.tls`, or with the `ssl.SSLContext` in `ssl`
+        with `workers` > 1 the listening sockets are shared by that many
+        forked processes, SIGHUP and SIGTERM sent to the master process are
+        forwarded to them
+        """
         if debug is not None:
             self.debug = debug
 
-        self._prepare()
-
         if self.debug:
-            autoload()
+            from imouto.autoload import autoload
+            autoload(extra_files=self.config.files)
 
+        import logging.config
         logging.config.dictConfig(log_config)
         if loop_policy:
             # For example `uvloop` can improve performance significantly
@@ -309,18 +846,99 @@ class Application(metaclass=Singleton):
             # asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
             asyncio.set_event_loop_policy(loop_policy)
 
+        import os
+        from imouto.sockets import (bind_sockets, systemd_sockets, describe,
+                                    parse_address)
+        if certfile is not None:
+            from imouto.tls import create_ssl_context
+            ssl = create_ssl_context(certfile, keyfile)
+            self._cert_chain = (certfile, keyfile)
+        self.ssl_context = ssl
+        if bind is None:
+            sockets = systemd_sockets() or bind_sockets([(host, port)])
+        else:
+            sockets = bind_sockets(bind, unix_mode)
+        app_log.info('Running on %s%s %s(Press CTRL+C to quit)'
+                     % ('https ' if ssl else '',
+                        ', '.join(map(describe, sockets)),
+                        '[debug mode]' if self.debug else ''))
+        try:
+            if workers > 1:
+                self._run_workers(workers, sockets)
+            else:
+                self._serve(sockets)
+        finally:
+            for sock in sockets:
+                sock.close()
+            # the socket files created above
+            for kind, path in map(parse_address, bind or ()):
+                if kind == 'unix' and os.path.exists(path):
+                    os.unlink(path)
+
+    def _run_workers(self, workers: int, sockets: List):
+        """fork the workers and wait for them"""
+        import os
+        import signal
+        pids = set()
+        for _ in range(workers):
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    self._serve(sockets)
+                finally:
+                    os._exit(0)
+            pids.add(pid)
+        app_log.info('Started %d workers: %s'
+                     % (workers, ' '.join(map(str, sorted(pids)))))
+
+        def forward(signum, frame):
+            for pid in pids:
+                try:
+                    os.kill(pid, signum)
+                except ProcessLookupError:
+                    pass
+        signal.signal(signal.SIGHUP, forward)
+        signal.signal(signal.SIGTERM, forward)
+        while pids:
+            try:
+                pid, _ = os.wait()
+            except KeyboardInterrupt:
+                # the workers in the same process group got SIGINT too
+                continue
+            except ChildProcessError:
+                break
+            pids.discard(pid)
+
+    def _serve(self, sockets: List):
+        """run the server in the current process until it is interrupted
+        """
+        import signal
+        import socket
         loop = asyncio.get_event_loop()
         loop.set_debug(True)
-        app_log.info('Running on %s:%s %s(Press CTRL+C to quit)'
-                     % (host, port, '[debug mode]' if self.debug else ''))
-        # mypy doesn't know self mean, use self.__call__ explicitly
-        coro = asyncio.start_server(self.__call__, host, port, loop=loop)
-        server = loop.run_until_complete(coro)
-        # loop.create_task(asyncio.start_server(self.__call__, host, port))
+        self.loop = loop
+        self._prepare()
+        loop.run_until_complete(self.startup())
+        loop.add_signal_handler(signal.SIGHUP, self._on_sighup)
+        loop.add_signal_handler(signal.SIGTERM, loop.stop)
+        servers = []
+        for sock in sockets:
+            if sock.family == getattr(socket, 'AF_UNIX', None):
+                start_server = asyncio.start_unix_server
+            else:
+                start_server = asyncio.start_server
+            # mypy doesn't know self mean, use self.__call__ explicitly
+            coro = start_server(self.__call__, sock=sock,
+                                ssl=self.ssl_context, loop=loop)
+            servers.append(loop.run_until_complete(coro))
         try:
             loop.run_forever()
         except KeyboardInterrupt:
             pass
-        server.close()
-        loop.run_until_complete(server.wait_closed())
+        for server in servers:
+            server.close()
+            loop.run_until_complete(server.wait_closed())
+        loop.run_until_complete(self.shutdown())
+        self.thread_pool.shutdown()
+        self.process_pool.shutdown()
         loop.close()
@@ -0,0 +1,424 @@
+"""
+WebSocket (RFC 6455) with the permessage-deflate extension (RFC 7692)
+"""
+
+import zlib
+import base64
+import struct
+import asyncio
+import hashlib
+from imouto.errors import HTTPError
+from imouto.web import RequestHandler
+from imouto.datastructures import HeaderDict
+from imouto.utils import tob, touni
+
+# for type check
+from typing import List, Optional, Union
+
+GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+CLOSE_NORMAL = 1000
+CLOSE_GOING_AWAY = 1001
+CLOSE_PROTOCOL_ERROR = 1002
+CLOSE_UNSUPPORTED_DATA = 1003
+CLOSE_ABNORMAL = 1006
+CLOSE_INVALID_DATA = 1007
+CLOSE_MESSAGE_TOO_BIG = 1009
+
+# the empty block which ends a deflate message, RFC 7692 section 7.2.1
+_DEFLATE_TAIL = b'\x00\x00\xff\xff'
+
+
+class WebSocketError(Exception):
+    """ Violation of the protocol, the connection is closed with `code` """
+
+    def __init__(self, code: int, reason: str = '') -> None:
+        super().__init__(code, reason)
+        self.code = code
+        self.reason = reason
+
+
+class WebSocketClosed(Exception):
+    """ Raised when sending on a closed connection """
+
+
+def accept_key(key: Union[str, bytes]) -> str:
+    """the value of Sec-WebSocket-Accept for Sec-WebSocket-Key"""
+    return touni(base64.b64encode(hashlib.sha1(tob(key) + GUID).digest()))
+
+
+def apply_mask(mask: bytes, data: bytes) -> bytes:
+    """xor the data with the 4 bytes mask, as one big integer operation
+    instead of a loop over the bytes
+    """
+    size = len(data)
+    if not size:
+        return data
+    mask = (mask * (size // 4 + 1))[:size]
+    return (int.from_bytes(data, 'little') ^
+            int.from_bytes(mask, 'little')).to_bytes(size, 'little')
+
+
+def build_frame(opcode: int, payload: bytes, *, fin: bool = True,
+                rsv1: bool = False, mask: bytes = None) -> bytes:
+    """encode a frame, the server never masks, a client must
+    """
+    first = opcode | (0x80 if fin else 0) | (0x40 if rsv1 else 0)
+    mask_bit = 0x80 if mask else 0
+    size = len(payload)
+    if size < 126:
+        header = struct.pack('!BB', first, mask_bit | size)
+    elif size < 1 << 16:
+        header = struct.pack('!BBH', first, mask_bit | 126, size)
+    else:
+        header = struct.pack('!BBQ', first, mask_bit | 127, size)
+    if mask:
+        return header + mask + apply_mask(mask, payload)
+    return header + payload
+
+
+def parse_extensions(header: str) -> List[tuple]:
+    """parse Sec-WebSocket-Extensions into [(name, {param: value})]"""
+    extensions = []
+    for extension in header.split(','):
+        parts = [part.strip() for part in extension.split(';')]
+        if not parts[0]:
+            continue
+        params = {}
+        for param in parts[1:]:
+            key, _, value = param.partition('=')
+            params[key.strip()] = value.strip().strip('"') or None
+        extensions.append((parts[0], params))
+    return extensions
+
+
+class PerMessageDeflate:
+    """ The state of the negotiated permessage-deflate extension """
+
+    def __init__(self, params: dict, level: int = 6) -> None:
+        self.server_no_context_takeover = \
+            'server_no_context_takeover' in params
+        self.server_max_window_bits = 15
+        bits = params.get('server_max_window_bits')
+        if bits is not None:
+            if not bits.isdigit() or not 8 <= int(bits) <= 15:
+                raise ValueError('invalid server_max_window_bits')
+            # zlib doesn't support 8
+            self.server_max_window_bits = max(int(bits), 9)
+        self.level = level
+        self._compressor = None
+        # the client may use any window size, the largest one decodes all
+        self._decompressor = zlib.decompressobj(-15)
+
+    def response_header(self) -> str:
+        header = 'permessage-deflate'
+        if self.server_no_context_takeover:
+            header += '; server_no_context_takeover'
+        if self.server_max_window_bits != 15:
+            header += '; server_max_window_bits=%d' % (
+                self.server_max_window_bits)
+        return header
+
+    def compress(self, data: bytes) -> bytes:
+        if self._compressor is None or self.server_no_context_takeover:
+            self._compressor = zlib.compressobj(
+                self.level, zlib.DEFLATED, -self.server_max_window_bits)
+        data = self._compressor.compress(data)
+        data += self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data.endswith(_DEFLATE_TAIL):
+            data = data[:-4]
+        return data
+
+    def decompress(self, data: bytes, max_size: int) -> bytes:
+        data = self._decompressor.decompress(data + _DEFLATE_TAIL, max_size)
+        if self._decompressor.unconsumed_tail:
+            raise WebSocketError(CLOSE_MESSAGE_TOO_BIG, 'message too big')
+        return data
+
+
+class WebSocketHandler(RequestHandler):
+    """ Base class, route it like a `RequestHandler` and override `open`,
+    `on_message` and `on_close`
+    >>> class EchoHandler(WebSocketHandler):
+    ...     async def on_message(self, message):
+    ...         await self.write_message(message)
+    """
+
+    # a larger message closes the connection with 1009
+    max_message_size = 1 << 20
+    # offer permessage-deflate to the clients which support it
+    compression = False
+    compression_level = 6
+    # `write_message` waits when more bytes are buffered for the client
+    max_write_buffer = 1 << 16
+    # seconds to wait for the close frame of the client
+    close_timeout = 5.0
+    # the connection lives as long as the client wants and this handler
+    # reads it, neither the request deadline nor the disconnect watcher apply
+    timeout = 0
+    cancel_on_disconnect = False
+
+    # the per-connection state, set in `get`
+    _reader = None
+    _writer = None
+    # the frames are sent by the receiving loop and by the tasks of the
+    # application, one of them at a time waits for the buffer to drain
+    _write_lock = None
+    _buffer = b''
+    _deflate = None
+    _closed = False
+    _close_handle = None
+    close_code = None
+    close_reason = None
+
+    async def open(self, *args, **kwargs):
+        """ invoked when the connection is established """
+
+    async def on_message(self, message: Union[str, bytes]):
+        """ invoked for every complete message, text messages are str """
+
+    async def on_ping(self, data: bytes):
+        """ invoked when a ping is received, the pong is already sent """
+
+    async def on_pong(self, data: bytes):
+        """ invoked when a pong is received """
+
+    async def on_close(self):
+        """ invoked when the connection is closed """
+
+    def select_subprotocol(self, subprotocols: List[str]) -> Optional[str]:
+        """ choose one of the subprotocols requested by the client """
+        return None
+
+    async def get(self, *args, **kwargs):
+        self._handshake()
+        try:
+            await self.open(*args, **kwargs)
+            await self._receive_loop()
+        finally:
+            self._closed = True
+            if self._close_handle is not None:
+                self._close_handle.cancel()
+            self._writer.close()
+            await self.on_close()
+
+    def _handshake(self):
+        req = self.request
+        headers = req.headers
+        if not req.upgrade or \
+                headers.get('Upgrade', '').lower() != 'websocket':
+            raise HTTPError(400, 'Can "Upgrade" only to "WebSocket"')
+        if 'upgrade' not in headers.get('Connection', '').lower():
+            raise HTTPError(400, '"Connection" must be "Upgrade"')
+        if headers.get('Sec-Websocket-Version') != '13':
+            raise HTTPError(426, 'unsupported WebSocket version',
+                            headers={'Sec-WebSocket-Version': '13'})
+        key = headers.get('Sec-Websocket-Key')
+        if not key:
+            raise HTTPError(400, 'missing Sec-WebSocket-Key')
+
+        res = self.response
+        res.status_code = 101
+        res.headers = HeaderDict([
+            ('Upgrade', 'websocket'),
+            ('Connection', 'Upgrade'),
+            ('Sec-WebSocket-Accept', accept_key(key)),
+        ])
+        protocols = headers.get('Sec-Websocket-Protocol')
+        if protocols:
+            subprotocol = self.select_subprotocol(
+                [p.strip() for p in protocols.split(',')])
+            if subprotocol:
+                res.headers['Sec-WebSocket-Protocol'] = subprotocol
+        extensions = headers.get('Sec-Websocket-Extensions')
+        if self.compression and extensions:
+            for name, params in parse_extensions(extensions):
+                if name != 'permessage-deflate':
+                    continue
+                try:
+                    self._deflate = PerMessageDeflate(
+                        params, self.compression_level)
+                except ValueError:
+                    continue
+                res.headers['Sec-WebSocket-Extensions'] = \
+                    self._deflate.response_header()
+                break
+
+        self._reader, self._writer = req.reader, req.writer
+        self._buffer = req.upgrade_data or b''
+        self.detach()
+        self._write_lock = asyncio.Lock(loop=self.app.loop)
+        self._writer.transport.set_write_buffer_limits(
+            high=self.max_write_buffer)
+        self._writer.write(res.output())
+
+    async def _read(self, size: int) -> bytes:
+        if self._buffer:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+            if len(data) == size:
+                return data
+            return data + await self._reader.readexactly(size - len(data))
+        return await self._reader.readexactly(size)
+
+    async def _read_frame(self):
+        first, second = await self._read(2)
+        fin = first & 0x80
+        rsv1 = first & 0x40
+        opcode = first & 0x0F
+        if first & 0x30 or (rsv1 and self._deflate is None):
+            raise WebSocketError(CLOSE_PROTOCOL_ERROR, 'reserved bits set')
+        if not second & 0x80:
+            raise WebSocketError(CLOSE_PROTOCOL_ERROR, 'frame not masked')
+        size = second & 0x7F
+        if opcode >= OP_CLOSE:
+            if not fin or size > 125:
+                raise WebSocketError(CLOSE_PROTOCOL_ERROR,
+                                     'invalid control frame')
+        elif size == 126:
+            size, = struct.unpack('!H', await self._read(2))
+        elif size == 127:
+            size, = struct.unpack('!Q', await self._read(8))
+        if size > self.max_message_size:
+            raise WebSocketError(CLOSE_MESSAGE_TOO_BIG, 'message too big')
+        mask = await self._read(4)
+        payload = apply_mask(mask, await self._read(size))
+        return fin, rsv1, opcode, payload
+
+    async def _receive_loop(self):
+        fragments: List[bytes] = []
+        received = 0
+        message_opcode = None
+        compressed = False
+        try:
+            while True:
+                fin, rsv1, opcode, payload = await self._read_frame()
+                if opcode >= OP_CLOSE:
+                    if await self._handle_control(opcode, payload):
+                        return
+                    continue
+                if opcode == OP_CONTINUATION:
+                    if message_opcode is None:
+                        raise WebSocketError(CLOSE_PROTOCOL_ERROR,
+                                             'unexpected continuation')
+                elif opcode in (OP_TEXT, OP_BINARY):
+                    if message_opcode is not None:
+                        raise WebSocketError(CLOSE_PROTOCOL_ERROR,
+                                             'expected continuation')
+                    message_opcode = opcode
+                    compressed = bool(rsv1)
+                else:
+                    raise WebSocketError(CLOSE_PROTOCOL_ERROR,
+                                         'unknown opcode')
+                received += len(payload)
+                if received > self.max_message_size:
+                    raise WebSocketError(CLOSE_MESSAGE_TOO_BIG,
+                                         'message too big')
+                fragments.append(payload)
+                if not fin:
+                    continue
+
+                data = b''.join(fragments)
+                if compressed:
+                    data = self._deflate.decompress(
+                        data, self.max_message_size + 1)
+                    if len(data) > self.max_message_size:
+                        raise WebSocketError(CLOSE_MESSAGE_TOO_BIG,
+                                             'message too big')
+                if message_opcode == OP_TEXT:
+                    try:
+                        data = data.decode('utf-8')
+                    except UnicodeDecodeError:
+                        raise WebSocketError(CLOSE_INVALID_DATA,
+                                             'invalid utf-8') from None
+                fragments = []
+                received = 0
+                message_opcode = None
+                await self.on_message(data)
+        except WebSocketError as e:
+            await self._send_close(e.code, e.reason)
+            self.close_code, self.close_reason = e.code, e.reason
+        except (asyncio.IncompleteReadError, ConnectionError):
+            if self.close_code is None:
+                self.close_code = CLOSE_ABNORMAL
+
+    async def _handle_control(self, opcode: int, payload: bytes) -> bool:
+        """return True if the connection is closed"""
+        if opcode == OP_PING:
+            await self._send_frame(OP_PONG, payload)
+            await self.on_ping(payload)
+        elif opcode == OP_PONG:
+            await self.on_pong(payload)
+        elif opcode == OP_CLOSE:
+            code, reason = CLOSE_NORMAL, ''
+            if len(payload) >= 2:
+                code, = struct.unpack('!H', payload[:2])
+                reason = touni(payload[2:], err='replace')
+            elif payload:
+                raise WebSocketError(CLOSE_PROTOCOL_ERROR, 'invalid close')
+            self.close_code, self.close_reason = code, reason
+            if not self._closed:
+                # echo the close frame
+                await self._send_close(code)
+            return True
+        else:
+            raise WebSocketError(CLOSE_PROTOCOL_ERROR, 'unknown opcode')
+        return False
+
+    async def _send_frame(self, opcode: int, payload: bytes,
+                          rsv1: bool = False):
+        async with self._write_lock:
+            if self._writer.transport.is_closing():
+                raise WebSocketClosed
+            self._writer.write(build_frame(opcode, payload, rsv1=rsv1))
+            # backpressure, wait until the buffer is under the limit
+            await self._writer.drain()
+
+    async def _send_close(self, code: int, reason: str = ''):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self._send_frame(OP_CLOSE,
+                                   struct.pack('!H', code) + tob(reason))
+        except (WebSocketClosed, ConnectionError):
+            pass
+
+    async def write_message(self, message: Union[str, bytes],
+                            binary: bool = None):
+        """send a message, str is sent as text and bytes as binary unless
+        `binary` is given
+        """
+        if self._closed:
+            raise WebSocketClosed
+        if binary is None:
+            binary = isinstance(message, (bytes, bytearray))
+        opcode = OP_BINARY if binary else OP_TEXT
+        data = tob(message)
+        if self._deflate is not None:
+            await self._send_frame(opcode, self._deflate.compress(data),
+                                   rsv1=True)
+        else:
+            await self._send_frame(opcode, data)
+
+    async def ping(self, data: bytes = b''):
+        if self._closed:
+            raise WebSocketClosed
+        await self._send_frame(OP_PING, tob(data))
+
+    async def close(self, code: int = CLOSE_NORMAL, reason: str = ''):
+        """send a close frame and wait `close_timeout` for the client to
+        answer, the receiving loop ends when it does
+        """
+        if self._closed:
+            return
+        await self._send_close(code, reason)
+        self.close_code, self.close_reason = code, reason
+        self._close_handle = self.app.loop.call_later(
+            self.close_timeout, self._writer.close)
@@ -3,6 +3,7 @@ import asyncio
 import pytest
 from asyncio import test_utils
 from imouto.utils import tob, hkey
+from imouto.testing import TestClient
 
 
 class Client(test_utils.TestCase):
@@ -16,9 +17,16 @@ class Client(test_utils.TestCase):
         # just in case if we have transport close callbacks
         test_utils.run_briefly(self.loop)
 
+        self.loop.run_until_complete(self.app.shutdown())
         self.loop.close()
+        # the worker threads must be gone before `threading_cleanup`
+        if self.app.thread_pool is not None:
+            self.app.thread_pool.shutdown()
+        if self.app.process_pool is not None:
+            self.app.process_pool.shutdown()
         # clear
         type(self.app)._instances = {}
+        self.app = None
         gc.collect()
         super().tearDown()
 
@@ -45,23 +53,10 @@ class Client(test_utils.TestCase):
         self.app = app
 
     def _get_response(self, request_data):
-
-        async def client(addr, loop, request_data):
-            reader, writer = await asyncio.open_connection(*addr, loop=loop)
-            # send a line
-            writer.write(request_data)
-            # read it back
-            response_data = await reader.read()
-            writer.close()
-            return response_data
-
-        server, addr = self.app.test_server(self.loop)
-        response_data = self.loop.run_until_complete(
-            asyncio.Task(client(addr, self.loop, request_data),
-                         loop=self.loop))
-        server.close()
-        self.loop.run_until_complete(server.wait_closed())
-        return response_data
+        # in memory, through the same `Application.__call__` as a socket
+        client = TestClient(self.app, self.loop)
+        response = self.loop.run_until_complete(client.send(request_data))
+        return response.raw
 
     def get(self, path, **headers):
         request = self._generate_request(path=tob(path),
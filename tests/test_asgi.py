@@ -0,0 +1,122 @@
+import asyncio
+from imouto.web import RequestHandler, Application
+from imouto.asgi import ASGIAdapter
+from imouto.sse import EventStreamHandler
+
+
+class EchoHandler(RequestHandler):
+
+    async def get(self, name):
+        self.set_cookie('name', name)
+        self.write('%s %s %s' % (name, self.get_query_argument('q'),
+                                 self.request.remote_addr))
+
+    async def post(self, name):
+        self.write(self.request.raw_body.getvalue().decode())
+
+
+class StreamHandler(EventStreamHandler):
+
+    heartbeat = 0.01
+
+    async def open(self):
+        await self.send('first')
+
+
+def scope(method='GET', path='/', query_string=b'', headers=()):
+    return {'type': 'http', 'asgi': {'version': '3.0'},
+            'http_version': '1.1', 'method': method, 'scheme': 'http',
+            'path': path, 'query_string': query_string,
+            'headers': list(headers), 'client': ('10.0.0.1', 4321),
+            'server': ('127.0.0.1', 8000)}
+
+
+def call(loop, adapter, scope, messages, until=None):
+    """run the adapter, `messages` are received in turn and the client
+    disconnects once the response is complete or `until` is sent
+    """
+    sent = []
+    done = asyncio.Event(loop=loop)
+    messages = list(messages)
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+        if message.get('more_body') is False or \
+                message['type'] == 'http.response.body' and \
+                'more_body' not in message or \
+                until is not None and message.get('body') == until:
+            done.set()
+
+    loop.run_until_complete(adapter(scope, receive, send))
+    return sent
+
+
+def test_asgi_http(client):
+    app = Application([(r'/echo/(?P<name>\w+)', EchoHandler)])
+    client.feed(app)
+    app.loop = client.loop
+    adapter = ASGIAdapter(app)
+    start, body = call(client.loop, adapter,
+                       scope(path='/echo/imouto', query_string=b'q=1'),
+                       [{'type': 'http.request'}])
+    assert start['status'] == 200
+    headers = dict(start['headers'])
+    assert headers[b'content-length'] == b'17'
+    assert headers[b'set-cookie'] == b'name=imouto'
+    assert body['body'] == b'imouto 1 10.0.0.1'
+
+    # the body arrives in parts
+    start, body = call(client.loop, adapter,
+                       scope('POST', '/echo/x'),
+                       [{'type': 'http.request', 'body': b'ab',
+                         'more_body': True},
+                        {'type': 'http.request', 'body': b'cd'}])
+    assert body['body'] == b'abcd'
+
+    start, _ = call(client.loop, adapter, scope(path='/missing'),
+                    [{'type': 'http.request'}])
+    assert start['status'] == 404
+
+
+def test_asgi_stream(client):
+    app = Application([(r'/stream', StreamHandler)])
+    client.feed(app)
+    app.loop = client.loop
+    sent = call(client.loop, ASGIAdapter(app), scope(path='/stream'),
+                [{'type': 'http.request'}], until=b':\n\n')
+    assert sent[0]['type'] == 'http.response.start'
+    assert (b'content-type', b'text/event-stream') in sent[0]['headers']
+    # every write is sent at once
+    assert sent[1] == {'type': 'http.response.body',
+                       'body': b'data: first\n\n', 'more_body': True}
+    assert sent[2]['body'] == b':\n\n'
+    # the client has gone, nothing more is sent
+    assert len(sent) == 3
+
+
+def test_asgi_lifespan(client):
+    calls = []
+    app = Application([])
+    app.on_startup(lambda: calls.append('startup'))
+    app.on_shutdown(lambda: calls.append('shutdown'))
+    client.feed(app)
+    app.loop = client.loop
+    sent = []
+    messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message['type'])
+
+    client.loop.run_until_complete(
+        ASGIAdapter(app)({'type': 'lifespan'}, receive, send))
+    assert calls == ['startup', 'shutdown']
+    assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
@@ -0,0 +1,45 @@
+import os
+import time
+import pytest
+from imouto.autoload import InotifyWatcher, PollingWatcher, create_watcher
+
+
+def check_watcher(watcher, path, other):
+    try:
+        assert watcher.wait(0.01) == set()
+        # a file in the same directory which is not watched
+        with open(other, 'w') as f:
+            f.write('y')
+        assert watcher.wait(0.01) == set()
+        start = time.time()
+        with open(path, 'w') as f:
+            f.write('y')
+        os.utime(path, (start + 1, start + 1))
+        assert watcher.wait(1) == {path}
+        # the events of the same change are drained
+        watcher.wait(0.01)
+        assert watcher.wait(0.01) == set()
+    finally:
+        watcher.close()
+
+
+@pytest.mark.parametrize('watcher_class', [InotifyWatcher, PollingWatcher])
+def test_watcher(tmpdir, watcher_class):
+    path = str(tmpdir.join('app.py'))
+    other = str(tmpdir.join('other.py'))
+    with open(path, 'w') as f:
+        f.write('x')
+    try:
+        watcher = watcher_class([path])
+    except (OSError, AttributeError):
+        pytest.skip('inotify is unavailable')
+    check_watcher(watcher, path, other)
+
+
+def test_create_watcher(tmpdir):
+    path = str(tmpdir.join('app.py'))
+    with open(path, 'w') as f:
+        f.write('x')
+    watcher = create_watcher([path])
+    assert isinstance(watcher, (InotifyWatcher, PollingWatcher))
+    watcher.close()
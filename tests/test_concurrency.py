@@ -0,0 +1,136 @@
+import asyncio
+from imouto.web import RequestHandler, Application
+from imouto.sse import EventStreamHandler
+from imouto.concurrency import ConcurrencyLimiter
+
+
+class SlowHandler(RequestHandler):
+
+    async def get(self):
+        await asyncio.sleep(0.05, loop=self.app.loop)
+        self.write('done')
+
+
+def fetch_all(client, paths):
+    server, addr = client.app.test_server(client.loop)
+
+    async def fetch(path):
+        reader, writer = await asyncio.open_connection(*addr,
+                                                       loop=client.loop)
+        writer.write(b'GET %b HTTP/1.1\r\n\r\n' % path)
+        response = await reader.read()
+        writer.close()
+        return response
+
+    responses = client.loop.run_until_complete(asyncio.gather(
+        *[fetch(path) for path in paths], loop=client.loop))
+    server.close()
+    client.loop.run_until_complete(server.wait_closed())
+    return responses
+
+
+def test_load_shedding(client):
+    limiter = ConcurrencyLimiter(1, queue_size=1, retry_after=3,
+                                 priority=['/health'])
+    app = Application([(r'/', SlowHandler), (r'/health', SlowHandler)],
+                      middlewares=[limiter])
+    client.feed(app)
+    responses = fetch_all(client, [b'/', b'/', b'/', b'/health'])
+    statuses = sorted(response[9:12] for response in responses)
+    # one is handled, one waits, one is rejected and the health check
+    # isn't counted
+    assert statuses == [b'200', b'200', b'200', b'503']
+    rejected, = [r for r in responses if r.startswith(b'HTTP/1.1 503 ')]
+    assert b'Retry-After: 3\r\n' in rejected
+    assert limiter.stats() == {'limit': 1, 'in_flight': 0, 'queued': 0,
+                               'rejected': 1}
+
+
+def test_queue_timeout(client):
+    limiter = ConcurrencyLimiter(1, queue_size=10, queue_timeout=0.01)
+    client.feed(Application([(r'/', SlowHandler)], middlewares=[limiter]))
+    responses = fetch_all(client, [b'/', b'/'])
+    assert sorted(response[9:12] for response in responses) == \
+        [b'200', b'503']
+    assert limiter.stats()['in_flight'] == 0
+
+
+def test_application_subclass(client):
+    class MyApp(Application):
+        pass
+
+    limiter = ConcurrencyLimiter(1, queue_size=1)
+    client.feed(MyApp([(r'/', SlowHandler)], middlewares=[limiter]))
+    # the queued request waits on the loop of the running application
+    responses = fetch_all(client, [b'/', b'/'])
+    assert [response[9:12] for response in responses] == [b'200', b'200']
+    assert Application not in Application._instances
+
+
+def test_adaptive_limit():
+    limiter = ConcurrencyLimiter(8, target_latency=0.1, min_limit=2,
+                                 max_limit=12, backoff=0.5)
+    limiter._in_flight = 8
+    # slow, decreased once per `target_latency`
+    limiter._release(0.5)
+    limiter._release(0.5)
+    assert limiter.limit == 4
+    limiter._decreased_at = 0
+    limiter._release(0.5)
+    assert limiter.limit == 2
+
+    # in time but the limit isn't reached, nothing to learn
+    limiter._in_flight = 1
+    limiter._release(0.01)
+    assert limiter.limit == 2
+    # grows by about one per `limit` requests at the limit
+    for _ in range(3):
+        limiter._in_flight = 3
+        limiter._release(0.01)
+    assert limiter.limit == 3
+    for _ in range(100):
+        limiter._in_flight = limiter.limit + 1
+        limiter._release(0.01)
+    assert limiter.limit == 12
+
+
+def test_detached_handler(client):
+    class FastHandler(RequestHandler):
+
+        async def get(self):
+            self.write('done')
+
+    class StreamHandler(EventStreamHandler):
+        heartbeat = 0.02
+
+    limiter = ConcurrencyLimiter(2, queue_size=0, target_latency=0.05)
+    client.feed(Application([(r'/', FastHandler), (r'/events', StreamHandler)],
+                            middlewares=[limiter]))
+    server, addr = client.app.test_server(client.loop)
+
+    async def connect(path):
+        reader, writer = await asyncio.open_connection(*addr,
+                                                       loop=client.loop)
+        writer.write(b'GET %b HTTP/1.1\r\n\r\n' % path)
+        return reader, writer
+
+    async def main():
+        streams = [await connect(b'/events') for _ in range(2)]
+        for reader, _ in streams:
+            await reader.readuntil(b'\r\n\r\n')
+        # the streams give their slots back once they take over
+        assert limiter.stats()['in_flight'] == 0
+        reader, writer = await connect(b'/')
+        assert (await reader.read()).startswith(b'HTTP/1.1 200 ')
+        writer.close()
+        await asyncio.sleep(0.1, loop=client.loop)
+        for _, writer in streams:
+            writer.close()
+        await asyncio.sleep(0.05, loop=client.loop)
+
+    client.loop.run_until_complete(main())
+    server.close()
+    client.loop.run_until_complete(server.wait_closed())
+    # and their lifetime isn't taken for the latency of a slow request
+    assert limiter.limit == 2
+    assert limiter.stats()['in_flight'] == 0
@@ -1,4 +1,11 @@
+import os
+import sys
 import json
+import time
+import signal
+import socket
+import subprocess
+import pytest
 
 from imouto.config import ConfigAttribute, Config
 
@@ -39,3 +46,114 @@ def test_config_attribute():
     assert 'foo' in a.x
     a.x = json.dumps({'a': 1})
     assert 'a' in a.config['n_x']
+
+
+def test_config_files(tmpdir):
+    tmpdir.join('settings.py').write('DEBUG = True\n')
+    config = Config(str(tmpdir))
+    config.from_pyfile('settings.py')
+    assert config['DEBUG'] is True
+    assert config.files == [str(tmpdir.join('settings.py'))]
+
+
+def test_config_reload(tmpdir):
+    settings = tmpdir.join('settings.py')
+    settings.write('LIMIT = 1\nNAME = "a"\n')
+    config = Config(str(tmpdir), {'DEBUG': False})
+    config.from_pyfile('settings.py')
+    config['DEBUG'] = True
+
+    notified = []
+
+    @config.subscribe
+    def on_change(config, changed):
+        notified.append((config['LIMIT'], changed))
+
+    old_data = config.data
+    settings.write('LIMIT = 2\nNAME = "a"\n')
+    assert config.reload() == {'LIMIT'}
+    assert notified == [(2, {'LIMIT'})]
+    # a new snapshot, the values set in code are kept
+    assert config.data is not old_data and old_data['LIMIT'] == 1
+    assert config['DEBUG'] is True
+    assert config.sources == [('from_pyfile', 'settings.py')]
+
+    assert config.reload() == set()
+    assert len(notified) == 1
+
+    settings.write('LIMIT = (\n')
+    with pytest.raises(SyntaxError):
+        config.reload()
+    assert config['LIMIT'] == 2
+
+
+def test_config_reload_relative_root(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    settings = tmpdir.mkdir('conf').join('app.py')
+    settings.write('LIMIT = 1\n')
+    config = Config('conf')
+    config.from_pyfile('app.py')
+    assert config.files == [os.path.join('conf', 'app.py')]
+    settings.write('LIMIT = 2\n')
+    # loaded again from conf/app.py, not conf/conf/app.py
+    assert config.reload() == {'LIMIT'}
+    assert config['LIMIT'] == 2
+
+
+APP = '''
+import os
+from imouto.config import Config
+from imouto.web import Application, RequestHandler
+
+
+class Handler(RequestHandler):
+
+    async def get(self):
+        self.write('%s %s' % (os.getpid(), self.app.config['GREETING']))
+
+
+config = Config(os.path.dirname(__file__))
+config.from_pyfile('settings.py')
+Application([('/', Handler)], config=config).run(port=int(os.environ['PORT']),
+                                                 workers=2)
+'''
+
+
+def test_reload_workers(tmpdir):
+    tmpdir.join('settings.py').write('GREETING = "hello"\n')
+    tmpdir.join('app.py').write(APP)
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    env = dict(os.environ, PORT=str(port), PYTHONPATH=os.getcwd())
+    master = subprocess.Popen([sys.executable, str(tmpdir.join('app.py'))],
+                              env=env, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+
+    def get():
+        with socket.create_connection(('127.0.0.1', port)) as sock:
+            sock.sendall(b'GET / HTTP/1.1\r\n\r\n')
+            return sock.recv(1024).split(b'\r\n\r\n', 1)[1].split()
+
+    def responses(greeting):
+        """the pids of the workers which responded with `greeting`"""
+        pids = set()
+        deadline = time.time() + 10
+        while len(pids) < 2 and time.time() < deadline:
+            try:
+                pid, body = get()
+            except (ConnectionError, IndexError):
+                time.sleep(0.05)
+                continue
+            if body == greeting:
+                pids.add(pid)
+        return pids
+
+    try:
+        assert len(responses(b'hello')) == 2
+        tmpdir.join('settings.py').write('GREETING = "bye"\n')
+        master.send_signal(signal.SIGHUP)
+        assert len(responses(b'bye')) == 2
+    finally:
+        master.terminate()
+        assert master.wait(10) == 0
@@ -0,0 +1,83 @@
+import pytest
+from datetime import datetime, timedelta
+from http.cookies import SimpleCookie
+from imouto.cookies import (parse_cookie, set_cookie_header,
+                            cookie_attributes)
+from imouto.web import RequestHandler, Application
+
+
+class CookieHandler(RequestHandler):
+
+    async def get(self):
+        self.write(self.get_cookie('value', 'unset'))
+
+    async def post(self):
+        self.set_cookie('value', self.get_query_argument('value'),
+                        path='/', httponly=True, samesite='Lax')
+
+
+def test_parse_cookie():
+    cookies = parse_cookie(' a=1;b = x=y ; flag; =2; a=3;sig=AB+c/d==|1')
+    assert list(cookies.allitems()) == [
+        ('a', '1'), ('b', 'x=y'), ('a', '3'), ('sig', 'AB+c/d==|1')]
+    # the cookie with the longest path is sent first
+    assert cookies['a'] == '1'
+    assert cookies.get('a', index=1) == '3'
+    assert cookies.get_all('a') == ['1', '3']
+    assert cookies.get('flag', 'unset') == 'unset'
+    assert len(parse_cookie('')) == 0
+
+
+def test_quoted_values():
+    cookies = parse_cookie(r'q="a\073b\"c"; empty=""; bare="')
+    # kept as sent until read
+    assert cookies._pairs[0] == ('q', r'"a\073b\"c"')
+    assert cookies['q'] == 'a;b"c'
+    assert cookies.get('q') == 'a;b"c'
+    assert dict(cookies.items()) == {'q': 'a;b"c', 'empty': '', 'bare': '"'}
+
+
+@pytest.mark.parametrize('value', [
+    'plain', 'AB+c/d==|1', 'with space', 'semi;colon,comma', 'quote"back\\',
+    '\x01control', '', 'unicode 妹',
+])
+def test_round_trip(value):
+    header = set_cookie_header('name', value)
+    assert parse_cookie(header.split('; ')[0])['name'] == value
+    simple = SimpleCookie()
+    simple.load(header)
+    assert simple['name'].value == value
+
+
+def test_set_cookie_header():
+    assert set_cookie_header('a', '1') == 'a=1'
+    header = set_cookie_header(
+        'a', '1', expires=0, max_age=timedelta(days=1), domain='example.com',
+        path='/', secure=True, httponly=True, samesite='Strict')
+    assert header == ('a=1; Expires=Thu, 01 Jan 1970 00:00:00 GMT; '
+                      'Max-Age=86400; Domain=example.com; Path=/; Secure; '
+                      'HttpOnly; SameSite=Strict')
+    assert set_cookie_header('a', '1', expires=datetime(2018, 3, 4)) == \
+        'a=1; Expires=Sun, 04 Mar 2018 00:00:00 GMT'
+    # the attributes of a profile are built once
+    assert cookie_attributes(None, '/', True) is \
+        cookie_attributes(None, '/', True)
+    with pytest.raises(ValueError):
+        set_cookie_header('a;b', '1')
+    with pytest.raises(ValueError):
+        set_cookie_header('a', '1', path='/\r\nX-Injected: 1')
+    with pytest.raises(TypeError):
+        set_cookie_header('a', '1', comment='unknown')
+
+
+def test_cookie_handler(client):
+    app = Application([(r'/', CookieHandler)])
+    client.feed(app)
+    response = client.post('/?value=a%2Bb%3Bc')
+    assert b'Set-Cookie: value="a+b\\073c"; Path=/; HttpOnly; ' \
+        b'SameSite=Lax\r\n' in response
+    response = client.get('/', cookie='value="a+b\\073c"; other=1')
+    assert response.endswith(b'\r\n\r\na+b;c')
+    # not split on '&' any more
+    response = client.get('/', cookie='value=a&other=1')
+    assert response.endswith(b'\r\n\r\na&other=1')
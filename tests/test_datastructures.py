@@ -97,6 +97,43 @@ class TestMultiDict:
         assert sorted(list(d.allitems())) ==\
             sorted([('b', 1), ('b', 2), ('b', 4), ('a', 0), ('c', 5)])
 
+    def test_from_pairs(self):
+        pairs = [('a', '1'), ('b', '2'), ('a', '3')]
+        d = MultiDict.from_pairs(pairs)
+        assert list(d.allitems()) == pairs
+        assert list(d.items()) == [('a', '3'), ('b', '2')]
+        assert d.get('a', index=0) == '1'
+        assert d.get('a', 'x', index=5) == 'x'
+        assert 'b' in d and 'c' not in d
+        # the index is kept up to date
+        d['b'] = '4'
+        assert d['b'] == '4' and d.get_all('b') == ['2', '4']
+        del d['a']
+        assert list(d.allitems()) == [('b', '2'), ('b', '4')]
+        with pytest.raises(KeyError):
+            del d['a']
+
+    def test_eq(self):
+        d = MultiDict.from_pairs([('a', 1), ('b', 2)])
+        assert d == MultiDict(b=[2], a=[1])
+        assert d != MultiDict(a=[1])
+        assert d != {'a': [1], 'b': [3]}
+        assert d != [('a', 1), ('b', 2)]
+
+    def test_update(self):
+        d = MultiDict()
+        d.update(MultiDict(a=[1, 2]))
+        d.update({'b': 3})
+        d.update([('a', 4)], c=5)
+        assert d == {'a': [1, 2, 4], 'b': [3], 'c': [5]}
+
+    def test_copy_and_pickle(self):
+        d = MultiDict.from_pairs([('a', 1), ('a', 2)])
+        for other in (copy.copy(d), d.copy(), pickle.loads(pickle.dumps(d))):
+            assert other == d and type(other) is MultiDict
+            other['a'] = 3
+            assert d.get_all('a') == [1, 2]
+
 
 class TestHeaderDict:
 
@@ -105,3 +142,16 @@ class TestHeaderDict:
         assert d['Content-Type'] == 'text/plain'
         del d['Content-Type']
         assert len(d) == 0
+
+    def test_pairs(self):
+        # the repeated headers of a request are kept
+        d = HeaderDict([('x-forwarded-for', 'a'), ('X-Forwarded-For', 'b')])
+        assert d['X-FORWARDED-FOR'] == 'b'
+        assert d.get_all('x-forwarded-for') == ['a', 'b']
+        # setting replaces, adding appends
+        d['x-forwarded-for'] = 'c'
+        assert d.get_all('X-Forwarded-For') == ['c']
+        d.add('set-cookie', 'a=1')
+        d.add('Set-Cookie', 'b=2')
+        assert d.get_all('Set-Cookie') == ['a=1', 'b=2']
+        assert len(d) == 2
@@ -0,0 +1,108 @@
+import os
+import time
+import asyncio
+import hashlib
+import pytest
+from imouto.errors import HTTPError
+from imouto.web import Application, RequestHandler
+from imouto.executor import (ThreadPool, ProcessPool, cpu_bound,
+                             is_coroutine_function)
+
+
+def reverse(data):
+    return data[::-1]
+
+
+@cpu_bound
+def checksum(data):
+    return hashlib.sha1(data).hexdigest() + ':' + str(os.getpid())
+
+
+@cpu_bound(timeout=0.05)
+def nap(seconds):
+    time.sleep(seconds)
+
+
+def test_is_coroutine_function():
+
+    class A:
+        async def get(self):
+            pass
+
+        def post(self):
+            pass
+
+    assert is_coroutine_function(A().get)
+    assert not is_coroutine_function(A().post)
+    assert is_coroutine_function(A().get)
+
+
+def test_thread_pool_saturation():
+    loop = asyncio.new_event_loop()
+    pool = ThreadPool(max_workers=1, queue_size=1, loop=loop)
+
+    async def main():
+        first = loop.create_task(pool.run(time.sleep, 0.1))
+        second = loop.create_task(pool.run(time.sleep, 0.1))
+        await asyncio.sleep(0.01, loop=loop)
+        stats = pool.stats()
+        assert stats['active'] == 1
+        assert stats['queued'] == 1
+        with pytest.raises(HTTPError) as e:
+            await pool.run(time.sleep, 0.1)
+        assert e.value.status_code == 503
+        await asyncio.gather(first, second, loop=loop)
+
+    loop.run_until_complete(main())
+    stats = pool.stats()
+    assert stats['completed'] == 2
+    assert stats['rejected'] == 1
+    assert stats['active'] == 0
+    pool.shutdown()
+    loop.close()
+
+
+def test_process_pool():
+    loop = asyncio.new_event_loop()
+    pool = ProcessPool(1, shm_threshold=1024, loop=loop)
+    payload = os.urandom(4096)
+
+    async def main():
+        assert await pool.run(reverse, b'abc') == b'cba'
+        # large payloads go through shared memory in both directions
+        assert await pool.run(reverse, payload) == payload[::-1]
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.run(time.sleep, 0.3, timeout=0.05)
+        # the default timeout of a `cpu_bound` function
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.run(nap, 0.3)
+
+    loop.run_until_complete(main())
+    pool.shutdown()
+    loop.close()
+
+
+def test_cpu_bound(client):
+
+    class ChecksumHandler(RequestHandler):
+
+        async def post(self):
+            self.write(await self.run_in_process(
+                checksum, self.request.raw_body.getvalue()))
+
+    # the pool of the running application, also for a subclass
+    class MyApp(Application):
+        pass
+
+    app = MyApp([
+        (r'/checksum/', ChecksumHandler),
+    ])
+    client.feed(app)
+    response = client.post('/checksum/', data=b'imouto',
+                           content_length=b'6')
+    digest, pid = response.split(b'\r\n\r\n')[1].split(b':')
+    assert digest == hashlib.sha1(b'imouto').hexdigest().encode()
+    assert int(pid) != os.getpid()
+    assert Application not in Application._instances
+    # still a plain function
+    assert checksum(b'').startswith(hashlib.sha1(b'').hexdigest())
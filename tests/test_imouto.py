@@ -1,3 +1,9 @@
+import time
+import asyncio
+import threading
+from imouto import Request
+from imouto.errors import HTTPError
+from imouto.config import Config
 from imouto.web import RequestHandler, Application
 from imouto.magicroute import GET
 
@@ -81,6 +87,22 @@ def test_dynamic_route(client):
     assert b'id: 2333' in response
 
 
+def test_typed_route(client):
+    class UserHandler(RequestHandler):
+
+        async def get(self, id):
+            self.write('id + 1: %d' % (id + 1))
+
+    app = Application([
+        (r'/users/{id:int}', UserHandler),
+    ])
+    client.feed(app)
+    response = client.get('/users/41')
+    assert b'id + 1: 42' in response
+    response = client.get('/users/abc')
+    assert response.startswith(b'HTTP/1.1 404 ')
+
+
 def test_get_query_string(client):
     class QueryHandler(RequestHandler):
 
@@ -116,3 +138,414 @@ def test_post_data(client):
                            content_type=content_type,
                            content_length=content_length)
     assert b'product: 726', response
+
+
+def test_object_pool(client):
+    class CookieHandler(RequestHandler):
+
+        async def get(self):
+            self.write(self.get_cookie('name', 'unknown'))
+            if self.get_query_argument('set'):
+                self.set_cookie('name', 'imouto')
+
+    app = Application([
+        (r'/cookie/', CookieHandler),
+    ])
+    app.config['OBJECT_POOL_SIZE'] = 2
+    client.feed(app)
+    response = client.get('/cookie/?set=1', cookie='name=neko')
+    assert b'neko' in response
+    assert b'Set-Cookie: name=imouto' in response
+    assert len(app._request_pool) == 1
+    assert len(app._response_pool) == 1
+    # the reused objects must not leak the state of the previous request
+    response = client.get('/cookie/')
+    assert b'unknown' in response
+    assert b'Set-Cookie' not in response
+
+
+def test_sync_handler(client):
+
+    class SyncHandler(RequestHandler):
+
+        def get(self):
+            self.write(threading.current_thread() is threading.main_thread())
+
+        async def post(self):
+            result = await self.run_in_executor(sum, [1, 2, 3])
+            self.write('sum: {}'.format(result))
+
+    app = Application([
+        (r'/sync/', SyncHandler),
+    ])
+    client.feed(app)
+    response = client.get('/sync/')
+    assert b'False' in response
+    response = client.post('/sync/')
+    assert b'sum: 6' in response
+    assert app.thread_pool.stats()['completed'] == 2
+
+
+def test_lifecycle_hooks(client):
+    calls = []
+
+    class HookHandler(RequestHandler):
+
+        async def get(self):
+            self.write(','.join(calls))
+
+    app = Application([
+        (r'/', HookHandler),
+    ])
+
+    @app.on_startup
+    async def open_pool():
+        calls.append('open')
+
+    app.on_startup(lambda: calls.append('warm'))
+    app.on_shutdown(lambda: calls.append('close'))
+    client.feed(app)
+    response = client.get('/')
+    assert b'open,warm' in response
+    client.get('/')
+    assert calls == ['open', 'warm']
+    client.loop.run_until_complete(app.shutdown())
+    assert calls == ['open', 'warm', 'close']
+
+
+def test_etag(client):
+    calls = []
+
+    class EtagHandler(RequestHandler):
+        auto_etag = True
+
+        async def get(self):
+            self.write('Hello World')
+
+    class VersionHandler(RequestHandler):
+
+        async def get(self):
+            self.set_etag('v42')
+            calls.append('expensive')
+            self.write('version 42')
+
+        async def put(self):
+            self.set_etag('v42')
+            calls.append('replaced')
+
+        async def post(self):
+            self.set_etag('v42')
+            calls.append('updated')
+
+    app = Application([
+        (r'/', EtagHandler),
+        (r'/version/', VersionHandler),
+    ])
+    client.feed(app)
+    response = client.get('/')
+    etag = [line for line in response.split(b'\r\n')
+            if line.startswith(b'Etag')][0].split(b': ')[1]
+    assert etag.startswith(b'W/"b-')
+    response = client.get('/', if_none_match=etag)
+    assert response.startswith(b'HTTP/1.1 304 Not Modified')
+    assert response.endswith(b'\r\n\r\n')
+    assert b'Content-Length' not in response
+    assert b'Etag: ' + etag in response
+    response = client.get('/', if_none_match=b'"other", ' + etag[2:])
+    assert b'304' in response
+    response = client.get('/', if_none_match=b'"other"')
+    assert response.endswith(b'Hello World')
+
+    response = client.get('/version/', if_none_match=b'"v42"')
+    assert b'304 Not Modified' in response
+    assert calls == []
+    response = client.get('/version/', if_none_match=b'"v41"')
+    assert response.endswith(b'version 42')
+    assert b'Etag: "v42"' in response
+    assert calls == ['expensive']
+
+    # RFC 7232 3.2, the other methods fail the precondition
+    response = client._get_response(client._generate_request(
+        method=b'PUT', path=b'/version/', if_none_match=b'*'))
+    assert response.startswith(b'HTTP/1.1 412 Precondition Failed')
+    response = client.post('/version/', if_none_match=b'W/"v42"')
+    assert b'412 Precondition Failed' in response
+    assert calls == ['expensive']
+    response = client.post('/version/', if_none_match=b'"v41"')
+    assert response.startswith(b'HTTP/1.1 200 OK')
+    assert calls == ['expensive', 'updated']
+
+
+def test_coalesce(client):
+    calls = []
+
+    class SlowHandler(RequestHandler):
+        coalesce = True
+        coalesce_headers = ('Accept-Language',)
+
+        async def get(self):
+            language = self.request.headers.get('Accept-Language')
+            calls.append(language)
+            await asyncio.sleep(0.05, loop=self.app.loop)
+            if self.request.query_string == 'fail':
+                raise HTTPError(502)
+            self.set_cookie('leader', 'yes')
+            self.write('result ' + language)
+
+    app = Application([(r'/', SlowHandler)])
+    client.feed(app)
+    server, addr = app.test_server(client.loop)
+
+    async def fetch(path, language=b'en'):
+        reader, writer = await asyncio.open_connection(*addr,
+                                                       loop=client.loop)
+        writer.write(b'GET %b HTTP/1.1\r\nAccept-Language: %b\r\n\r\n'
+                     % (path, language))
+        response = await reader.read()
+        writer.close()
+        return response
+
+    async def main():
+        return await asyncio.gather(
+            *[fetch(b'/') for _ in range(5)], fetch(b'/', b'ja'),
+            loop=client.loop)
+
+    responses = client.loop.run_until_complete(main())
+    assert sorted(calls) == ['en', 'ja']
+    bodies = [response.split(b'\r\n\r\n')[1] for response in responses]
+    assert len(set(bodies[:5])) == 1 and bodies[5] != bodies[0]
+    # only the requests which ran the handler get its cookies
+    assert sum(b'Set-Cookie' in response for response in responses) == 2
+
+    # the error is raised for every request
+    responses = client.loop.run_until_complete(asyncio.gather(
+        *[fetch(b'/?fail') for _ in range(3)], loop=client.loop))
+    assert all(response.startswith(b'HTTP/1.1 502 ')
+               for response in responses)
+    assert len(calls) == 3
+    server.close()
+    client.loop.run_until_complete(server.wait_closed())
+
+
+def test_coalesce_conditional(client):
+    calls = []
+
+    class VersionHandler(RequestHandler):
+        coalesce = True
+
+        async def get(self):
+            calls.append(1)
+            self.set_etag('v1')
+            await asyncio.sleep(0.05, loop=self.app.loop)
+            self.write('version 1')
+
+    app = Application([(r'/', VersionHandler)])
+    client.feed(app)
+    server, addr = app.test_server(client.loop)
+
+    async def fetch(if_none_match):
+        reader, writer = await asyncio.open_connection(*addr,
+                                                       loop=client.loop)
+        header = b'If-None-Match: %b\r\n' % if_none_match \
+            if if_none_match else b''
+        writer.write(b'GET / HTTP/1.1\r\n%b\r\n' % header)
+        response = await reader.read()
+        writer.close()
+        return response
+
+    validators = [b'"v1"', None, b'"v0"', b'W/"v1"', None]
+    responses = client.loop.run_until_complete(asyncio.gather(
+        *[fetch(validator) for validator in validators], loop=client.loop))
+    assert calls == [1]
+    # each request is answered according to its own validator, whichever
+    # of them ran the handler
+    for validator, response in zip(validators, responses):
+        if validator in (b'"v1"', b'W/"v1"'):
+            assert response.startswith(b'HTTP/1.1 304 Not Modified')
+        else:
+            assert response.startswith(b'HTTP/1.1 200 OK')
+            assert response.endswith(b'version 1')
+        assert b'Etag: "v1"' in response
+    server.close()
+    client.loop.run_until_complete(server.wait_closed())
+
+
+def test_coalesce_leader_cancelled(client):
+    calls = []
+
+    class SlowHandler(RequestHandler):
+        coalesce = True
+
+        async def get(self):
+            calls.append(1)
+            await asyncio.sleep(0.05, loop=self.app.loop)
+            self.write('done')
+
+    app = Application([(r'/', SlowHandler)])
+    client.feed(app)
+    server, _ = app.test_server(client.loop)
+
+    async def main():
+        requests = [Request(method='GET', path='/') for _ in range(2)]
+        leader, waiter = [
+            asyncio.ensure_future(app._execute(SlowHandler, req, (), {}),
+                                  loop=client.loop)
+            for req in requests]
+        await asyncio.sleep(0.01, loop=client.loop)
+        leader.cancel()
+        res = await waiter
+        return leader.cancelled(), res
+
+    cancelled, res = client.loop.run_until_complete(main())
+    assert cancelled
+    assert res._chunks == [b'done'] and calls == [1]
+    server.close()
+    client.loop.run_until_complete(server.wait_closed())
+
+
+def test_pooled_request_outlives_leader(client):
+    seen = []
+
+    class SharedHandler(RequestHandler):
+        coalesce = True
+        cancel_on_disconnect = True
+
+        async def get(self):
+            await asyncio.sleep(0.1, loop=self.app.loop)
+            self.write(self.request.query_string)
+
+    class SyncHandler(RequestHandler):
+        timeout = 0.05
+
+        def get(self):
+            time.sleep(0.1)
+            seen.append(self.request.query_string)
+
+    class OtherHandler(RequestHandler):
+
+        async def get(self):
+            self.write('other')
+
+    app = Application([(r'/', SharedHandler), (r'/sync', SyncHandler),
+                       (r'/other', OtherHandler)],
+                      config=Config(defaults={'OBJECT_POOL_SIZE': 4}))
+    client.feed(app)
+    server, addr = app.test_server(client.loop)
+    loop = client.loop
+
+    async def fetch(path, delay=0.0, close_after=None):
+        await asyncio.sleep(delay, loop=loop)
+        reader, writer = await asyncio.open_connection(*addr, loop=loop)
+        writer.write(b'GET %b HTTP/1.1\r\n\r\n' % path)
+        if close_after is not None:
+            await asyncio.sleep(close_after, loop=loop)
+            writer.close()
+            return None
+        response = await reader.read()
+        writer.close()
+        return response
+
+    # the leader goes away, the shared execution still runs on its request
+    # while another request takes an object from the pool
+    _, follower, other = loop.run_until_complete(asyncio.gather(
+        fetch(b'/?x=1', close_after=0.02), fetch(b'/?x=1', 0.01),
+        fetch(b'/other?y=2', 0.04), loop=loop))
+    assert follower.endswith(b'\r\n\r\nx=1')
+    assert other.endswith(b'other')
+
+    # the thread of a handler which timed out reads its own request
+    timed_out, other = loop.run_until_complete(asyncio.gather(
+        fetch(b'/sync?x=1'), fetch(b'/other?y=2', 0.07), loop=loop))
+    assert timed_out.startswith(b'HTTP/1.1 504 ')
+    loop.run_until_complete(asyncio.sleep(0.1, loop=loop))
+    assert seen == ['x=1']
+    assert not app._lingering
+    server.close()
+    loop.run_until_complete(server.wait_closed())
+
+
+def test_deadline(client):
+    events = []
+
+    class SlowHandler(RequestHandler):
+        timeout = 0.05
+
+        async def get(self):
+            events.append(0 < self.request.remaining <= 0.05)
+            try:
+                await asyncio.sleep(1, loop=self.app.loop)
+            except asyncio.CancelledError:
+                events.append('cancelled')
+                raise
+
+    class FastHandler(RequestHandler):
+
+        async def get(self):
+            self.write('remaining %.1f' % self.request.remaining)
+
+    app = Application([(r'/slow', SlowHandler), (r'/fast', FastHandler)],
+                      config=Config(defaults={'REQUEST_TIMEOUT': 2}))
+    client.feed(app)
+    response = client.get('/slow')
+    assert response.startswith(b'HTTP/1.1 504 ')
+    assert events == [True, 'cancelled']
+    assert client.get('/fast').endswith(b'remaining 2.0')
+
+
+def test_deadline_detached(client):
+    class StreamHandler(RequestHandler):
+        timeout = 0.05
+
+        async def get(self):
+            # took over the connection, an error response can't follow
+            self.response.detached = True
+            self.request.writer.write(b'HTTP/1.1 200 OK\r\n\r\npartial')
+            await asyncio.sleep(1, loop=self.app.loop)
+
+    app = Application([(r'/', StreamHandler)])
+    client.feed(app)
+    server, addr = app.test_server(client.loop)
+
+    async def main():
+        reader, writer = await asyncio.open_connection(*addr,
+                                                       loop=client.loop)
+        writer.write(b'GET / HTTP/1.1\r\n\r\n')
+        data = await reader.read()
+        writer.close()
+        return data
+
+    assert client.loop.run_until_complete(main()) == \
+        b'HTTP/1.1 200 OK\r\n\r\npartial'
+    server.close()
+    client.loop.run_until_complete(server.wait_closed())
+
+
+def test_cancel_on_disconnect(client):
+    events = []
+
+    class SlowHandler(RequestHandler):
+        cancel_on_disconnect = True
+
+        async def get(self):
+            try:
+                await asyncio.sleep(1, loop=self.app.loop)
+            except asyncio.CancelledError:
+                events.append('cancelled')
+                raise
+
+    app = Application([(r'/', SlowHandler)])
+    client.feed(app)
+    server, addr = app.test_server(client.loop)
+
+    async def main():
+        reader, writer = await asyncio.open_connection(*addr,
+                                                       loop=client.loop)
+        writer.write(b'GET / HTTP/1.1\r\n\r\n')
+        await asyncio.sleep(0.05, loop=client.loop)
+        writer.close()
+        await asyncio.sleep(0.05, loop=client.loop)
+
+    client.loop.run_until_complete(main())
+    assert events == ['cancelled']
+    server.close()
+    client.loop.run_until_complete(server.wait_closed())
@@ -0,0 +1,104 @@
+from imouto import Response
+from imouto.errors import HTTPError
+from imouto.web import RequestHandler, Application
+from imouto.middleware import Middleware, compile_middlewares
+
+
+class HelloHandler(RequestHandler):
+
+    async def get(self):
+        self.write('Hello')
+
+
+def test_no_middleware():
+    async def handle(request):
+        pass
+    assert compile_middlewares([], handle) is handle
+    # a middleware without hooks adds no layer
+    assert compile_middlewares([Middleware()], handle) is handle
+
+
+def test_middleware_order(client):
+    calls = []
+
+    class Recorder(Middleware):
+
+        def __init__(self, name):
+            self.name = name
+
+        async def before_request(self, request):
+            calls.append('before ' + self.name)
+
+        async def after_response(self, request, response):
+            calls.append('after ' + self.name)
+            response.headers['X-' + self.name] = 'yes'
+
+    app = Application([(r'/', HelloHandler)],
+                      middlewares=[Recorder('A')])
+    app.add_middleware(Recorder('B'))
+    client.feed(app)
+    response = client.get('/')
+    assert b'Hello' in response
+    assert b'X-A: yes' in response
+    assert b'X-B: yes' in response
+    assert calls == ['before A', 'before B', 'after B', 'after A']
+
+
+def test_middleware_short_circuit(client):
+
+    class Auth(Middleware):
+
+        async def before_request(self, request):
+            if request.headers.get('Authorization') != 'imouto':
+                res = Response(status_code=401)
+                res.write('Unauthorized')
+                return res
+
+    app = Application([(r'/', HelloHandler)], middlewares=[Auth()])
+    client.feed(app)
+    response = client.get('/')
+    assert b'401 Unauthorized' in response
+    assert b'Hello' not in response
+    response = client.get('/', authorization='imouto')
+    assert b'Hello' in response
+
+
+def test_middleware_exception(client):
+
+    class NotFoundPage(Middleware):
+
+        async def on_exception(self, request, exc):
+            if isinstance(exc, HTTPError) and exc.status_code == 404:
+                res = Response(status_code=404)
+                res.write('nothing here')
+                return res
+
+    app = Application([(r'/', HelloHandler)], middlewares=[NotFoundPage()])
+    client.feed(app)
+    response = client.get('/missing')
+    assert b'404 Not Found' in response
+    assert b'nothing here' in response
+
+
+def test_middleware_around(client):
+    calls = []
+
+    class Timer(Middleware):
+
+        async def around_request(self, request, call_next):
+            calls.append('enter')
+            try:
+                return await call_next(request)
+            finally:
+                calls.append('exit')
+
+        async def before_request(self, request):
+            calls.append('before')
+            if request.path == '/denied':
+                raise HTTPError(403)
+
+    app = Application([(r'/', HelloHandler)], middlewares=[Timer()])
+    client.feed(app)
+    assert b'Hello' in client.get('/')
+    assert client.get('/denied').startswith(b'HTTP/1.1 403 ')
+    assert calls == ['enter', 'before', 'exit'] * 2
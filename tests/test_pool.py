@@ -0,0 +1,144 @@
+import asyncio
+import pytest
+from imouto.pool import ConnectionPool, PoolTimeout, tcp_connector
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def stub_server(loop):
+    """a local echo server as the backend"""
+    async def echo(reader, writer):
+        while True:
+            data = await reader.readline()
+            if not data:
+                break
+            writer.write(data)
+        writer.close()
+
+    server = loop.run_until_complete(
+        asyncio.start_server(echo, '127.0.0.1', 0, loop=loop))
+    yield server.sockets[0].getsockname()
+    server.close()
+    loop.run_until_complete(server.wait_closed())
+
+
+def test_pool(loop, stub_server):
+    pool = ConnectionPool(tcp_connector(*stub_server, loop=loop),
+                          min_size=1, max_size=2, loop=loop)
+
+    async def main():
+        await pool.start()
+        assert pool.stats()['idle'] == 1
+        async with pool.acquire() as conn:
+            conn.writer.write(b'imouto\n')
+            assert await conn.reader.readline() == b'imouto\n'
+        conn1 = await pool.acquire()
+        # the idle connection is reused
+        assert conn1 is conn
+        conn2 = await pool.acquire()
+        assert pool.size == 2
+        with pytest.raises(PoolTimeout):
+            await pool.acquire(timeout=0.01)
+
+        waiter = asyncio.ensure_future(pool.acquire(), loop=loop)
+        await asyncio.sleep(0.01, loop=loop)
+        await pool.release(conn1)
+        assert await waiter is conn1
+        await pool.release(conn1)
+        await pool.release(conn2)
+
+        stats = pool.stats()
+        assert stats['acquired'] == 4
+        assert stats['waited'] == 1
+        assert stats['timeouts'] == 1
+        assert stats['max_wait_time'] > 0
+        await pool.close()
+        assert pool.size == 0
+
+    loop.run_until_complete(main())
+
+
+def test_pool_health_check(loop, stub_server):
+    checked = []
+
+    async def health_check(conn):
+        checked.append(conn)
+        return len(checked) > 1
+
+    pool = ConnectionPool(tcp_connector(*stub_server, loop=loop),
+                          min_size=1, health_check=health_check, loop=loop)
+
+    async def main():
+        await pool.start()
+        bad = pool._idle[0][0]
+        async with pool.acquire() as conn:
+            assert conn is not bad
+            assert bad.closed
+        # a connection is discarded after an error
+        with pytest.raises(ValueError):
+            async with pool.acquire() as conn:
+                raise ValueError
+        assert conn.closed
+        await pool.close()
+
+    loop.run_until_complete(main())
+
+
+def test_pool_failing_health_check(loop, stub_server):
+    checks = []
+
+    async def health_check(conn):
+        checks.append(conn)
+        if len(checks) == 1:
+            raise ConnectionResetError
+        if len(checks) == 2:
+            await asyncio.sleep(1, loop=loop)
+        return True
+
+    pool = ConnectionPool(tcp_connector(*stub_server, loop=loop),
+                          min_size=1, max_size=1, health_check=health_check,
+                          loop=loop)
+
+    async def main():
+        await pool.start()
+        # a check which raises discards the connection
+        bad = pool._idle[0][0]
+        conn = await pool.acquire()
+        assert conn is not bad and bad.closed
+        await pool.release(conn)
+        # and so does a check which is cancelled
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(pool.acquire(), 0.01, loop=loop)
+        # the cancelled acquisition unwinds
+        await asyncio.sleep(0.01, loop=loop)
+        assert conn.closed
+        # the slots are not lost
+        assert pool.stats()['used'] == 0
+        async with pool.acquire(timeout=0.1) as conn:
+            assert not conn.closed
+        assert pool.size == 1
+        await pool.close()
+
+    loop.run_until_complete(main())
+
+
+def test_pool_idle_eviction(loop, stub_server):
+    pool = ConnectionPool(tcp_connector(*stub_server, loop=loop),
+                          max_size=2, max_idle=0.02, loop=loop)
+
+    async def main():
+        await pool.start()
+        async with pool.acquire():
+            pass
+        assert pool.size == 1
+        await asyncio.sleep(0.05, loop=loop)
+        assert pool.size == 0
+        await pool.close()
+
+    loop.run_until_complete(main())
@@ -0,0 +1,92 @@
+import json
+import pytest
+from urllib.parse import parse_qsl
+from imouto import Request
+from imouto.errors import HTTPError
+from imouto.querystring import parse_query
+from imouto.web import RequestHandler, Application
+from imouto.testing import TestClient
+
+
+class EchoHandler(RequestHandler):
+
+    async def get(self):
+        self.write(json.dumps(list(self.request.query.allitems())))
+
+    async def post(self):
+        self.write(json.dumps(list(self.request.form.allitems())))
+
+
+@pytest.mark.parametrize('qs', [
+    'a=1&b=2&a=3',
+    'a=1&b=&c&&=x',
+    'q=%E5%A6%B9&path=%2Fhome+page&plus=a%2Bb',
+    'bad=%zz&half=%E5',
+    'a=1;b=2',
+    'utm_source=news&utm_medium=email&gclid=Cj0KCQ-x_y.z~',
+    '',
+])
+def test_same_as_parse_qsl(qs):
+    assert list(parse_query(qs).allitems()) == parse_qsl(qs)
+    assert list(parse_query(qs, keep_blank_values=True).allitems()) == \
+        parse_qsl(qs, keep_blank_values=True)
+
+
+def test_limits():
+    qs = '&'.join('k%d=v' % i for i in range(10))
+    assert len(parse_query(qs, max_params=10)) == 10
+    with pytest.raises(HTTPError) as e:
+        parse_query(qs + '&x=1', max_params=10)
+    assert e.value.status_code == 400
+    assert len(list(parse_query(qs * 100, max_params=None).allitems())) > 10
+
+    assert parse_query('abc=1', max_key_length=3)['abc'] == '1'
+    with pytest.raises(HTTPError):
+        parse_query('abcd=1', max_key_length=3)
+    # checked before unquoting
+    with pytest.raises(HTTPError):
+        parse_query('a=%20%20', max_value_length=3)
+    assert parse_query('a=%20', max_value_length=3)['a'] == ' '
+
+
+def test_request_limits(client):
+    app = Application([(r'/', EchoHandler)])
+    client.feed(app)
+    response = client.get('/?a=1&b=%2F&a=3')
+    assert response.endswith(b'[["a", "1"], ["b", "/"], ["a", "3"]]')
+
+    many = '&'.join('k%d=v' % i for i in range(1001))
+    assert client.get('/?' + many).startswith(b'HTTP/1.1 400 ')
+    long_value = 'a=' + 'x' * 8193
+    assert client.get('/?' + long_value).startswith(b'HTTP/1.1 400 ')
+
+    # the values of a form are not limited
+    form = client.post('/', content_type='application/x-www-form-urlencoded',
+                       content_length=str(len(long_value)),
+                       data=long_value.encode())
+    assert form.startswith(b'HTTP/1.1 200 ')
+    form = client.post('/', content_type='application/x-www-form-urlencoded',
+                       content_length=str(len(many)), data=many.encode())
+    assert form.startswith(b'HTTP/1.1 400 ')
+    assert b'more than 1000 parameters' in form
+
+
+def test_request_limits_config(client):
+    app = Application([(r'/', EchoHandler)])
+    app.config['QUERY_MAX_PARAMS'] = 2
+    app.config['QUERY_MAX_VALUE_LENGTH'] = None
+    client.feed(app)
+    assert client.get('/?a=1&b=2').startswith(b'HTTP/1.1 200 ')
+    assert client.get('/?a=1&b=2&c=3').startswith(b'HTTP/1.1 400 ')
+    assert client.get('/?a=' + 'x' * 10000).startswith(b'HTTP/1.1 200 ')
+
+    # the limits belong to the application, not to the `Request` class
+    class OtherApp(Application):
+        pass
+
+    other = OtherApp([(r'/', EchoHandler)])
+    with TestClient(other, client.loop) as other_client:
+        assert other_client.get('/?a=1&b=2&c=3').status_code == 200
+        assert other_client.get('/?a=' + 'x' * 10000).status_code == 400
+    assert client.get('/?a=1&b=2&c=3').startswith(b'HTTP/1.1 400 ')
+    assert Request().query_limits == (1000, 256, 8 * 1024)
@@ -0,0 +1,59 @@
+from imouto.web import RequestHandler, Application
+from imouto.ratelimit import TokenBucketTable, RateLimiter
+
+
+class HelloHandler(RequestHandler):
+
+    created = 0
+
+    def initialize(self):
+        HelloHandler.created += 1
+
+    async def get(self):
+        self.write('Hello')
+
+
+def test_token_bucket():
+    table = TokenBucketTable(rate=2, burst=3)
+    assert [table.take('a', now=0) for _ in range(3)] == [0, 0, 0]
+    assert table.take('a', now=0) == 0.5
+    # 0.25 seconds later half a token is refilled
+    assert table.take('a', now=0.25) == 0.25
+    assert table.take('a', now=0.5) == 0
+    # the other keys have their own buckets
+    assert table.take('b', now=0.5) == 0
+    # never more than `burst`
+    assert [table.take('b', now=100) for _ in range(4)] == [0, 0, 0, 0.5]
+
+
+def test_token_bucket_eviction():
+    table = TokenBucketTable(rate=1, burst=2, shards=1, max_keys=2)
+    table.take('a', now=0)
+    table.take('b', now=1)
+    # `a` is full again at 2, it is dropped without losing anything
+    table.take('c', now=2)
+    assert len(table) == 2
+    # nothing is idle, the least recently used is dropped
+    table.take('b', now=2)
+    table.take('d', now=2)
+    assert len(table) == 2
+    assert table.take('b', now=2) == 0
+    assert table.take('c', now=2) == 0
+
+
+def test_rate_limiter(client):
+    HelloHandler.created = 0
+    app = Application([(r'/', HelloHandler), (r'/login', HelloHandler)],
+                      middlewares=[RateLimiter(0.5, burst=2,
+                                               routes=[('/login', 0.1, 1)])])
+    client.feed(app)
+    assert b'Hello' in client.get('/')
+    assert b'Hello' in client.get('/')
+    response = client.get('/')
+    assert response.startswith(b'HTTP/1.1 429 ')
+    assert b'Retry-After: 2\r\n' in response
+    # rejected before the handler is created
+    assert HelloHandler.created == 2
+
+    assert b'Hello' in client.get('/login')
+    assert b'Retry-After: 10\r\n' in client.get('/login')
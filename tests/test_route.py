@@ -0,0 +1,72 @@
+import uuid
+import pytest
+from imouto.route import URLSpec, Converter, register_converter
+
+
+def test_converters():
+    spec = URLSpec('/users/{id:int}/files/{path:path}', None)
+    assert spec.match('/users/42/files/a/b%20c.txt') == \
+        ((), {'id': 42, 'path': 'a/b c.txt'})
+    assert spec.match('/users/x/files/a') is None
+    assert spec.match('/users/42/files/') is None
+
+    spec = URLSpec('/items/{item_id:uuid}', None)
+    item_id = uuid.uuid4()
+    assert spec.match('/items/%s' % item_id) == ((), {'item_id': item_id})
+    assert spec.match('/items/1234') is None
+
+    spec = URLSpec('/posts/{slug:slug}/{name}', None)
+    assert spec.match('/posts/hello-world_1/a%2Fb') == \
+        ((), {'slug': 'hello-world_1', 'name': 'a/b'})
+    assert spec.match('/posts/hello world/a') is None
+    # the literal text is not a regex
+    assert URLSpec('/a.b/{x}', None).match('/axb/1') is None
+
+    with pytest.raises(ValueError):
+        URLSpec('/{x:unknown}', None)
+
+
+def test_regex_syntax_with_parameters():
+    # the anchors are implied
+    spec = URLSpec('^/u/{id:int}$', None)
+    assert spec.match('/u/1') == ((), {'id': 1})
+    assert spec.reverse(1) == '/u/1'
+    # the rest would be matched literally and never route
+    for pattern in ('/u/{id:int}/?', '/u/(\\d+)/{name}', '/{a}|/{b}',
+                    '/u/{id:int}/[a-z]+', '/u/{id:int}{1,2}'):
+        with pytest.raises(ValueError) as e:
+            URLSpec(pattern, None)
+        assert 'regex syntax' in str(e.value)
+
+
+def test_decoding():
+    # a parameter is URL-decoded, a regex group is not
+    assert URLSpec('/a/{name}', None).match('/a/b%20c') == \
+        ((), {'name': 'b c'})
+    assert URLSpec('/a/([^/]+)', None).match('/a/b%20c') == (('b%20c',), {})
+
+
+def test_custom_converter():
+
+    class EvenConverter(Converter):
+        regex = '[0-9]+'
+
+        def to_python(self, value):
+            if int(value) % 2:
+                raise ValueError('odd')
+            return int(value)
+
+    register_converter('even', EvenConverter)
+    spec = URLSpec('/even/{n:even}', None)
+    assert spec.match('/even/4') == ((), {'n': 4})
+    assert spec.match('/even/3') is None
+
+
+def test_reverse():
+    spec = URLSpec('/users/{id:int}/files/{path:path}', None)
+    assert spec.reverse(42, 'a/b c.txt') == '/users/42/files/a/b%20c.txt'
+    assert spec.reverse(id=1, path='x') == '/users/1/files/x'
+    assert URLSpec('/{name}/100%', None).reverse('a/b') == '/a%2Fb/100%'
+    # the regex patterns still work
+    assert URLSpec(r'/(\d+)/', None).reverse('1') == '/1/'
+    assert URLSpec(r'/(\d+)/', None).match('/12/') == (('12',), {})
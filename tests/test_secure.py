@@ -0,0 +1,61 @@
+import time
+from imouto.secure import (SecureCookie, create_secure_value,
+                           verify_secure_value)
+from imouto.web import RequestHandler, Application
+
+
+def test_secure_value():
+    value = create_secure_value('name', 'imouto', secret='root')
+    assert verify_secure_value('name', value, secret='root') == 'imouto'
+    assert verify_secure_value('name', value, secret='toor') is None
+    assert verify_secure_value('other', value, secret='root') is None
+
+
+def test_secure_cookie():
+    signer = SecureCookie('secret')
+    signed = signer.sign('name', '妹?&=')
+    assert b'=' not in signed and b'+' not in signed
+    assert signer.verify('name', signed) == '妹?&='
+    assert signer.verify('other', signed) is None
+    tampered = signed[:-1] + (b'1' if signed.endswith(b'0') else b'0')
+    assert signer.verify('name', tampered) is None
+    assert signer.verify('name', b'MjMzMzM=|1497854241|d1bc51b3') is None
+
+    # max age
+    old = signer.sign('name', 'imouto', timestamp=int(time.time()) - 100)
+    assert signer.verify('name', old, max_age=200) == 'imouto'
+    # the cached result is still checked against max age
+    assert signer.verify('name', old, max_age=50) is None
+
+
+def test_secure_cookie_rotation():
+    old = SecureCookie('old').sign('name', 'imouto')
+    signer = SecureCookie(['new', 'old'])
+    assert signer.verify('name', old) == 'imouto'
+    new = signer.sign('name', 'imouto')
+    assert SecureCookie('new').verify('name', new) == 'imouto'
+    assert SecureCookie('old').verify('name', new) is None
+
+
+def test_secure_cookie_handler(client):
+
+    class SecureHandler(RequestHandler):
+
+        async def get(self):
+            self.write(self.get_secure_cookie('user'))
+
+        async def post(self):
+            self.set_secure_cookie('user', 'imouto')
+
+    app = Application([
+        (r'/', SecureHandler),
+    ])
+    client.feed(app)
+    response = client.post('/')
+    header = [line for line in response.split(b'\r\n')
+              if line.startswith(b'Set-Cookie')][0]
+    cookie = header.split(b': ', 1)[1]
+    response = client.get('/', cookie=cookie)
+    assert response.endswith(b'imouto')
+    response = client.get('/', cookie=cookie[:-1])
+    assert response.endswith(b'None')
@@ -0,0 +1,197 @@
+import time
+import pickle
+import sqlite3
+import asyncio
+import threading
+import pytest
+from imouto.web import RequestHandler, Application
+from imouto.session import (Session, SessionStore, MemorySessionStore,
+                            SQLiteSessionStore)
+
+
+def test_session():
+    session = Session()
+    assert session.is_new
+    assert not session.modified
+    session['user'] = 'imouto'
+    assert session.modified
+    session = Session('sid', {'user': 'imouto'})
+    assert not session.is_new
+    assert session['user'] == 'imouto'
+    del session['user']
+    assert session.modified
+    assert len(session) == 0
+
+
+def test_memory_store():
+    store = MemorySessionStore(ttl=60)
+    assert store.load('sid') is None
+    store.save('sid', {'a': 1})
+    assert store.load('sid') == {'a': 1}
+    store.delete('sid')
+    assert store.load('sid') is None
+
+    store = MemorySessionStore(ttl=0.01)
+    store.save('sid', {'a': 1})
+    time.sleep(0.02)
+    assert store.load('sid') is None
+    assert len(store._sessions) == 0
+
+
+def test_sqlite_store(tmpdir):
+    path = str(tmpdir.join('session.db'))
+    store = SQLiteSessionStore(path, batch_size=2, flush_interval=60)
+    other = SQLiteSessionStore(path)
+    store.save('a', {'a': 1})
+    # pending writes are visible to their own store
+    assert store.load('a') == {'a': 1}
+    assert other.load('a') is None
+    store.save('b', {'b': 2})
+    # the batch is full and flushed
+    assert other.load('a') == {'a': 1}
+    store.delete('a')
+    # a new session is committed at once
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(store.create('c', {'c': 3}))
+    loop.close()
+    assert other.load('c') == {'c': 3}
+    store.close()
+    assert other.load('a') is None
+    assert other.load('b') == {'b': 2}
+    other.close()
+
+
+def test_sqlite_store_failed_flush(tmpdir, caplog):
+    path = str(tmpdir.join('session.db'))
+    store = SQLiteSessionStore(path, batch_size=100, flush_interval=60)
+    store._writer.execute('PRAGMA busy_timeout = 0')
+    other = SQLiteSessionStore(path)
+    # another worker is writing
+    blocker = sqlite3.connect(path, isolation_level=None)
+    blocker.execute('BEGIN IMMEDIATE')
+    store.save('a', {'a': 1})
+    store.save('b', {'b': 1})
+    store.flush()
+    assert 'database is locked' in caplog.text
+    # the batch is kept, and the writes made since win
+    assert store.load('a') == {'a': 1}
+    store.save('a', {'a': 2})
+    blocker.execute('ROLLBACK')
+    store.flush()
+    assert other.load('a') == {'a': 2}
+    assert other.load('b') == {'b': 1}
+    blocker.close()
+    store.close()
+    other.close()
+
+
+def test_store_interface():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+    class PartialStore(SessionStore):
+
+        def load(self, sid):
+            return None
+
+    with pytest.raises(TypeError):
+        PartialStore()
+
+
+def test_sqlite_store_in_app(client, tmpdir):
+    threads = []
+
+    class Store(SQLiteSessionStore):
+
+        def flush(self):
+            if self._pending:
+                threads.append(threading.current_thread())
+            super().flush()
+
+        def _insert(self, sid, data):
+            threads.append(threading.current_thread())
+            super()._insert(sid, data)
+
+    class SessionHandler(RequestHandler):
+
+        async def get(self):
+            self.session['user'] = self.get_query_argument('user')
+
+    path = str(tmpdir.join('session.db'))
+    app = Application([
+        (r'/', SessionHandler),
+    ])
+    app.session_store = Store(path, batch_size=100, flush_interval=0.05)
+    client.feed(app)
+    reader = SQLiteSessionStore(path)
+
+    def sessions():
+        return [pickle.loads(row[0]) for row in reader._conn.execute(
+            'SELECT data FROM session')]
+
+    response = client.get('/?user=a')
+    # a new session is committed before its cookie is sent, the next
+    # request may go to another worker
+    assert sessions() == [{'user': 'a'}]
+    assert len(threads) == 1
+    cookie = [line for line in response.split(b'\r\n')
+              if line.startswith(b'Set-Cookie')][0].split(b': ', 1)[1]
+    cookie = cookie.split(b';')[0]
+    # an update is batched, and committed by the timer
+    client.get('/?user=b', cookie=cookie)
+    assert sessions() == [{'user': 'a'}]
+    client.loop.run_until_complete(asyncio.sleep(0.2, loop=client.loop))
+    assert sessions() == [{'user': 'b'}]
+    assert len(threads) == 2
+    # and at shutdown
+    client.get('/?user=c', cookie=cookie)
+    client.loop.run_until_complete(app.shutdown())
+    assert sessions() == [{'user': 'c'}]
+    # all in the threads of the application
+    assert len(threads) == 3
+    assert threading.main_thread() not in threads
+    assert app.session_store._timer is None
+    reader.close()
+
+
+def test_session_handler(client):
+    loads = []
+
+    class CountingStore(MemorySessionStore):
+
+        def load(self, sid):
+            loads.append(sid)
+            return super().load(sid)
+
+    class SessionHandler(RequestHandler):
+
+        async def get(self):
+            if self.get_query_argument('count'):
+                self.session['count'] = self.session.get('count', 0) + 1
+                self.write(self.session['count'])
+
+        async def delete(self):
+            self.session.clear()
+
+    app = Application([
+        (r'/', SessionHandler),
+    ])
+    app.session_store = CountingStore()
+    client.feed(app)
+    response = client.get('/?count=1')
+    assert response.endswith(b'1')
+    cookie = [line for line in response.split(b'\r\n')
+              if line.startswith(b'Set-Cookie')][0].split(b': ', 1)[1]
+    cookie = cookie.split(b';')[0]
+    response = client.get('/?count=1', cookie=cookie)
+    assert response.endswith(b'2')
+    # the cookie is only sent when the session is created
+    assert b'Set-Cookie' not in response
+    # a handler which doesn't touch the session doesn't load it
+    loads.clear()
+    client.get('/', cookie=cookie)
+    assert loads == []
+    response = client._get_response(client._generate_request(
+        method=b'DELETE', path=b'/', cookie=cookie))
+    assert b'Set-Cookie: imouto_session=""' in response
+    assert len(app.session_store._sessions) == 0
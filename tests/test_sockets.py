@@ -0,0 +1,130 @@
+import os
+import sys
+import stat
+import time
+import socket
+import subprocess
+import pytest
+
+from imouto.sockets import parse_address, bind_unix, bind_sockets, describe
+
+
+def test_parse_address():
+    assert parse_address('127.0.0.1:8080') == ('tcp', ('127.0.0.1', 8080))
+    assert parse_address('[::1]:80') == ('tcp', ('::1', 80))
+    assert parse_address(('', 80)) == ('tcp', ('', 80))
+    assert parse_address('unix:/tmp/a.sock') == ('unix', '/tmp/a.sock')
+    assert parse_address('fd://3') == ('fd', 3)
+    with pytest.raises(ValueError):
+        parse_address('localhost')
+
+
+def test_bind_unix(tmpdir):
+    path = str(tmpdir.join('app.sock'))
+    sock = bind_unix(path, mode=0o600)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    # still accepting connections
+    with pytest.raises(OSError):
+        bind_unix(path)
+    # left behind by a crashed process
+    sock.close()
+    assert os.path.exists(path)
+    bind_unix(path).close()
+
+    tmpdir.join('file').write('')
+    with pytest.raises(OSError):
+        bind_unix(str(tmpdir.join('file')))
+
+
+def test_bind_sockets(tmpdir):
+    inherited = socket.socket()
+    inherited.bind(('127.0.0.1', 0))
+    port = inherited.getsockname()[1]
+    path = str(tmpdir.join('app.sock'))
+    sockets = bind_sockets(['unix:' + path, 'fd://%d' % inherited.detach()])
+    assert [describe(sock) for sock in sockets] == \
+        ['unix:' + path, '127.0.0.1:%d' % port]
+    for sock in sockets:
+        sock.close()
+
+    # all or none
+    with pytest.raises(OSError):
+        bind_sockets(['127.0.0.1:0', 'unix:' + str(tmpdir.join('no/a'))])
+
+
+APP = '''
+import os
+from imouto.web import Application, RequestHandler
+
+
+class Handler(RequestHandler):
+
+    async def get(self):
+        self.write('hello')
+
+
+bind = os.environ.get('BIND')
+Application([('/', Handler)]).run(host='256.0.0.1',
+                                  bind=bind.split(',') if bind else None,
+                                  unix_mode=0o660)
+'''
+
+
+def serve(tmpdir, sock, **env):
+    tmpdir.join('app.py').write(APP)
+    env = dict(os.environ, PYTHONPATH=os.getcwd(), **env)
+    fd = sock.fileno()
+    command = [sys.executable, str(tmpdir.join('app.py'))]
+    activation = 'LISTEN_FDS' in env
+    if activation:
+        # systemd passes the sockets from fd 3 and the pid of the server,
+        # `exec` keeps the pid of the shell
+        command = ['sh', '-c', 'LISTEN_PID=$$ exec "$0" "$1"'] + command
+    return subprocess.Popen(
+        command, env=env, pass_fds=[fd, 3],
+        preexec_fn=(lambda: os.dup2(fd, 3)) if activation else None,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def get(family, address):
+    deadline = time.time() + 10
+    while True:
+        try:
+            with socket.socket(family) as client:
+                client.connect(address)
+                client.sendall(b'GET / HTTP/1.1\r\n\r\n')
+                return client.recv(1024).split(b'\r\n\r\n', 1)[1]
+        except (ConnectionError, FileNotFoundError, IndexError):
+            if time.time() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def test_run_unix_and_fd(tmpdir):
+    path = str(tmpdir.join('app.sock'))
+    inherited = socket.socket()
+    inherited.bind(('127.0.0.1', 0))
+    server = serve(tmpdir, inherited,
+                   BIND='unix:%s,fd://%d' % (path, inherited.fileno()))
+    try:
+        assert get(socket.AF_UNIX, path) == b'hello'
+        assert get(socket.AF_INET, inherited.getsockname()) == b'hello'
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o660
+    finally:
+        server.terminate()
+        assert server.wait(10) == 0
+        inherited.close()
+    assert not os.path.exists(path)
+
+
+def test_run_socket_activation(tmpdir):
+    inherited = socket.socket()
+    inherited.bind(('127.0.0.1', 0))
+    # `host` is invalid, only the socket passed as fd 3 works
+    server = serve(tmpdir, inherited, LISTEN_FDS='1')
+    try:
+        assert get(socket.AF_INET, inherited.getsockname()) == b'hello'
+    finally:
+        server.terminate()
+        assert server.wait(10) == 0
+        inherited.close()
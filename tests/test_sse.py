@@ -0,0 +1,179 @@
+import asyncio
+import pytest
+from imouto.config import Config
+from imouto.web import Application
+from imouto.sse import Channel, EventStreamHandler, encode_event
+
+
+class Transport:
+
+    def __init__(self):
+        self.data = b''
+        self.aborted = False
+
+    def is_closing(self):
+        return self.aborted
+
+    def write(self, data):
+        self.data += data
+
+    def get_write_buffer_size(self):
+        return len(self.data)
+
+    def abort(self):
+        self.aborted = True
+
+
+channel = Channel(replay_size=3)
+
+
+class NewsHandler(EventStreamHandler):
+
+    channel = channel
+    heartbeat = 0.05
+    retry = 1000
+
+    async def open(self):
+        await self.send('welcome')
+
+
+def test_encode_event():
+    assert encode_event('hello') == b'data: hello\n\n'
+    assert encode_event('a\nb', event='news', id=3, retry=10) == \
+        b'id: 3\nevent: news\nretry: 10\ndata: a\ndata: b\n\n'
+    assert encode_event('') == b'data: \n\n'
+    with pytest.raises(ValueError):
+        encode_event('x', event='a\nb')
+
+
+def test_channel():
+    news = Channel(replay_size=2, max_buffer=80)
+    fast, slow = Transport(), Transport()
+    news.subscribe(fast)
+    news.subscribe(slow)
+    assert news.publish('1') == '1'
+    assert fast.data == slow.data == b'id: 1\ndata: 1\n\n'
+
+    fast.data = b''
+    news.publish('x' * 64)
+    assert len(news) == 1 and news.dropped == 1
+    assert slow.aborted and not fast.aborted
+    # flushed
+    fast.data = b''
+
+    # resume from the replay buffer
+    news.publish('3')
+    late = Transport()
+    news.subscribe(late, last_event_id='2')
+    assert late.data == b'id: 3\ndata: 3\n\n'
+    # the id is too old, everything in the buffer is sent, and the replay
+    # counts against the buffer limit too
+    late = Transport()
+    news.subscribe(late, last_event_id='1')
+    assert late.data.count(b'data:') == 2
+    assert late.aborted
+    assert len(news) == 2
+
+
+def test_event_stream(client):
+    client.feed(Application([('/news', NewsHandler)]))
+    server, addr = client.app.test_server(client.loop)
+    channel.publish('old')
+
+    async def listen(last_event_id):
+        reader, writer = await asyncio.open_connection(*addr,
+                                                       loop=client.loop)
+        writer.write(b'GET /news HTTP/1.1\r\n'
+                     b'Last-Event-ID: %b\r\n\r\n' % last_event_id)
+        head = await reader.readuntil(b'\r\n\r\n')
+        assert head.startswith(b'HTTP/1.1 200 ')
+        assert b'Content-Type: text/event-stream' in head
+        assert b'Content-Length' not in head
+        assert await reader.readuntil(b'\n\n') == b'retry: 1000\n\n'
+        assert await reader.readuntil(b'\n\n') == b'data: welcome\n\n'
+        return reader, writer
+
+    async def main():
+        reader, writer = await listen(b'')
+        # the unknown id replays the buffer
+        assert await reader.readuntil(b'\n\n') == b'id: 1\ndata: old\n\n'
+        channel.publish('new')
+        assert await reader.readuntil(b'\n\n') == b'id: 2\ndata: new\n\n'
+        assert await reader.readuntil(b'\n\n') == b':\n\n'
+        writer.close()
+
+        reader, writer = await listen(b'1')
+        assert await reader.readuntil(b'\n\n') == b'id: 2\ndata: new\n\n'
+        writer.close()
+        await asyncio.sleep(0.1, loop=client.loop)
+        assert len(channel) == 0
+
+    client.loop.run_until_complete(main())
+    server.close()
+    client.loop.run_until_complete(server.wait_closed())
+
+
+def test_request_guards(client):
+    client.feed(Application([('/news', NewsHandler)], config=Config(
+        defaults={'REQUEST_TIMEOUT': 0.2, 'CANCEL_ON_DISCONNECT': True})))
+    server, addr = client.app.test_server(client.loop)
+
+    async def main():
+        reader, writer = await asyncio.open_connection(*addr,
+                                                       loop=client.loop)
+        writer.write(b'GET /news HTTP/1.1\r\n\r\n')
+        head = await reader.readuntil(b'\r\n\r\n')
+        assert head.startswith(b'HTTP/1.1 200 ')
+        assert await reader.readuntil(b'\n\n') == b'retry: 1000\n\n'
+        assert await reader.readuntil(b'\n\n') == b'data: welcome\n\n'
+        # still streaming after the deadline, no 504 written into it
+        await asyncio.sleep(0.3, loop=client.loop)
+        event = channel.publish('late')
+        data = b''
+        while b'data: late' not in data:
+            data += await reader.readuntil(b'\n\n')
+        assert b'HTTP/1.1' not in data and event in data.decode()
+        writer.close()
+        await asyncio.sleep(0.1, loop=client.loop)
+        assert len(channel) == 0
+
+    client.loop.run_until_complete(main())
+    server.close()
+    client.loop.run_until_complete(server.wait_closed())
+
+
+def test_concurrent_send(client):
+    size = 8 << 20
+    sent = []
+
+    class FanOutHandler(EventStreamHandler):
+
+        async def open(self):
+            self._writer.transport.set_write_buffer_limits(high=1024)
+            # both wait for the slow client to drain the buffer
+            await asyncio.gather(self.send('a' * size, id='a'),
+                                 self.send('b' * size, id='b'),
+                                 loop=self.app.loop)
+            sent.append(True)
+
+    client.feed(Application([('/events', FanOutHandler)]))
+    server, addr = client.app.test_server(client.loop)
+
+    async def main():
+        reader, writer = await asyncio.open_connection(
+            *addr, loop=client.loop, limit=2 * size)
+        writer.write(b'GET /events HTTP/1.1\r\n\r\n')
+        head = await reader.readuntil(b'\r\n\r\n')
+        assert head.startswith(b'HTTP/1.1 200 ')
+        await asyncio.sleep(0.1, loop=client.loop)
+        events = [await reader.readuntil(b'\n\n') for _ in range(2)]
+        # whole events, in whichever order the tasks ran
+        assert sorted(len(event) for event in events) == [size + 14] * 2
+        assert sorted(event[:5] for event in events) == [b'id: a', b'id: b']
+        await asyncio.sleep(0.05, loop=client.loop)
+        assert sent == [True]
+        writer.close()
+
+    client.loop.run_until_complete(main())
+    server.close()
+    client.loop.run_until_complete(server.wait_closed())
@@ -0,0 +1,50 @@
+import asyncio
+from imouto.web import RequestHandler, Application
+from imouto.testing import TestClient
+
+
+class EchoHandler(RequestHandler):
+
+    async def get(self):
+        self.set_cookie('visits', str(int(self.get_cookie('visits', 0)) + 1))
+        self.write_json({'path': self.request.path,
+                         'addr': self.request.remote_addr})
+
+    async def post(self):
+        self.write(self.request.raw_body.getvalue().decode())
+
+
+def test_test_client(client):
+    app = Application([(r'/', EchoHandler), (r'/echo', EchoHandler)])
+    client.feed(app)
+    with TestClient(app, client.loop) as client:
+        response = client.get('/')
+        assert response.status_code == 200 and response.reason == 'OK'
+        assert response.headers['Content-Type'] == 'application/json'
+        assert response.json() == {'path': '/', 'addr': '127.0.0.1'}
+        # the cookies are kept between the requests
+        assert response.cookies == {'visits': '1'}
+        assert client.get('/').cookies == {'visits': '2'}
+
+        assert client.get('/missing').status_code == 404
+        assert client.post('/echo', body='hello').text == 'hello'
+        # streamed with chunked transfer encoding
+        response = client.post('/echo', body=(b'x' * 10 for _ in range(3)))
+        assert response.body == b'x' * 30
+
+
+def test_send_in_parts(client):
+    app = Application([(r'/echo', EchoHandler)])
+    client.feed(app)
+    client = TestClient(app, client.loop)
+    parts = [b'POST /echo HTTP/1.1\r\nContent-', b'Length: 5\r\n\r\nab',
+             b'cde']
+    response = client.loop.run_until_complete(client.send(parts))
+    assert response.raw.startswith(b'HTTP/1.1 200 ')
+    assert response.body == b'abcde'
+
+    # concurrent requests in the loop
+    responses = client.loop.run_until_complete(asyncio.gather(
+        *[client.fetch('POST', '/echo', body=str(i)) for i in range(3)],
+        loop=client.loop))
+    assert [response.text for response in responses] == ['0', '1', '2']
@@ -0,0 +1,115 @@
+import ssl
+import shutil
+import socket
+import subprocess
+import pytest
+from imouto.web import RequestHandler, Application
+from imouto.tls import create_ssl_context
+
+pytestmark = pytest.mark.skipif(shutil.which('openssl') is None,
+                                reason='openssl is needed for certificates')
+
+
+class HelloHandler(RequestHandler):
+
+    async def get(self):
+        self.write('Hello')
+
+
+def self_signed(directory, name):
+    """a certificate for localhost and its key"""
+    cert = str(directory.join(name + '.pem'))
+    key = str(directory.join(name + '.key'))
+    subprocess.check_call(
+        ['openssl', 'req', '-x509', '-newkey', 'ec', '-pkeyopt',
+         'ec_paramgen_curve:prime256v1', '-nodes', '-days', '1',
+         '-subj', '/CN=localhost', '-keyout', key, '-out', cert],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return cert, key
+
+
+def fetch(addr, context, session=None):
+    """a request in a blocking client, return what was negotiated"""
+    with socket.create_connection(addr) as sock:
+        with context.wrap_socket(sock, server_hostname='localhost',
+                                 session=session) as tls:
+            tls.sendall(b'GET / HTTP/1.1\r\n\r\n')
+            data = b''
+            while True:
+                chunk = tls.recv(1024)
+                if not chunk:
+                    break
+                data += chunk
+            assert data.startswith(b'HTTP/1.1 200 ')
+            assert data.endswith(b'Hello')
+            return {'alpn': tls.selected_alpn_protocol(),
+                    'version': tls.version(),
+                    'session': tls.session,
+                    'reused': tls.session_reused,
+                    'cert': tls.getpeercert(True)}
+
+
+def serve(client, context):
+    app = Application([(r'/', HelloHandler)])
+    client.feed(app)
+    server, addr = app.test_server(client.loop, ssl=context)
+
+    def run(func, *args):
+        return client.loop.run_until_complete(
+            client.loop.run_in_executor(None, func, *args))
+    return server, addr, run
+
+
+def test_https(client, tmpdir):
+    cert, key = self_signed(tmpdir, 'localhost')
+    context = create_ssl_context(cert, key)
+    server, addr, run = serve(client, context)
+    trusted = ssl.create_default_context(cafile=cert)
+    trusted.set_alpn_protocols(['h2', 'http/1.1'])
+
+    tls = run(fetch, addr, trusted)
+    assert tls['alpn'] == 'http/1.1'
+    assert tls['version'] in ('TLSv1.2', 'TLSv1.3')
+    assert not tls['reused']
+    # resumed with the session ticket, no full handshake
+    assert run(fetch, addr, trusted, tls['session'])['reused']
+
+    # the older protocols are refused
+    legacy = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    legacy.check_hostname = False
+    legacy.verify_mode = ssl.CERT_NONE
+    legacy.options |= ssl.OP_NO_TLSv1_2 | ssl.OP_NO_TLSv1_3
+    with pytest.raises((ssl.SSLError, ConnectionError)):
+        run(fetch, addr, legacy)
+    server.close()
+    client.loop.run_until_complete(server.wait_closed())
+
+
+def test_reload_certificate(client, tmpdir):
+    cert, key = self_signed(tmpdir, 'localhost')
+    context = create_ssl_context(cert, key)
+    server, addr, run = serve(client, context)
+    app = client.app
+    app.ssl_context = context
+    app._cert_chain = (cert, key)
+    insecure = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    insecure.check_hostname = False
+    insecure.verify_mode = ssl.CERT_NONE
+
+    def peer():
+        return run(fetch, addr, insecure)['cert']
+
+    old = peer()
+    renewed, renewed_key = self_signed(tmpdir, 'renewed')
+    shutil.copy(renewed, cert)
+    shutil.copy(renewed_key, key)
+    assert app.reload_certificate()
+    new = peer()
+    assert new != old
+
+    # a mismatched pair is not loaded
+    shutil.copy(self_signed(tmpdir, 'other')[0], cert)
+    assert not app.reload_certificate()
+    assert peer() == new
+    server.close()
+    client.loop.run_until_complete(server.wait_closed())
@@ -58,3 +58,24 @@ def test_singleton():
 
     b = B()
     assert b is not a1
+
+
+def test_object_pool():
+
+    class Obj:
+        def __init__(self):
+            self.value = 0
+
+        def reset(self):
+            self.value = 0
+
+    pool = ObjectPool(Obj, 1)
+    a = pool.acquire()
+    b = pool.acquire()
+    a.value = 1
+    pool.release(a)
+    pool.release(b)
+    assert len(pool) == 1
+    c = pool.acquire()
+    assert c is a
+    assert c.value == 0
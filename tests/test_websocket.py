@@ -0,0 +1,237 @@
+import os
+import zlib
+import struct
+import asyncio
+from imouto.config import Config
+from imouto.web import Application
+from imouto.websocket import (WebSocketHandler, accept_key, apply_mask,
+                              build_frame, OP_TEXT, OP_BINARY, OP_CLOSE,
+                              OP_PING, OP_PONG, OP_CONTINUATION)
+
+
+class EchoHandler(WebSocketHandler):
+
+    compression = True
+    max_message_size = 1024
+    closed_with = []
+
+    async def open(self):
+        await self.write_message('hello')
+
+    async def on_message(self, message):
+        if message == 'bye':
+            await self.close(1000, 'bye')
+        else:
+            await self.write_message(message)
+
+    async def on_close(self):
+        self.closed_with.append(self.close_code)
+
+
+def handshake(extensions=None):
+    headers = [b'GET /ws HTTP/1.1', b'Host: localhost',
+               b'Upgrade: websocket', b'Connection: Upgrade',
+               b'Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==',
+               b'Sec-WebSocket-Version: 13']
+    if extensions:
+        headers.append(b'Sec-WebSocket-Extensions: ' + extensions)
+    return b'\r\n'.join(headers) + b'\r\n\r\n'
+
+
+def masked(opcode, payload, **kwargs):
+    return build_frame(opcode, payload, mask=os.urandom(4), **kwargs)
+
+
+async def read_frame(reader):
+    first, second = await reader.readexactly(2)
+    size = second & 0x7F
+    if size == 126:
+        size, = struct.unpack('!H', await reader.readexactly(2))
+    elif size == 127:
+        size, = struct.unpack('!Q', await reader.readexactly(8))
+    return first & 0x0F, bool(first & 0x40), await reader.readexactly(size)
+
+
+def run(client, coro_func, config=None, handler=EchoHandler):
+    app = Application([('/ws', handler)], config=config)
+    client.feed(app)
+    server, addr = app.test_server(client.loop)
+
+    async def main():
+        reader, writer = await asyncio.open_connection(*addr,
+                                                       loop=client.loop)
+        try:
+            return await coro_func(reader, writer)
+        finally:
+            writer.close()
+    try:
+        return client.loop.run_until_complete(main())
+    finally:
+        server.close()
+        client.loop.run_until_complete(server.wait_closed())
+
+
+def test_helpers():
+    # the example of RFC 6455
+    assert accept_key('dGhlIHNhbXBsZSBub25jZQ==') == \
+        's3pPLMBiTxaQ9kYGzzhZRbK+xOo='
+    mask = b'\x37\xfa\x21\x3d'
+    assert apply_mask(mask, b'Hello') == b'\x7f\x9f\x4d\x51\x58'
+    assert apply_mask(mask, apply_mask(mask, b'Hello')) == b'Hello'
+    assert build_frame(OP_TEXT, b'Hello', mask=mask) == \
+        b'\x81\x85\x37\xfa\x21\x3d\x7f\x9f\x4d\x51\x58'
+    assert build_frame(OP_BINARY, b'x' * 256)[:4] == b'\x82\x7e\x01\x00'
+
+
+def test_echo(client):
+    EchoHandler.closed_with = []
+
+    async def talk(reader, writer):
+        # the first frame is sent together with the handshake
+        writer.write(handshake() + masked(OP_TEXT, b'first'))
+        head = await reader.readuntil(b'\r\n\r\n')
+        assert head.startswith(b'HTTP/1.1 101 ')
+        assert b'Sec-Websocket-Accept: s3pPLMBiTxaQ9kYGzzhZRbK+xOo=' in head
+        assert b'Content-Length' not in head
+        assert await read_frame(reader) == (OP_TEXT, False, b'hello')
+        assert await read_frame(reader) == (OP_TEXT, False, b'first')
+
+        # fragmented message with a ping in the middle
+        writer.write(masked(OP_BINARY, b'ab', fin=False))
+        writer.write(masked(OP_PING, b'ping'))
+        writer.write(masked(OP_CONTINUATION, b'cd'))
+        assert await read_frame(reader) == (OP_PONG, False, b'ping')
+        assert await read_frame(reader) == (OP_BINARY, False, b'abcd')
+
+        # the server closes, the client answers
+        writer.write(masked(OP_TEXT, b'bye'))
+        assert await read_frame(reader) == (
+            OP_CLOSE, False, struct.pack('!H', 1000) + b'bye')
+        writer.write(masked(OP_CLOSE, struct.pack('!H', 1000)))
+        assert await reader.read() == b''
+
+    run(client, talk)
+    assert EchoHandler.closed_with == [1000]
+
+
+def test_request_guards(client):
+    # the request deadline and the disconnect watcher don't apply to the
+    # connection, it outlives the deadline and only the handler reads it
+    config = Config(defaults={'REQUEST_TIMEOUT': 0.2,
+                              'CANCEL_ON_DISCONNECT': True})
+    EchoHandler.closed_with = []
+
+    async def talk(reader, writer):
+        writer.write(handshake())
+        head = await reader.readuntil(b'\r\n\r\n')
+        assert head.startswith(b'HTTP/1.1 101 ')
+        assert await read_frame(reader) == (OP_TEXT, False, b'hello')
+        await asyncio.sleep(0.3, loop=client.loop)
+        writer.write(masked(OP_TEXT, b'still there'))
+        assert await read_frame(reader) == (OP_TEXT, False, b'still there')
+        writer.write(masked(OP_CLOSE, struct.pack('!H', 1000)))
+        assert (await read_frame(reader))[0] == OP_CLOSE
+        assert await reader.read() == b''
+
+    run(client, talk, config)
+    assert EchoHandler.closed_with == [1000]
+
+
+def test_concurrent_send(client):
+    size = 8 << 20
+
+    class BurstHandler(EchoHandler):
+        compression = False
+        max_write_buffer = 1024
+
+        async def on_message(self, message):
+            # both wait for the slow client to drain the buffer
+            await asyncio.gather(self.write_message(b'a' * size),
+                                 self.write_message(b'b' * size),
+                                 self.ping(b'ping'), loop=self.app.loop)
+
+    async def talk(reader, writer):
+        writer.write(handshake() + masked(OP_TEXT, b'burst'))
+        await reader.readuntil(b'\r\n\r\n')
+        assert await read_frame(reader) == (OP_TEXT, False, b'hello')
+        await asyncio.sleep(0.1, loop=client.loop)
+        frames = [await read_frame(reader) for _ in range(3)]
+        # the frames are whole, in whichever order the tasks ran
+        assert sorted((opcode, payload[:1], len(payload))
+                      for opcode, _, payload in frames) == [
+            (OP_BINARY, b'a', size), (OP_BINARY, b'b', size),
+            (OP_PING, b'p', 4)]
+        assert all(not payload.strip(payload[:1])
+                   for opcode, _, payload in frames if opcode == OP_BINARY)
+        writer.write(masked(OP_CLOSE, struct.pack('!H', 1000)))
+        assert (await read_frame(reader))[0] == OP_CLOSE
+
+    run(client, talk, handler=BurstHandler)
+
+
+def test_compression(client):
+
+    async def talk(reader, writer):
+        writer.write(handshake(b'permessage-deflate; '
+                               b'client_max_window_bits; '
+                               b'server_no_context_takeover'))
+        head = await reader.readuntil(b'\r\n\r\n')
+        assert (b'Sec-Websocket-Extensions: permessage-deflate; '
+                b'server_no_context_takeover') in head
+        await read_frame(reader)
+
+        message = b'imouto ' * 100
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        data = compressor.compress(message)
+        data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        writer.write(masked(OP_TEXT, data[:-4], rsv1=True))
+        opcode, rsv1, payload = await read_frame(reader)
+        assert opcode == OP_TEXT and rsv1
+        assert len(payload) < len(message)
+        decompressor = zlib.decompressobj(-15)
+        assert decompressor.decompress(payload + b'\x00\x00\xff\xff') == \
+            message
+
+        # decompressed size is limited too
+        data = zlib.compressobj(6, zlib.DEFLATED, -15)
+        data = data.compress(b'x' * 4096) + data.flush(zlib.Z_SYNC_FLUSH)
+        writer.write(masked(OP_TEXT, data[:-4], rsv1=True))
+        assert await read_frame(reader) == (
+            OP_CLOSE, False, struct.pack('!H', 1009) + b'message too big')
+
+    run(client, talk)
+
+
+def test_protocol_errors(client):
+    EchoHandler.closed_with = []
+
+    async def talk(reader, writer):
+        writer.write(handshake())
+        await reader.readuntil(b'\r\n\r\n')
+        await read_frame(reader)
+        # a client frame must be masked
+        writer.write(build_frame(OP_TEXT, b'unmasked'))
+        opcode, _, payload = await read_frame(reader)
+        assert opcode == OP_CLOSE
+        assert payload[:2] == struct.pack('!H', 1002)
+        assert await reader.read() == b''
+
+    run(client, talk)
+    assert EchoHandler.closed_with == [1002]
+
+
+def test_bad_handshake(client):
+
+    async def talk(reader, writer):
+        writer.write(handshake().replace(b'Version: 13', b'Version: 8'))
+        return await reader.read()
+
+    response = run(client, talk)
+    assert response.startswith(b'HTTP/1.1 426 ')
+    assert b'Sec-Websocket-Version: 13' in response
+
+
+def test_plain_request(client):
+    client.feed(Application([('/ws', EchoHandler)]))
+    response = client.get('/ws')
+    assert response.startswith(b'HTTP/1.1 400 ')